@@ -0,0 +1,308 @@
+"""
+Benchmark of the word and pdf writers on synthetic documents.
+
+Each case builds a DocFile tree (paragraphs, tables or pictures) at a scale point and times its write with both
+backends, in a fresh process so the peak RSS is the one of the case.  The results can be appended to a JSON lines
+file to track them over time and compared with a baseline to catch regressions:
+
+    python benchmark/bench_writers.py --scale small medium --output benchmark/results.jsonl
+    python benchmark/bench_writers.py --compare benchmark/baseline.jsonl --tolerance 0.25
+
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+__author__ = 'jbui'
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BACKENDS = ('docx', 'pdf')
+
+# Scale points of each case: paragraphs, table rows x columns and pictures (with the number of distinct images).
+SCALES = {
+    'small': {
+        'paragraphs': 10,
+        'table': (10, 10),
+        'pictures': (10, 2),
+    },
+    'medium': {
+        'paragraphs': 1000,
+        'table': (1000, 20),
+        'pictures': (100, 10),
+    },
+    'large': {
+        'paragraphs': 100000,
+        'table': (100000, 20),
+        'pictures': (1000, 50),
+    },
+}
+
+CASES = ('paragraphs', 'table', 'pictures')
+
+# Size of the synthetic images, a photo straight from a camera is larger still.
+IMAGE_SIZE = (1600, 1200)
+
+# Width of the pictures, the docx writer takes inches and the pdf writer points.
+PICTURE_WIDTH = {'docx': 3, 'pdf': 3 * 72}
+
+
+def build_paragraphs(count, folder, backend):
+    from boadoc.document import DocFile
+    from boadoc.glyph import Paragraph, Section
+    from boadoc.page import Page
+
+    doc = DocFile()
+    page = Page()
+
+    # Ten paragraphs per section, as in a report.
+    for i in range(0, count, 10):
+        section = Section(title='Section %d' % (i // 10 + 1))
+        page.add_section(section)
+
+        for j in range(i, min(i + 10, count)):
+            section.add_paragraph(Paragraph(text='Paragraph %d of the benchmark, with enough text to wrap once on '
+                                                 'a page of the report: %s' % (j, 'lorem ipsum ' * 8)))
+
+    doc.add_page(page)
+
+    return doc
+
+
+def build_table(size, folder, backend):
+    from boadoc.document import DocFile
+    from boadoc.glyph import Table
+    from boadoc.page import Page
+
+    rows, cols = size
+
+    data = [['Column %d' % j for j in range(0, cols)]]
+    data.extend(['%d.%d' % (i, j) for j in range(0, cols)] for i in range(0, rows))
+
+    doc = DocFile()
+    page = Page()
+    page.add_table(Table(data, header_rows=1))
+    doc.add_page(page)
+
+    return doc
+
+
+def make_images(count, folder):
+    """
+    Write count distinct synthetic JPEG images in folder.
+    """
+    from PIL import Image
+
+    paths = []
+
+    for i in range(0, count):
+        image = Image.effect_noise(IMAGE_SIZE, 32 + i).convert('RGB')
+        path = os.path.join(folder, 'image_%d.jpg' % i)
+        image.save(path, quality=90)
+        paths.append(path)
+
+    return paths
+
+
+def build_pictures(size, folder, backend):
+    from boadoc.document import DocFile
+    from boadoc.glyph import Picture
+    from boadoc.page import Page
+
+    count, distinct = size
+    paths = make_images(distinct, folder)
+
+    doc = DocFile()
+
+    # Two pictures per page.
+    for i in range(0, count, 2):
+        page = Page()
+
+        for j in range(i, min(i + 2, count)):
+            page.add_picture(Picture(paths[j % distinct], width=PICTURE_WIDTH[backend],
+                                     height=PICTURE_WIDTH[backend] * 0.75))
+
+        doc.add_page(page)
+
+    return doc
+
+
+BUILDERS = {
+    'paragraphs': build_paragraphs,
+    'table': build_table,
+    'pictures': build_pictures,
+}
+
+
+def peak_rss():
+    """
+    Return the peak resident set size of the process in KiB.
+    """
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, KiB elsewhere.
+    if sys.platform == 'darwin':
+        rss //= 1024
+
+    return rss
+
+
+def run_case(case, scale, backend, repeat=1):
+    """
+    Build the document of the case and time its write.  Run it in a fresh process (see run) for a meaningful peak RSS.
+
+    :param case: name in CASES.
+    :param scale: name in SCALES.
+    :param backend: 'docx' or 'pdf'.
+    :param repeat: number of writes, the fastest one is reported.
+    :return: dictionary of the measures.
+    """
+    size = SCALES[scale][case]
+
+    with tempfile.TemporaryDirectory() as folder:
+        doc = BUILDERS[case](size, folder, backend)
+        build_rss = peak_rss()
+
+        file_path = os.path.join(folder, 'benchmark.%s' % backend)
+        write = doc.write_docx if backend == 'docx' else doc.write_pdf
+
+        times = []
+        for _ in range(0, repeat):
+            start = time.perf_counter()
+            write(file_path)
+            times.append(time.perf_counter() - start)
+
+        return {
+            'case': case,
+            'scale': scale,
+            'size': size,
+            'backend': backend,
+            'seconds': min(times),
+            'peak_rss_kb': peak_rss(),
+            'build_rss_kb': build_rss,
+            'output_bytes': os.path.getsize(file_path),
+        }
+
+
+def run(case, scale, backend, repeat=1):
+    """
+    Run a case in a new process.
+    """
+    context = multiprocessing.get_context('spawn')
+
+    with context.Pool(1) as pool:
+        return pool.apply(run_case, (case, scale, backend, repeat))
+
+
+def metadata():
+    """
+    Return what the results depend on besides the code: commit, python and machine.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def key(result):
+    return result['case'], result['scale'], result['backend']
+
+
+def load(file_path):
+    """
+    Return the last result of each case in a JSON lines file.
+    """
+    results = {}
+
+    with open(file_path) as f:
+        for line in f:
+            if line.strip():
+                result = json.loads(line)
+                results[key(result)] = result
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Return a message for each measure more than tolerance (a fraction) above the baseline.
+    """
+    regressions = []
+
+    for result in results:
+        base = baseline.get(key(result))
+        if base is None:
+            continue
+
+        for measure in ('seconds', 'peak_rss_kb', 'output_bytes'):
+            if result[measure] > base[measure] * (1 + tolerance):
+                regressions.append('%s %s %s: %s %s -> %s' % (
+                    result['case'], result['scale'], result['backend'], measure, base[measure], result[measure]))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the word and pdf writers.')
+    parser.add_argument('--scale', nargs='+', choices=sorted(SCALES), default=['small', 'medium'])
+    parser.add_argument('--case', nargs='+', choices=CASES, default=list(CASES))
+    parser.add_argument('--backend', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--repeat', type=int, default=3, help='writes per case, the fastest one is reported')
+    parser.add_argument('--output', help='JSON lines file the results are appended to')
+    parser.add_argument('--compare', help='JSON lines file of baseline results')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed increase over the baseline')
+    args = parser.parse_args(argv)
+
+    info = metadata()
+    results = []
+
+    print('%-12s %-8s %-8s %10s %12s %14s' % ('case', 'scale', 'backend', 'seconds', 'peak rss kb', 'output bytes'))
+
+    for scale in args.scale:
+        for case in args.case:
+            for backend in args.backend:
+                result = run(case, scale, backend, repeat=args.repeat)
+                result.update(info)
+                results.append(result)
+
+                print('%-12s %-8s %-8s %10.3f %12d %14d' % (
+                    case, scale, backend, result['seconds'], result['peak_rss_kb'], result['output_bytes']))
+
+    if args.output:
+        with open(args.output, 'a') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')
+
+    if args.compare:
+        regressions = compare(results, load(args.compare), args.tolerance)
+
+        for regression in regressions:
+            print('Regression: %s' % regression)
+
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, ROOT)
+    sys.exit(main())
@@ -1,4 +1,16 @@
+import importlib
 
 __author__ = 'jbui'
 
-__all__ = ["document", "glyph", "page", "pdf", "word"]
+__all__ = ["batch", "cache", "columns", "digest", "document", "environment", "glyph", "image", "instrument", "output",
+           "page", "parallel", "pdf", "serialize", "traversal", "word"]
+
+
+def __getattr__(name):
+    """
+    Import the sub modules on first use, so "import boadoc" does not load the word and pdf backends.
+    """
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
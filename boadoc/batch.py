@@ -0,0 +1,144 @@
+import itertools
+import os
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor
+
+__author__ = 'jbui'
+
+
+DOCX = 'docx'
+PDF = 'pdf'
+
+
+class BatchResult(object):
+    """
+    Result of one document rendered in a batch.
+
+    """
+    def __init__(self, index, file_path, error=None):
+        self.index = index
+        self.file_path = file_path
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        return '<BatchResult %d %s %s>' % (self.index, self.file_path, 'ok' if self.ok else 'failed')
+
+
+def warm_up(fonts=None):
+    """
+    Worker initializer.  Import the writer backends (reportlab, python-docx, docxtpl) and register the fonts once per
+    process, so the first document of each worker does not pay for it.
+
+    :param fonts: list of keyword dictionaries passed to pdf.register_fonts_from_paths, default to the fonts configured
+                  on pdf.font_registry.
+    """
+    import docxtpl
+    import boadoc.word
+    import boadoc.pdf as pf
+
+    pf.font_registry.preload(fonts)
+
+
+def _format(file_path, file_format=None):
+    """
+    Return the output format, guessed from the file extension when not given.
+    """
+    if file_format:
+        return file_format
+
+    if os.path.splitext(file_path)[1].lower() == '.pdf':
+        return PDF
+
+    return DOCX
+
+
+def render(index, spec):
+    """
+    Render a single document spec.  Never raise, the error is returned inside the result instead.
+
+    :param index: position of the spec in the batch.
+    :param spec: tuple (doc, file_path) or (doc, file_path, format).  The doc is a DocFile or a callable returning a
+                 DocFile.
+    :return: BatchResult
+    """
+    file_path = None
+
+    try:
+        doc, file_path = spec[0], spec[1]
+        file_format = _format(file_path, spec[2] if len(spec) > 2 else None)
+
+        if callable(doc):
+            doc = doc()
+
+        if file_format == PDF:
+            doc.write_pdf(file_path)
+        else:
+            doc.write_docx(file_path)
+
+    except Exception:
+        return BatchResult(index, file_path, error=traceback.format_exc())
+
+    return BatchResult(index, file_path)
+
+
+def _render_chunk(chunk):
+    return [render(index, spec) for index, spec in chunk]
+
+
+def spec_path(spec):
+    """
+    Return the file path of a spec, None for a malformed spec.
+    """
+    try:
+        return spec[1]
+    except (TypeError, IndexError, KeyError):
+        return None
+
+
+def chunks(specs, chunk_size):
+    """
+    Yield the lists of (index, spec) sent to a worker at a time.
+    """
+    specs = enumerate(specs)
+
+    while True:
+        chunk = list(itertools.islice(specs, chunk_size))
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def render_batch(specs, max_workers=None, chunk_size=1, fonts=None):
+    """
+    Render many documents across a process pool.  One failed document does not abort the batch, its error is stored
+    in its result.  An error outside render (a spec that cannot be sent to a worker, a worker that died) fails the
+    documents of its chunk only.
+
+    :param specs: iterable of (doc, file_path[, format]) tuples.  The doc is a DocFile or a picklable callable
+                  returning a DocFile, which avoids sending large glyph trees to the workers.
+    :param max_workers: number of worker processes, default to the number of cores.
+    :param chunk_size: number of specs sent to a worker at a time.
+    :param fonts: list of font keyword dictionaries registered in each worker at startup.
+    :return: list of BatchResult in the order of the specs.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    results = []
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=warm_up, initargs=(fonts,)) as executor:
+        futures = [(chunk, executor.submit(_render_chunk, chunk)) for chunk in chunks(specs, max(1, chunk_size))]
+
+        for chunk, future in futures:
+            try:
+                results.extend(future.result())
+            except Exception:
+                error = traceback.format_exc()
+                results.extend(BatchResult(index, spec_path(spec), error=error) for index, spec in chunk)
+
+    return results
@@ -0,0 +1,83 @@
+import threading
+
+from collections import OrderedDict
+
+__author__ = 'jbui'
+
+
+class LRUCache(object):
+    """
+    Least recently used cache with a size cap.  Shared by the writers to keep parsed resources between documents of
+    the same process.
+
+    """
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+
+        self.hits = 0
+        self.misses = 0
+
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        """
+        Return the cached value and mark it as recently used.
+
+        :param key:
+        :param default:
+        :return:
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """
+        Store the value, evicting the least recently used entries past the size cap.
+
+        :param key:
+        :param value:
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            while len(self._data) > max(self.maxsize, 0):
+                self._data.popitem(last=False)
+
+    def get_or_create(self, key, factory):
+        """
+        Return the cached value, or build it with factory() and cache it.
+
+        :param key:
+        :param factory: callable without argument.
+        :return:
+        """
+        with self._lock:
+            if key in self._data:
+                return self.get(key)
+
+            self.misses += 1
+
+        value = factory()
+        self.set(key, value)
+
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
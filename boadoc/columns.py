@@ -0,0 +1,266 @@
+import itertools
+
+from collections.abc import Mapping
+
+__author__ = 'jbui'
+
+
+class ColumnFormat(object):
+    """
+    Format of the numbers of a table column, compiled to a single format string applied to the whole column.
+
+    """
+    def __init__(self, precision=None, thousands=False, unit=None, na=''):
+        """
+
+        :param precision: number of decimals, None to print the numbers as they are.
+        :param thousands: group the thousands with commas.
+        :param unit: text appended after the numbers, e.g. 'kN'.
+        :param na: text of the missing values (None, NaN).
+        """
+        self.precision = precision
+        self.thousands = thousands
+        self.unit = unit
+        self.na = na
+
+    @property
+    def spec(self):
+        """
+        Return the str.format string of the numbers, e.g. '{:,.2f} kN'.
+        """
+        spec = ',' if self.thousands else ''
+
+        if self.precision is not None:
+            spec += '.%df' % self.precision
+
+        text = '{:%s}' % spec
+
+        if self.unit:
+            text += ' ' + self.unit.replace('{', '{{').replace('}', '}}')
+
+        return text
+
+    def format(self, values):
+        """
+        Return the column as a list of text.  A numeric or datetime numpy array (or pandas series) is converted to
+        python values and formatted by one map call, without python code run per cell.  The other columns (objects,
+        strings, booleans, e.g. a pandas string column) go through format_value cell by cell.
+
+        :param values: numpy array, pandas series or sequence.
+        :return:
+        """
+        dtype = getattr(values, 'dtype', None)
+
+        if dtype is None:
+            return list(map(self.format_value, values))
+
+        import numpy
+
+        missing = None
+
+        if hasattr(values, 'isna'):
+            # Pandas series, the nullable dtypes (Int64, Float64, boolean, string) hold NA instead of NaN.
+            missing = values.isna().to_numpy()
+            numpy_dtype = getattr(dtype, 'numpy_dtype', None)
+
+            if numpy_dtype is not None:
+                values = values.to_numpy(dtype=numpy_dtype, na_value=numpy_dtype.type(0))
+            else:
+                values = values.to_numpy()
+
+        kind = values.dtype.kind
+
+        if kind in ('i', 'u'):
+            texts = list(map(self.spec.format, values.tolist()))
+
+        elif kind == 'f':
+            if missing is None:
+                missing = numpy.isnan(values)
+
+            if values.dtype.itemsize < 8 and self.precision is None:
+                # The shortest text of the float32 value, not of its conversion to double (0.10000000149011612).
+                numbers = map(float, values.astype(str).tolist())
+            else:
+                numbers = values.tolist()
+
+            texts = list(map(self.spec.format, numbers))
+
+        elif kind == 'M':
+            if missing is None:
+                missing = numpy.isnat(values)
+
+            texts = numpy.datetime_as_string(values, unit=datetime_unit(values, missing))
+            # Printed like pandas, '2024-01-03 10:00'.
+            texts = numpy.char.replace(texts, 'T', ' ').tolist()
+
+        else:
+            texts = list(map(self.format_value, values.tolist()))
+
+        if missing is not None:
+            for i in numpy.flatnonzero(missing).tolist():
+                texts[i] = self.na
+
+        return texts
+
+    def format_value(self, value):
+        """
+        Format a value of a column without dtype, or of an object column.
+        """
+        if is_missing(value):
+            return self.na
+
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return self.spec.format(value)
+
+        return str(value)
+
+
+def is_missing(value):
+    """
+    Return whether a cell is missing: None, NaN, NaT or pandas NA.
+    """
+    if value is None:
+        return True
+
+    try:
+        return bool(value != value)
+    except TypeError:
+        # pandas.NA compares to NA, whose truth value is ambiguous.
+        return True
+
+
+DATETIME_UNITS = ('D', 'm', 's', 'ms', 'us', 'ns')
+
+
+def datetime_unit(values, missing):
+    """
+    Return the coarsest unit keeping all the datetimes of the column, so they are printed alike ('2024-01-02' for
+    dates).
+    """
+    for unit in DATETIME_UNITS:
+        if ((values.astype('datetime64[%s]' % unit) == values) | missing).all():
+            return unit
+
+    return 'auto'
+
+
+DEFAULT_FORMAT = ColumnFormat()
+
+
+class ColumnData(object):
+    """
+    Table data held as formatted text columns, with an optional header row.  It reads like a sequence of rows, so the
+    writers can take it as any table data, and the word and pdf writers use the columns as they are.
+
+    """
+    def __init__(self, columns, header=None):
+        """
+
+        :param columns: list of columns, each a list of text of the same length.
+        :param header: text of the header row, or None.
+        """
+        lengths = set(len(column) for column in columns)
+        if len(lengths) > 1:
+            raise ValueError('The table columns have different lengths: %s' % sorted(lengths))
+
+        self.columns = columns
+        self.header = header
+
+    @property
+    def row_count(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __len__(self):
+        return self.row_count + (self.header is not None)
+
+    def __iter__(self):
+        rows = zip(*self.columns)
+
+        if self.header is not None:
+            return itertools.chain([tuple(self.header)], rows)
+
+        return rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if self.header is not None:
+            if index == 0:
+                return tuple(self.header)
+            index -= 1
+
+        return tuple(column[index] for column in self.columns)
+
+    def __repr__(self):
+        # Part of the digest of the table glyph.
+        return 'ColumnData(%r, header=%r)' % (self.columns, self.header)
+
+    def map(self, function):
+        """
+        Return the column data with function applied to each column and to the header, e.g. to escape the text a
+        whole column at a time.
+        """
+        header = function(list(self.header)) if self.header is not None else None
+
+        return ColumnData([function(column) for column in self.columns], header=header)
+
+
+def is_frame(data):
+    return hasattr(data, 'columns') and hasattr(data, 'iloc')
+
+
+def is_array(data):
+    return hasattr(data, 'dtype') and hasattr(data, 'ndim')
+
+
+def get_format(formats, name, index):
+    """
+    Return the ColumnFormat of a column, given by name or by index.  A dictionary is taken as ColumnFormat options.
+    """
+    fmt = formats.get(name, formats.get(index, DEFAULT_FORMAT)) if formats else DEFAULT_FORMAT
+
+    if isinstance(fmt, Mapping):
+        fmt = ColumnFormat(**fmt)
+
+    return fmt
+
+
+def column_data(data, formats=None):
+    """
+    Return the ColumnData of a pandas data frame, a numpy array or a dictionary of columns, None for other data (list
+    of rows, row iterator).  Neither numpy nor pandas is imported to tell them apart.
+
+    :param data:
+    :param formats: dictionary of ColumnFormat (or its options) keyed on the column name or index.
+    :return:
+    """
+    if isinstance(data, ColumnData):
+        return data
+
+    if is_frame(data):
+        names = list(data.columns)
+        columns = [data.iloc[:, i] for i in range(0, len(names))]
+        header = [str(name) for name in names]
+
+    elif isinstance(data, Mapping):
+        names = list(data.keys())
+        columns = list(data.values())
+        header = [str(name) for name in names]
+
+    elif is_array(data):
+        if data.ndim == 1:
+            data = data.reshape(-1, 1)
+
+        names = list(range(0, data.shape[1]))
+        columns = [data[:, i] for i in names]
+        header = None
+
+    else:
+        return None
+
+    return ColumnData([get_format(formats, name, i).format(column) for i, (name, column) in
+                       enumerate(zip(names, columns))], header=header)
@@ -0,0 +1,181 @@
+import hashlib
+import numbers
+
+from .cache import LRUCache
+from .glyph import Header, Paragraph, Section, Picture, Table, PageBreak
+
+__author__ = 'jbui'
+
+
+RENDER_CACHE_SIZE = 4096
+
+
+def header_fields(glyph):
+    return (glyph.text,)
+
+
+def paragraph_fields(glyph):
+    return (glyph.text, glyph.style)
+
+
+def section_fields(glyph):
+    return (glyph.title, glyph.level)
+
+
+def picture_fields(glyph):
+    from .image import image_cache
+
+    image = glyph.file_path
+
+    if isinstance(image, str):
+        digest = image_cache.read(image)[0]
+    elif hasattr(image, 'seek'):
+        # Hash the stream content and rewind it for the writer.
+        position = image.tell()
+        digest = image_cache.read(image)[0]
+        image.seek(position)
+    else:
+        return None
+
+    return (digest, glyph.width, glyph.height)
+
+
+# Cell types hashed by their text, the others (e.g. flowables) have no text standing for their output.
+TEXT_CELL_TYPES = (str, numbers.Number, type(None))
+
+
+def table_fields(glyph):
+    if glyph.is_streaming:
+        # A row iterator can only be read once, by the writer.
+        return None
+
+    # The cells are hashed a row at a time by their text (what the writers emit) tagged with their type and length, so
+    # no text of the whole table is built.
+    digest = hashlib.sha1()
+
+    for row in glyph.data:
+        texts = []
+
+        for cell in row:
+            if not isinstance(cell, TEXT_CELL_TYPES):
+                return None
+
+            text = str(cell)
+            texts.append('%s %d %s' % (type(cell).__name__, len(text), text))
+
+        digest.update(('%s\n' % ' '.join(texts)).encode('utf-8', 'surrogatepass'))
+
+    return (glyph.header_rows, glyph.chunk_size, digest.hexdigest())
+
+
+def page_break_fields(glyph):
+    return ()
+
+
+# Content of each glyph type changing its output, the sub glyphs excluded.  The types not listed (e.g. subclasses with
+# their own write method) are never cached.
+FIELDS = {
+    Header: header_fields,
+    Paragraph: paragraph_fields,
+    Section: section_fields,
+    Picture: picture_fields,
+    Table: table_fields,
+    PageBreak: page_break_fields,
+}
+
+
+class Digests(object):
+    """
+    Content hash of the glyph subtrees, computed once per glyph for one write.
+
+    The digest of a glyph covers its type, its own content (the image bytes for a picture) and the digests of its sub
+    glyphs, so it is the same across processes and runs for the same content.  It is None when the subtree cannot be
+    cached: unknown glyph type, row iterator, or a glyph type in exclude.
+
+    """
+    def __init__(self, exclude=()):
+        """
+
+        :param exclude: glyph types the driver cannot reuse, e.g. pictures bound to a part of the docx package.
+        """
+        self.exclude = tuple(exclude)
+
+        # Digest keyed on the glyph id, valid while the glyphs are alive (during the write).
+        self._memo = {}
+
+    def fields(self, glyph):
+        fields = FIELDS.get(type(glyph))
+
+        if fields is None or isinstance(glyph, self.exclude):
+            return None
+
+        return fields(glyph)
+
+    def __call__(self, glyph):
+        """
+        Return the hex digest of the glyph subtree, or None.
+
+        :param glyph:
+        :return:
+        """
+        memo = self._memo
+
+        if id(glyph) in memo:
+            return memo[id(glyph)]
+
+        # Post order walk with a stack, deep trees would hit the recursion limit.
+        stack = [(glyph, False)]
+
+        while stack:
+            node, visited = stack.pop()
+
+            if id(node) in memo:
+                continue
+
+            children = getattr(node, 'glyphs', None) or ()
+
+            if not visited:
+                stack.append((node, True))
+                stack.extend((child, False) for child in children if id(child) not in memo)
+                continue
+
+            fields = self.fields(node)
+            child_digests = tuple(memo[id(child)] for child in children)
+
+            if fields is None or None in child_digests:
+                memo[id(node)] = None
+                continue
+
+            content = repr((type(node).__name__, fields, child_digests))
+            memo[id(node)] = hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+        return memo[id(glyph)]
+
+
+class RenderCache(LRUCache):
+    """
+    Fragments rendered by the writers (docx xml elements, pdf flowables) keyed by (writer key, subtree digest).  A
+    document written again after a small edit only renders the glyphs whose content changed.
+
+    """
+    def __init__(self, maxsize=RENDER_CACHE_SIZE):
+        LRUCache.__init__(self, maxsize=maxsize)
+
+
+render_cache = RenderCache()
+
+
+def get_render_cache(value):
+    """
+    Return the render cache selected by the render_cache option of a document.
+
+    :param value: True for the process wide cache, a RenderCache, or None/False to render everything.
+    :return:
+    """
+    if value is True:
+        return render_cache
+
+    if value is False:
+        return None
+
+    return value
@@ -1,5 +1,3 @@
-from docxtpl import DocxTemplate
-
 __author__ = 'jbui'
 
 
@@ -13,6 +11,8 @@ class DocFile(object):
     TABLE_ALIGNMENT_CENTER = 2
     TABLE_ALIGNMENT_RIGHT = 3
 
+    IMAGE_DPI = 150
+
     def __init__(self, **kwargs):
         """
         Constructor
@@ -29,32 +29,74 @@ class DocFile(object):
         self.template_path = kwargs.get('template')
         self.context = kwargs.get('context')
 
+        # Path of a PDF whose first page is drawn as background of the pdf pages.
+        self.letterhead = kwargs.get('letterhead', None)
+
+        # Resolution the pictures are downsampled to, None to embed them as they are.
+        self.image_dpi = kwargs.get('image_dpi', self.IMAGE_DPI)
+
+        # Reuse the output of unchanged glyph subtrees between writes: True for the process wide cache, or a
+        # digest.RenderCache.
+        self.render_cache = kwargs.get('render_cache', None)
+
+        # instrument.Instrument receiving the timing of the write phases and glyphs, e.g. instrument.Profiler().
+        self.instrument = kwargs.get('instrument', None)
+
         self.pages = []
 
-    def write_docx(self, file_path):
+    def write_docx(self, file_path, streaming=False):
         """
         Write docx.
 
-        :param file_path:
+        :param file_path: file path or writable binary stream (BytesIO, socket file, spooled temporary file).
+        :param streaming: write the document xml straight into the package as the glyphs are written, without the
+                          python-docx tree.  The template is only used for its styles and parts, not rendered.
         :return:
         """
         import boadoc.word as wd
 
-        writer = wd.Writer(self, file_path)
+        if streaming:
+            writer = wd.StreamWriter(self, file_path)
+        else:
+            writer = wd.Writer(self, file_path)
+
         writer.write()
 
-    def write_pdf(self, file_path):
+    def write_pdf(self, file_path, parallel=None, streaming=False):
         """
         Write pdf.
 
-        :param file_path:
+        :param file_path: file path or writable binary stream (BytesIO, socket file, spooled temporary file).
+        :param parallel: number of worker processes laying out the pages, True for the number of cores.
+        :param streaming: lay the glyphs out as they are written, so the flowables of the whole document are never
+                          held in memory at once.
         :return:
         """
+        import boadoc.output as op
         import boadoc.pdf as pf
 
-        writer = pf.Writer(self, file_path)
+        if op.is_stream(file_path):
+            # Reportlab writes the whole pdf in one call, pass it on in chunks.
+            file_path = op.ChunkedWriter(file_path)
+
+        writer = pf.Writer(self, file_path, parallel=parallel, streaming=streaming)
         writer.write()
 
+    @staticmethod
+    def write_batch(specs, max_workers=None, chunk_size=1, fonts=None):
+        """
+        Write many documents in parallel across a process pool.
+
+        :param specs: iterable of (doc, file_path[, format]) tuples, doc is a DocFile or a callable returning one.
+        :param max_workers: number of worker processes, default to the number of cores.
+        :param chunk_size: number of specs sent to a worker at a time.
+        :param fonts: list of font keyword dictionaries registered in each worker at startup.
+        :return: list of BatchResult, one per spec.
+        """
+        import boadoc.batch as bt
+
+        return bt.render_batch(specs, max_workers=max_workers, chunk_size=chunk_size, fonts=fonts)
+
     @property
     def doc(self):
         """
@@ -79,13 +121,16 @@ class DocFile(object):
         """
         pass
 
-    def open_document(self, filename):
+    def open_document(self, filename, lazy=True):
         """
-        Open a new file document json format.
+        Open a document saved with save, in the JSON or binary format.
 
-        :param filename:
+        :param filename: file path or readable binary stream.
+        :param lazy: decode each page when it is accessed (e.g. written), instead of all of them now.
         """
-        pass
+        import boadoc.serialize as sz
+
+        sz.load(self, filename, lazy=lazy)
 
     def add_page(self, page):
         """
@@ -95,13 +140,18 @@ class DocFile(object):
         """
         self.pages.append(page)
 
-    def save(self, file_name):
+    def save(self, file_name, file_format=None):
         """
+        Save the document tree, as JSON for a .json file and in the compact binary format otherwise.  A table fed by
+        a row iterator keeps the rows read, so the document can still be written.
 
-        :param file_name:
+        :param file_name: file path or writable binary stream.
+        :param file_format: serialize.JSON or serialize.BINARY, to override the extension.
         :return:
         """
-        pass
+        import boadoc.serialize as sz
+
+        sz.save(self, file_name, file_format=file_format)
 
     def set_level(self):
         """
@@ -0,0 +1,112 @@
+import hashlib
+import threading
+
+import jinja2
+
+from jinja2.bccache import FileSystemBytecodeCache
+
+from .cache import LRUCache
+
+__author__ = 'jbui'
+
+
+CODE_CACHE_SIZE = 512
+
+
+class CachedEnvironment(jinja2.Environment):
+    """
+    Jinja environment that reuses compiled templates for from_string.
+
+    docxtpl renders each xml part of a template through from_string, which the jinja caches (loader cache and bytecode
+    cache) do not cover.  The compiled code is kept in memory by source and, when a bytecode cache is set, also on
+    disk so worker processes share it.
+
+    """
+    def __init__(self, code_cache_size=CODE_CACHE_SIZE, **kwargs):
+        jinja2.Environment.__init__(self, **kwargs)
+
+        self.code_cache = LRUCache(maxsize=code_cache_size)
+
+    def _autoescape_key(self):
+        # Compiled code depends on the autoescape setting at compile time, which docxtpl changes before rendering.
+        if callable(self.autoescape):
+            return self.autoescape
+        return bool(self.autoescape)
+
+    def compile_cached(self, source):
+        """
+        Return the code object of source, compiled at most once per process (and once across processes with a
+        bytecode cache).
+
+        :param source:
+        :return:
+        """
+        key = (self._autoescape_key(), source)
+
+        code = self.code_cache.get(key)
+        if code is not None:
+            return code
+
+        if self.bytecode_cache is not None and not callable(self.autoescape):
+            # The bucket file is named after the template name, so name it after the source.
+            name = '%s-%s' % (key[0], hashlib.sha1(source.encode('utf-8')).hexdigest())
+            bucket = self.bytecode_cache.get_bucket(self, name, None, source)
+
+            if bucket.code is None:
+                bucket.code = self.compile(source)
+                self.bytecode_cache.set_bucket(bucket)
+
+            code = bucket.code
+        else:
+            code = self.compile(source)
+
+        self.code_cache.set(key, code)
+
+        return code
+
+    def from_string(self, source, globals=None, template_class=None):
+        if not isinstance(source, str):
+            return jinja2.Environment.from_string(self, source, globals, template_class)
+
+        cls = template_class or self.template_class
+
+        return cls.from_code(self, self.compile_cached(source), self.make_globals(globals), None)
+
+
+_jinja_env = None
+_jinja_env_lock = threading.RLock()
+
+
+def configure_jinja_env(bytecode_cache_dir=None, use_bytecode_cache=True, code_cache_size=CODE_CACHE_SIZE, **kwargs):
+    """
+    Create the process wide jinja environment used by the word writer.
+
+    :param bytecode_cache_dir: directory of the compiled templates shared between processes, default to a folder in
+                               the temporary directory.
+    :param use_bytecode_cache: set to false to keep the compiled templates in memory only.
+    :param code_cache_size: number of compiled templates kept in memory.
+    :param kwargs: jinja2.Environment options.
+    :return:
+    """
+    global _jinja_env
+
+    kwargs.setdefault('autoescape', ['html', 'xml'])
+
+    if use_bytecode_cache:
+        kwargs.setdefault('bytecode_cache', FileSystemBytecodeCache(bytecode_cache_dir))
+
+    with _jinja_env_lock:
+        _jinja_env = CachedEnvironment(code_cache_size=code_cache_size, **kwargs)
+
+    return _jinja_env
+
+
+def get_jinja_env():
+    """
+    Return the process wide jinja environment, created on first use.
+    """
+    with _jinja_env_lock:
+        if _jinja_env is None:
+            configure_jinja_env()
+
+        return _jinja_env
@@ -4,6 +4,10 @@ __all__ = [
     "header"
 ]
 
+import weakref
+
+from .columns import column_data
+
 __author__ = 'jbui'
 
 
@@ -11,37 +15,81 @@ class Glyph(object):
     """
     Inherit Glyphs.  Used as a chunks in a document to organize each other.
 
+    Glyphs are slotted to keep large documents small: the children are stored once in child (a tuple until the first
+    child is added) and the parent is a weak reference.
+
     """
+    __slots__ = ('meta_data', 'id', 'class_id', 'level', '_parent', 'child', '__weakref__')
+
+    back_stop = False       # A flag telling the glyph if is nestable or not.
+
     def __init__(self, parent=None, **kwargs):
         self.meta_data = None
-        self.back_stop = False      # A flag telling the glyph if is nestable or not.
 
         self.id = kwargs.get('id', None)
         self.class_id = kwargs.get('class_id', None)
         self.level = kwargs.get('level', 1)
 
-        self.parent = parent
-        self.child = []
+        self._parent = None
+        self.child = ()
 
         # Link the parent with the child.
         if parent:
-            parent.child.append(self)
+            self.add_parent(parent)
+
+    @property
+    def parent(self):
+        return self._parent() if self._parent is not None else None
+
+    @parent.setter
+    def parent(self, value):
+        self._parent = weakref.ref(value) if value is not None else None
+
+    def __getstate__(self):
+        # Weak references cannot be pickled, keep the parent itself.
+        state = dict(
+            (name, getattr(self, name))
+            for cls in type(self).__mro__
+            for name in getattr(cls, '__slots__', ())
+            if name not in ('_parent', '__weakref__') and hasattr(self, name)
+        )
+        state['parent'] = self.parent
+
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
 
     def write(self, driver):
         print("Must Inherit %s" % self.__class__)
 
+    def add_child(self, child):
+        """
+        Append a child glyph.
+        """
+        if isinstance(self.child, tuple):
+            self.child = []
+
+        self.child.append(child)
+
     def add_parent(self, parent):
         """
         Adding parent after initialization.
         """
         self.parent = parent
-        parent.child.append(self)
+        parent.add_child(self)
 
     def set_level(self, level):
-        self.level = level
+        # Walk the children with a stack, deep trees would hit the recursion limit.
+        stack = [(self, level)]
+
+        while stack:
+            glyph, level = stack.pop()
+            glyph.level = level
 
-        for child in self.child:
-            child.set_level(level+1)
+            for child in glyph.child:
+                stack.append((child, level + 1))
 
 
 class Header(Glyph):
@@ -49,11 +97,14 @@ class Header(Glyph):
     Write the header of the file.
 
     """
+    __slots__ = ('text',)
+
+    back_stop = True
+
     def __init__(self, parent=None, **kwargs):
         Glyph.__init__(self, parent)
 
         self.text = kwargs.get('text', "")
-        self.back_stop = True
 
     def write(self, driver):
         driver.write_heading(self.text)
@@ -64,6 +115,8 @@ class Paragraph(Glyph):
     Add new paragraph.
 
     """
+    __slots__ = ('text', 'style')
+
     def __init__(self, parent=None, **kwargs):
         Glyph.__init__(self, parent)
 
@@ -92,6 +145,8 @@ class Section(Glyph):
     Section of the model.
 
     """
+    __slots__ = ('title',)
+
     def __init__(self, parent=None, **kwargs):
         """
 
@@ -102,7 +157,19 @@ class Section(Glyph):
 
         self.title = kwargs.get('title', None)
 
-        self.glyphs = []
+    @property
+    def glyphs(self):
+        """
+        Glyphs of the section, the same list as child.  The list is created on first access so it can be appended to.
+        """
+        if isinstance(self.child, tuple):
+            self.child = list(self.child)
+
+        return self.child
+
+    @glyphs.setter
+    def glyphs(self, glyphs):
+        self.child = glyphs
 
     def add_glyph(self, glyph):
         """
@@ -113,7 +180,6 @@ class Section(Glyph):
         if self.level:
             glyph.level = self.level + 1
 
-        self.glyphs.append(glyph)
         glyph.add_parent(self)
 
     def add_paragraph(self, paragraph):
@@ -132,12 +198,10 @@ class Section(Glyph):
         """
         Write the heading information.
         """
-        # Loop through the section to write out the section.
-        if self.title:
-            driver.write_heading(self.title, level=self.level)
+        from .traversal import write_glyphs
 
-        for glyph in self.glyphs:
-            glyph.write(driver)
+        # Walk the section iteratively to write out the section.
+        write_glyphs(driver, [self])
 
 
 class Picture(Glyph):
@@ -145,11 +209,13 @@ class Picture(Glyph):
     Picture Glyph's.
 
     """
+    __slots__ = ('file_path', 'width', 'height')
+
+    back_stop = True
+
     def __init__(self, file_path, parent=None, **kwargs):
         Glyph.__init__(self, parent)
 
-        self.back_stop = True
-
         self.file_path = file_path
 
         self.width = kwargs.get('width', None)
@@ -166,13 +232,44 @@ class Table(Glyph):
     """
     Table Glyph's.
 
+    The data is either a list of rows or a row iterator/generator (e.g. a database cursor).  An iterator is consumed
+    once when the table is written, so it never needs to be held fully in memory.
+
+    A pandas data frame, a numpy array or a dictionary of columns is formatted a column at a time (see
+    columns.ColumnFormat) into a columns.ColumnData, the column names becoming the header row.
+
     """
+    __slots__ = ('header_rows', 'chunk_size', 'data')
+
     def __init__(self, data=None, parent=None, **kwargs):
+        """
+
+        :param data:
+        :param parent:
+        :param kwargs:
+            header_rows: Number of header rows repeated on each page, 1 by default with column names.
+            chunk_size: Rows per chunk when the driver splits the table.
+            formats: ColumnFormat (or its options) of the columns keyed on their name or index.
+        """
         Glyph.__init__(self, parent)
 
-        self.header_rows = kwargs.get('header_rows', 0)
+        columns = column_data(data, formats=kwargs.get('formats'))
+        if columns is not None:
+            data = columns
+
+        default_header_rows = 1 if columns is not None and columns.header is not None else 0
+
+        self.header_rows = kwargs.get('header_rows', default_header_rows)
+        self.chunk_size = kwargs.get('chunk_size', None)     # Rows per chunk when the driver splits the table.
         self.data = data
 
+    @property
+    def is_streaming(self):
+        """
+        Return true if the data is a one shot row iterator instead of a sequence.
+        """
+        return self.data is not None and not hasattr(self.data, '__getitem__')
+
     def add_new_row(self, row, row_index=-1):
         self.data[row_index].append(row)
 
@@ -186,7 +283,7 @@ class Table(Glyph):
         pass
 
     def write(self, driver):
-        driver.write_table(self.data)
+        driver.write_table(self.data, header_rows=self.header_rows, chunk_size=self.chunk_size)
 
 
 class PageBreak(Glyph):
@@ -194,6 +291,8 @@ class PageBreak(Glyph):
     Page Break Glyph's.
 
     """
+    __slots__ = ()
+
     def __init__(self, parent=None, **kwargs):
         Glyph.__init__(self, parent)
 
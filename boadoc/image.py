@@ -0,0 +1,176 @@
+import hashlib
+import io
+import os
+
+from .cache import LRUCache
+
+__author__ = 'jbui'
+
+
+IMAGE_CACHE_SIZE = 256
+
+JPEG_QUALITY = 85
+
+
+class ImageCache(LRUCache):
+    """
+    Content addressed cache of the preprocessed images.  An image is downsampled to its target size at the given dpi
+    and re-encoded once per process, repeated logos and figures reuse the result.
+
+    """
+    def __init__(self, maxsize=IMAGE_CACHE_SIZE):
+        LRUCache.__init__(self, maxsize=maxsize)
+
+        # Digest of the files already read, keyed on (path, modified time, size).
+        self.digests = LRUCache(maxsize=maxsize)
+
+    def read(self, image_path_or_stream):
+        """
+        Return the digest and the bytes of the image.  The bytes are None when the digest of the file is known.
+
+        :param image_path_or_stream:
+        :return:
+        """
+        if isinstance(image_path_or_stream, str):
+            stat = os.stat(image_path_or_stream)
+            key = (os.path.abspath(image_path_or_stream), stat.st_mtime, stat.st_size)
+
+            digest = self.digests.get(key)
+            if digest is not None:
+                return digest, None
+
+            with open(image_path_or_stream, 'rb') as f:
+                data = f.read()
+
+            digest = hashlib.sha1(data).hexdigest()
+            self.digests.set(key, digest)
+
+            return digest, data
+
+        data = image_path_or_stream.read()
+
+        return hashlib.sha1(data).hexdigest(), data
+
+    def prepare(self, image_path_or_stream, width=None, height=None, dpi=None):
+        """
+        Return a stream of the image downsampled to width x height inches at dpi.
+
+        :param image_path_or_stream:
+        :param width: target width in inches.
+        :param height: target height in inches.
+        :param dpi: resolution of the output, None to keep the image as it is.
+        :return: BytesIO
+        """
+        digest, data = self.read(image_path_or_stream)
+        key = (digest, width, height, dpi)
+
+        result = self.get(key)
+
+        if result is None:
+            if data is None:
+                with open(image_path_or_stream, 'rb') as f:
+                    data = f.read()
+
+            result = downsample(data, width=width, height=height, dpi=dpi)
+            self.set(key, result)
+
+        return io.BytesIO(result)
+
+
+def pixel_size(image_path_or_stream):
+    """
+    Return the (width, height) in pixels of an image, reading its header only.  A stream is left at its position.
+
+    :param image_path_or_stream:
+    :return:
+    """
+    from PIL import Image
+
+    if isinstance(image_path_or_stream, str):
+        with Image.open(image_path_or_stream) as image:
+            return image.size
+
+    position = image_path_or_stream.tell()
+
+    try:
+        return Image.open(image_path_or_stream).size
+    finally:
+        image_path_or_stream.seek(position)
+
+
+def target_size(size, width=None, height=None, dpi=None):
+    """
+    Return the pixel size of the image drawn at width x height inches, preserving the aspect ratio when only one is
+    given.  Never upsample.
+
+    :param size: (width, height) in pixels.
+    :param width: inches.
+    :param height: inches.
+    :param dpi:
+    :return:
+    """
+    px_width, px_height = size
+
+    if not dpi or not (width or height):
+        return size
+
+    if width and height:
+        new_width, new_height = width * dpi, height * dpi
+    elif width:
+        new_width = width * dpi
+        new_height = new_width * px_height / float(px_width)
+    else:
+        new_height = height * dpi
+        new_width = new_height * px_width / float(px_height)
+
+    new_width = max(1, min(px_width, int(round(new_width))))
+    new_height = max(1, min(px_height, int(round(new_height))))
+
+    return new_width, new_height
+
+
+def downsample(data, width=None, height=None, dpi=None):
+    """
+    Downsample and re-encode the image bytes.  JPEG images are written as JPEG, the others (PNG line art, GIF, ...) as
+    optimized PNG so they stay lossless.  The original bytes are returned when this does not make the image smaller.
+
+    :param data: encoded image.
+    :param width: inches.
+    :param height: inches.
+    :param dpi:
+    :return: encoded image.
+    """
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(data))
+
+    size = target_size(image.size, width=width, height=height, dpi=dpi)
+    if size == image.size:
+        return data
+
+    is_jpeg = image.format == 'JPEG'
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or (image.mode == 'P' and 'transparency' in image.info)
+
+    if image.mode in ('1', 'L'):
+        image = image.convert('L')
+    else:
+        image = image.convert('RGBA' if has_alpha and not is_jpeg else 'RGB')
+
+    image = image.resize(size, Image.LANCZOS)
+
+    output = io.BytesIO()
+
+    if is_jpeg:
+        image.save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True, dpi=(dpi, dpi))
+    else:
+        image.save(output, format='PNG', optimize=True, dpi=(dpi, dpi))
+
+    result = output.getvalue()
+
+    if len(result) >= len(data):
+        return data
+
+    return result
+
+
+image_cache = ImageCache()
@@ -0,0 +1,215 @@
+import contextlib
+import heapq
+import itertools
+import json
+import logging
+import time
+import tracemalloc
+
+__author__ = 'jbui'
+
+
+logger = logging.getLogger(__name__)
+
+SLOWEST_GLYPHS = 10
+
+
+class Instrument(object):
+    """
+    Instrumentation interface of the writers, set with the instrument option of DocFile.  The writers and the
+    traversal only call it when one is set, so a document written without instrument pays nothing.
+
+    The phases are 'render' (template), 'glyphs' (glyph emission), 'build' (reportlab layout) and 'save'.  The
+    events are the reportlab progress callbacks ('PASS', 'PAGE', ...) and the render cache replays.
+
+    """
+    def phase(self, name):
+        """
+        Return a context manager around a phase of the write.
+
+        :param name:
+        """
+        return contextlib.nullcontext()
+
+    def write_glyph(self, handler, driver, glyph):
+        """
+        Call handler(driver, glyph), the traversal writing one glyph (its sub glyphs excluded).
+        """
+        handler(driver, glyph)
+
+    def event(self, name, value=None):
+        """
+        Record an event, e.g. ('PAGE', page number) from the reportlab progress callback.
+        """
+        pass
+
+
+NULL_PHASE = contextlib.nullcontext()
+
+
+def phase(instrument, name):
+    """
+    Return the context manager of a phase, a shared no-op one without instrument.
+    """
+    if instrument is None:
+        return NULL_PHASE
+
+    return instrument.phase(name)
+
+
+def glyph_label(glyph):
+    """
+    Return a short description of the glyph for the slowest glyphs report.
+    """
+    for name in ('text', 'title', 'file_path'):
+        value = getattr(glyph, name, None)
+
+        if isinstance(value, str):
+            return value[:40]
+
+    return ''
+
+
+class Profiler(Instrument):
+    """
+    Instrument measuring the time (and with memory, the allocations through tracemalloc) of each phase and glyph
+    type, with the slowest glyphs.
+
+    """
+    def __init__(self, memory=False, slowest=SLOWEST_GLYPHS):
+        """
+
+        :param memory: also measure the allocations, tracemalloc slows the write down several times.
+        :param slowest: number of slowest glyphs kept.
+        """
+        self.memory = memory
+        self.slowest = slowest
+
+        # name: {'count', 'seconds', 'allocated', 'peak'}
+        self.phases = {}
+        # glyph type name: {'count', 'seconds', 'allocated'}
+        self.glyphs = {}
+        # name: count
+        self.events = {}
+
+        self._slowest = []
+        self._counter = itertools.count()
+        self._depth = 0
+        self._started_tracing = False
+        # Peak traced memory of each open phase, saved before a nested phase resets the tracemalloc peak.
+        self._peaks = []
+
+    def _memory(self):
+        return tracemalloc.get_traced_memory()[0] if self.memory else 0
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+        if self.memory:
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            self._peaks.append(0)
+            tracemalloc.reset_peak()
+
+        self._depth += 1
+        memory = self._memory()
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+
+            stats = self.phases.setdefault(name, {'count': 0, 'seconds': 0.0, 'allocated': 0, 'peak': 0})
+            stats['count'] += 1
+            stats['seconds'] += seconds
+
+            if self.memory:
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(self._peaks.pop(), peak)
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+
+                stats['allocated'] += current - memory
+                stats['peak'] = max(stats['peak'], peak - memory)
+
+            self._depth -= 1
+
+            if self._depth == 0 and self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def write_glyph(self, handler, driver, glyph):
+        memory = self._memory()
+        start = time.perf_counter()
+
+        handler(driver, glyph)
+
+        seconds = time.perf_counter() - start
+        name = type(glyph).__name__
+
+        stats = self.glyphs.setdefault(name, {'count': 0, 'seconds': 0.0, 'allocated': 0})
+        stats['count'] += 1
+        stats['seconds'] += seconds
+        stats['allocated'] += self._memory() - memory
+
+        item = (seconds, next(self._counter), name, glyph_label(glyph))
+
+        if len(self._slowest) < self.slowest:
+            heapq.heappush(self._slowest, item)
+        elif item > self._slowest[0]:
+            heapq.heapreplace(self._slowest, item)
+
+    def event(self, name, value=None):
+        self.events[name] = self.events.get(name, 0) + 1
+
+    def slowest_glyphs(self):
+        """
+        Return the slowest glyphs, slowest first, as (seconds, glyph type name, label).
+        """
+        return [(seconds, name, label) for seconds, _, name, label in sorted(self._slowest, reverse=True)]
+
+    def report(self):
+        """
+        Return the measures as a dictionary of plain types.
+        """
+        return {
+            'phases': self.phases,
+            'glyphs': self.glyphs,
+            'slowest': [{'seconds': seconds, 'type': name, 'label': label}
+                        for seconds, name, label in self.slowest_glyphs()],
+            'events': self.events,
+        }
+
+    def to_json(self, **kwargs):
+        """
+        Return the report as JSON.
+
+        :param kwargs: json.dumps options.
+        """
+        return json.dumps(self.report(), **kwargs)
+
+    def write_json(self, file_path):
+        with open(file_path, 'w') as f:
+            f.write(self.to_json(indent=2))
+
+    def log(self, log=logger, level=logging.INFO):
+        """
+        Write the report to a logger, one line per phase, glyph type and slow glyph.
+        """
+        for name, stats in self.phases.items():
+            log.log(level, 'phase %s: %.3fs allocated %d bytes peak %d bytes',
+                    name, stats['seconds'], stats['allocated'], stats['peak'])
+
+        for name, stats in sorted(self.glyphs.items(), key=lambda item: -item[1]['seconds']):
+            log.log(level, 'glyph %s: %d in %.3fs allocated %d bytes',
+                    name, stats['count'], stats['seconds'], stats['allocated'])
+
+        for seconds, name, label in self.slowest_glyphs():
+            log.log(level, 'slow glyph %s %r: %.4fs', name, label, seconds)
+
+        for name, count in sorted(self.events.items()):
+            log.log(level, 'event %s: %d', name, count)
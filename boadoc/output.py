@@ -0,0 +1,68 @@
+import tempfile
+
+__author__ = 'jbui'
+
+
+OUTPUT_CHUNK_SIZE = 64 * 1024
+
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+class ChunkedWriter(object):
+    """
+    Writable binary stream wrapper.  Large writes (reportlab writes the whole pdf at once) are passed to the target in
+    chunks and flushed after each one, so a socket backed file does not buffer a second copy of the document.
+
+    Every other attribute (tell, seek, close, ...) is the one of the target.
+
+    """
+    def __init__(self, stream, chunk_size=OUTPUT_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+    def write(self, data):
+        view = memoryview(data)
+
+        for start in range(0, len(view), self.chunk_size):
+            self.stream.write(view[start:start + self.chunk_size])
+            self.flush()
+
+        return len(view)
+
+    def flush(self):
+        flush = getattr(self.stream, 'flush', None)
+        if flush:
+            flush()
+
+
+def is_stream(file_path_or_stream):
+    """
+    Return true for a writable stream instead of a file path.
+    """
+    return callable(getattr(file_path_or_stream, 'write', None))
+
+
+def spooled_output(max_size=SPOOL_MAX_SIZE):
+    """
+    Return a binary stream kept in memory until max_size bytes, then spilled to a temporary file.
+    """
+    return tempfile.SpooledTemporaryFile(max_size=max_size, mode='w+b')
+
+
+def iter_stream(stream, chunk_size=OUTPUT_CHUNK_SIZE):
+    """
+    Yield the content of stream from the start in chunks, e.g. to serve a document written in a spooled output.
+
+    :param stream:
+    :param chunk_size:
+    """
+    stream.seek(0)
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
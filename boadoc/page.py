@@ -45,11 +45,18 @@ class Page(object):
         """
         Write out the glyphs on the page.
         """
-        # Add page-break.
-        self.add_glyphs(PageBreak())
+        from .traversal import write_glyphs
 
-        for glyph in self.glyphs:
-            glyph.write(driver)
+        # Add page-break, without keeping it so the page can be written again.
+        write_glyphs(driver, self.glyphs + [PageBreak()])
+
+    def iter_write(self, driver):
+        """
+        Write out the glyphs on the page one at a time, yielding each glyph once written.
+        """
+        from .traversal import iter_write_glyphs
+
+        return iter_write_glyphs(driver, self.glyphs + [PageBreak()])
 
 
 class CoverPage(Page):
@@ -0,0 +1,210 @@
+import io
+import multiprocessing
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+
+__author__ = 'jbui'
+
+
+# Chunks per worker, smaller chunks balance the load better but each one embeds its own fonts and images.
+CHUNKS_PER_WORKER = 2
+
+
+class ChunkResult(object):
+    """
+    Pdf of one chunk laid out by a worker, with what the page callbacks of each of its pages need.
+
+    """
+    def __init__(self, data, pages, info=None):
+        """
+
+        :param data: pdf bytes, without the page callbacks.
+        :param pages: one picklable record per page, passed back to the page decoration.
+        :param info: anything else the merge needs, e.g. the restart boundaries.
+        """
+        self.data = data
+        self.pages = pages
+        self.info = info or {}
+
+
+def can_fork():
+    """
+    Return true if the workers can be forked.  The chunks are read by the workers from the memory of the parent, so
+    the story (with its page callbacks and closures) is never pickled.
+    """
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def worker_count(parallel):
+    """
+    Return the number of workers of the parallel option: True for the number of cores, or a number.
+    """
+    if parallel is True:
+        return os.cpu_count() or 1
+
+    return int(parallel or 1)
+
+
+def group_chunks(sizes, count):
+    """
+    Group consecutive items into at most count ranges of about the same total size.
+
+    :param sizes: size of each item, e.g. number of flowables between two page boundaries.
+    :param count: number of groups.
+    :return: list of (start, stop) ranges.
+    """
+    total = sum(sizes)
+    count = max(1, min(count, len(sizes)))
+
+    groups = []
+    start = 0
+    size = 0
+
+    for i, item_size in enumerate(sizes):
+        size += item_size
+
+        # Close the group once it holds its share of the items left.
+        left = count - len(groups)
+        if left > 1 and size * left >= total:
+            groups.append((start, i + 1))
+            total -= size
+            start = i + 1
+            size = 0
+
+    if start < len(sizes):
+        groups.append((start, len(sizes)))
+
+    return groups
+
+
+_job = None
+
+
+def _run(index):
+    return _job(index)
+
+
+def map_chunks(job, count, max_workers):
+    """
+    Run job(index) for each chunk in forked worker processes.
+
+    :param job: callable returning a ChunkResult, inherited by the workers.
+    :param count: number of chunks.
+    :param max_workers:
+    :return: list of ChunkResult in order.
+    """
+    global _job
+
+    _job = job
+    try:
+        context = multiprocessing.get_context('fork')
+
+        with ProcessPoolExecutor(max_workers=min(max_workers, count), mp_context=context) as executor:
+            return list(executor.map(_run, range(count)))
+    finally:
+        _job = None
+
+
+def draw_overlay(page_count, draw_page, pagesize):
+    """
+    Return the pdf bytes of the page callbacks of the whole document, with a flag per page telling if it is empty.
+
+    :param page_count:
+    :param draw_page: callable (canvas, page index) drawing the callbacks of a page.
+    :param pagesize: default page size.
+    :return:
+    """
+    from reportlab.pdfgen.canvas import Canvas
+
+    output = io.BytesIO()
+    canvas = Canvas(output, pagesize=pagesize)
+    drawn = []
+
+    for index in range(page_count):
+        draw_page(canvas, index)
+        drawn.append(bool(canvas._code))
+        canvas.showPage()
+
+    canvas.save()
+
+    return output.getvalue(), drawn
+
+
+UNDERLAY_NAME = '/BoaUnderlay'
+
+
+def underlay(writer, page, overlay_page):
+    """
+    Draw overlay_page underneath page, as a form XObject run before the page content.  Unlike merging the pages this
+    does not parse the content streams.
+
+    :param writer: PdfWriter holding page.
+    :param page: page of writer.
+    :param overlay_page: page of another pdf.
+    """
+    from pypdf.generic import ArrayObject, DecodedStreamObject, DictionaryObject, NameObject, RectangleObject
+
+    form = overlay_page['/Contents'].get_object()
+    form[NameObject('/Type')] = NameObject('/XObject')
+    form[NameObject('/Subtype')] = NameObject('/Form')
+    form[NameObject('/BBox')] = RectangleObject(overlay_page.mediabox)
+    form[NameObject('/Resources')] = overlay_page['/Resources']
+    form = form.clone(writer)
+
+    prefix = DecodedStreamObject()
+    prefix.set_data(('q %s Do Q\n' % UNDERLAY_NAME).encode('ascii'))
+
+    # Copy the resources, the chunk pages may share them.
+    resources = DictionaryObject(page['/Resources'].get_object())
+    xobjects = DictionaryObject(resources.get('/XObject', DictionaryObject()).get_object())
+    xobjects[NameObject(UNDERLAY_NAME)] = form.indirect_reference
+    resources[NameObject('/XObject')] = xobjects
+    page[NameObject('/Resources')] = resources
+
+    contents = page['/Contents']
+    if isinstance(contents.get_object(), ArrayObject):
+        contents = list(contents.get_object())
+    else:
+        contents = [contents]
+
+    page[NameObject('/Contents')] = ArrayObject([writer._add_object(prefix)] + contents)
+
+
+def merge(results, draw_page, pagesize, output):
+    """
+    Concatenate the pdf chunks and draw the page callbacks underneath each page, with the page numbers of the whole
+    document.  Requires pypdf.
+
+    :param results: list of ChunkResult.
+    :param draw_page: callable (canvas, page index) drawing the callbacks of a page.
+    :param pagesize: default page size.
+    :param output: file path or writable binary stream.
+    """
+    try:
+        from pypdf import PdfReader, PdfWriter
+    except ImportError:
+        raise ImportError('The parallel pdf build merges the parts with pypdf, install boadoc[parallel] (pip install '
+                          'pypdf)')
+
+    page_count = sum(len(result.pages) for result in results)
+    overlay, drawn = draw_overlay(page_count, draw_page, pagesize)
+    overlay_pages = PdfReader(io.BytesIO(overlay)).pages
+
+    writer = PdfWriter()
+    index = 0
+
+    for result in results:
+        for page in PdfReader(io.BytesIO(result.data)).pages:
+            page = writer.add_page(page)
+
+            if drawn[index]:
+                underlay(writer, page, overlay_pages[index])
+
+            index += 1
+
+    if isinstance(output, str):
+        with open(output, 'wb') as f:
+            writer.write(f)
+    else:
+        writer.write(output)
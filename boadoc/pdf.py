@@ -1,35 +1,55 @@
 # coding=utf-8
 
 import copy
+import hashlib
+import io
+import itertools
+import os
 import sys
+import threading
 import unicodedata
+import weakref
 
 from reportlab.pdfgen import canvas
 
 from reportlab.lib import colors
 from reportlab.lib.enums import TA_RIGHT
 from reportlab.lib.fonts import addMapping
-from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
 from reportlab.lib.units import cm, mm, inch
 from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfbase.ttfonts import TTFont, TTEncoding
 from reportlab.platypus import (
     BaseDocTemplate, Spacer, Frame, PageTemplate, NextPageTemplate, PageBreak,
     KeepTogether, CondPageBreak, Paragraph as _Paragraph, SimpleDocTemplate)
 from reportlab.platypus import Image
 
-from reportlab.platypus import Table, TableStyle
+from reportlab.platypus import Table, TableStyle, LongTable
 from reportlab.platypus.flowables import HRFlowable
 from reportlab.rl_config import defaultPageSize
 
-from reportlab.graphics.shapes import Drawing
-
+from boadoc.cache import LRUCache
+from boadoc.columns import ColumnData
+from boadoc.digest import get_render_cache
 from boadoc.document import DocFile
+from boadoc.image import image_cache, pixel_size
+from boadoc.instrument import phase
+from boadoc.parallel import (
+    CHUNKS_PER_WORKER, ChunkResult, can_fork, group_chunks, map_chunks, merge, worker_count)
 from boadoc.style import PARAGRAPH_KEY
 
 __author__ = 'jbui'
 
 
+class LazyStyleSheet(object):
+    """
+    Class attribute holding the sample style sheet, built on first access instead of at import and shared between the
+    writers through the style registry.  Writer.override_style sets a changed copy on the instance.
+    """
+    def __get__(self, instance, owner):
+        return style_registry.styles(variant=SAMPLE_STYLES)
+
+
 class Writer(DocFile):
     """
     Pdf writer is just an abstraction layer to the report lab writer.  It is built in concert
@@ -39,7 +59,7 @@ class Writer(DocFile):
     """
     PAGE_HEIGHT = defaultPageSize[1]
     PAGE_WIDTH = defaultPageSize[0]
-    styles = getSampleStyleSheet()
+    styles = LazyStyleSheet()
 
     Title = ""
     pageinfo = ""
@@ -56,9 +76,60 @@ class Writer(DocFile):
         self.myDocument = SimpleDocTemplate(file_path)
         self.Story = [Spacer(1, 2*inch)]
 
-        self.styles = getSampleStyleSheet()
+        self.render_cache = get_render_cache(self.render_cache)
+
+        # Number of worker processes laying out the pages, True for the number of cores.
+        self.parallel = kwargs.get('parallel')
+
+        # Position in the story where each page starts.
+        self.page_marks = []
+
+        # Lay the flowables out as the glyphs are written, instead of building the whole story first.
+        self.streaming = kwargs.get('streaming', False)
+
+    # Every glyph type can be cached, its flowables do not refer to the document.
+    uncached_types = ()
+
+    # (name, attributes) of the styles changed by override_style.
+    style_overrides = ()
+
+    def render_key(self):
+        """
+        Return what the rendered flowables depend on besides the glyphs, the frame size, the image resolution and the
+        changed styles.
+        """
+        return ('pdf', self.myDocument.width, self.myDocument.height, self.image_dpi, repr(self.style_overrides))
+
+    def override_style(self, name, **attributes):
+        """
+        Change the attributes of a sample style of this writer only, e.g.
+        override_style('Normal', alignment=TA_CENTER).  The other writers keep sharing the registry styles.
+
+        :param name: style name or alias, e.g. 'Normal'.
+        :param attributes: ParagraphStyle attributes.
+        """
+        self.styles = self.styles.override(name, **attributes)
+        self.style_overrides += ((name, sorted(attributes.items())),)
+
+    def mark(self):
+        return len(self.Story)
+
+    def capture(self, mark):
+        """
+        Return copies of the flowables written since mark, taken before the layout sets its state on them.
+        """
+        return [copy.copy(flowable) for flowable in self.Story[mark:]]
+
+    def replay(self, fragment):
+        """
+        Append copies of the captured flowables, so the builds sharing them do not share their layout state.
+        """
+        self.Story.extend(copy.copy(flowable) for flowable in fragment)
 
     def myFirstPage(self, canvas, doc):
+        if self.letterhead:
+            draw_letterhead(canvas, self.letterhead)
+
         canvas.saveState()
         canvas.setFont('Times-Bold',16)
         canvas.drawCentredString(self.PAGE_WIDTH/2.0, self.PAGE_HEIGHT-108, self.Title)
@@ -67,6 +138,9 @@ class Writer(DocFile):
         canvas.restoreState()
 
     def myLaterPages(self, canvas, doc):
+        if self.letterhead:
+            draw_letterhead(canvas, self.letterhead)
+
         canvas.saveState()
         canvas.setFont('Times-Roman', 9)
         canvas.drawString(inch, 0.75 * inch,"Page %d %s" % (doc.page, self.pageinfo))
@@ -78,8 +152,15 @@ class Writer(DocFile):
         :param path:
         :return:
         """
-        for page in self.pages:
-            page.write(self)
+        if self.streaming:
+            with phase(self.instrument, 'build'):
+                return self.myDocument.build(FlowableStream(self.iter_story()), onFirstPage=self.myFirstPage,
+                                             onLaterPages=self.myLaterPages)
+
+        with phase(self.instrument, 'glyphs'):
+            for page in self.pages:
+                self.page_marks.append(len(self.Story))
+                page.write(self)
 
         self.close()
 
@@ -88,7 +169,72 @@ class Writer(DocFile):
         Close and save the pdf write.
         :return:
         """
-        self.myDocument.build(self.Story, onFirstPage=self.myFirstPage, onLaterPages=self.myLaterPages)
+        if worker_count(self.parallel) > 1 and can_fork() and len(self.page_marks) > 1:
+            with phase(self.instrument, 'build'):
+                return self.build_parallel()
+
+        if self.instrument is None:
+            return self.myDocument.build(self.Story, onFirstPage=self.myFirstPage, onLaterPages=self.myLaterPages)
+
+        # Lay out and save apart, with the page events of the layout.
+        self.myDocument.setProgressCallBack(self.instrument.event)
+        # Private flag of BaseDocTemplate (reportlab 5.0.1) skipping the canvas save at the end of build.
+        self.myDocument._doSave = 0
+
+        with phase(self.instrument, 'build'):
+            self.myDocument.build(self.Story, onFirstPage=self.myFirstPage, onLaterPages=self.myLaterPages)
+
+        with phase(self.instrument, 'save'):
+            self.myDocument.canv.save()
+
+    def iter_story(self):
+        """
+        Yield the flowables of the document, writing the glyphs one at a time.  The story only holds the flowables
+        of the glyph being written.
+        """
+        for page in self.pages:
+            for _ in page.iter_write(self):
+                story, self.Story = self.Story, []
+
+                for flowable in story:
+                    yield flowable
+
+        for flowable in self.Story:
+            yield flowable
+
+        self.Story = []
+
+    def build_parallel(self):
+        """
+        Lay out groups of pages in worker processes and merge them, the page callbacks are drawn afterwards with the
+        page numbers of the whole document.
+        """
+        workers = worker_count(self.parallel)
+
+        bounds = [0] + self.page_marks[1:] + [len(self.Story)]
+        sizes = [stop - start for start, stop in zip(bounds, bounds[1:])]
+        groups = [(bounds[start], bounds[stop]) for start, stop in group_chunks(sizes, workers * CHUNKS_PER_WORKER)]
+
+        def build_chunk(index):
+            start, stop = groups[index]
+
+            doc = copy.copy(self.myDocument)
+            doc.filename = io.BytesIO()
+            doc.build(self.Story[start:stop], onFirstPage=dummy_stationery, onLaterPages=dummy_stationery)
+
+            return ChunkResult(doc.filename.getvalue(), [None] * doc.canv.getPageNumber())
+
+        results = map_chunks(build_chunk, len(groups), workers)
+
+        def draw_page(canvas, index):
+            self.myDocument.page = index + 1
+
+            if index == 0:
+                self.myFirstPage(canvas, self.myDocument)
+            else:
+                self.myLaterPages(canvas, self.myDocument)
+
+        merge(results, draw_page, self.myDocument.pagesize, self.myDocument.filename)
 
     def write_paragraph(self, texts, **kwargs):
         """
@@ -121,8 +267,8 @@ class Writer(DocFile):
         Return a new picture shape
         :param image_path_or_stream:
         :param **kwargs:
-            width = float value in inches
-            height = float value in inches
+            width = float value in points, the image width in pixels when None
+            height = float value in points, the image height in pixels when None
         :return:
         """
         from reportlab.lib.units import inch
@@ -130,22 +276,56 @@ class Writer(DocFile):
         width = kwargs.get('width')
         height = kwargs.get('height')
 
+        if self.image_dpi:
+            # The drawn size comes from the original image, the downsampled one is only drawn at that size.
+            px_width, px_height = pixel_size(image_path_or_stream)
+            width = width or px_width
+            height = height or px_height
+
+            image_path_or_stream = image_cache.prepare(image_path_or_stream, width=width / inch,
+                                                       height=height / inch, dpi=self.image_dpi)
+
         im = Image(image_path_or_stream, width, height)
         self.Story.append(im)
 
     def write_page_break(self):
-        #TODO: Add page break to pdf.
-        pass
+        self.Story.append(PageBreak())
 
     def write_table(self, table, **kwargs):
         """
         Write pdf table.
+
+        The rows are split into LongTable chunks of chunk_size rows, each repeating the header rows, so the rows can
+        come from an iterator and reportlab only measures one chunk at a time.  The column widths of the first chunk
+        are reused for the others so the chunks line up.
+
+        :param table: 2D sequence or row iterator.
+        :param kwargs:
+            header_rows: Number of header rows repeated on each chunk and page.
+            chunk_size: Number of body rows per chunk.
         """
-        row = len(table)
-        cols = len(table[0])
+        header_rows = kwargs.get('header_rows') or 0
+        chunk_size = kwargs.get('chunk_size') or TABLE_CHUNK_SIZE
+
+        tables = self.iter_table(table, header_rows, chunk_size)
 
-        t = Table(table)
-        self.Story.append(t)
+        if self.streaming:
+            # Expanded by the FlowableStream while the table is laid out.
+            self.Story.append(tables)
+        else:
+            self.Story.extend(tables)
+
+    def iter_table(self, table, header_rows, chunk_size):
+        col_widths = None
+
+        for rows in table_chunks(table, header_rows, chunk_size):
+            t = LongTable(rows, colWidths=col_widths, repeatRows=header_rows)
+
+            if col_widths is None:
+                t.wrap(self.myDocument.width, self.myDocument.height)
+                col_widths = t._colWidths
+
+            yield t
 
 
 PY2 = (sys.version_info[0] < 3)
@@ -156,39 +336,470 @@ else:
     string_type = str
 
 
+class FontRegistry(object):
+    """
+    Process wide registry of the TTF font families.  Each TTF file is parsed once, the faces (metrics and glyph data
+    used for subsetting) are shared between the font names using the same file, and registering a family already
+    registered with the same files does nothing.
+    """
+    def __init__(self):
+        self.fonts = []
+
+        # (font_name, paths) of the families already registered, the fast path.
+        self._registered = {}
+        # (font_name, file digests) of the families already registered.
+        self._families = set()
+        # File digest keyed on (path, modified time, size).
+        self._digests = {}
+        # First TTFont parsed from each file digest.
+        self._faces = {}
+
+        self._lock = threading.RLock()
+
+    def configure(self, fonts):
+        """
+        Set the font families to preload, a list of keyword dictionaries of register.
+        """
+        self.fonts = list(fonts or [])
+
+    def preload(self, fonts=None):
+        """
+        Register the configured font families, e.g. at worker startup.
+        """
+        for font in fonts if fonts is not None else self.fonts:
+            self.register(**font)
+
+    def digest(self, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+
+        digest = self._digests.get(key)
+        if digest is None:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha1(f.read()).hexdigest()
+            self._digests[key] = digest
+
+        return digest
+
+    def ttfont(self, name, path):
+        """
+        Return a TTFont named name, sharing the face parsed from the same file.
+        """
+        digest = self.digest(path)
+        base = self._faces.get(digest)
+
+        if base is None:
+            font = self._faces[digest] = TTFont(name, path)
+            return font
+
+        font = copy.copy(base)
+        font.fontName = name
+        font.encoding = TTEncoding()
+        font.state = weakref.WeakKeyDictionary()
+
+        return font
+
+    def register(self, regular, italic=None, bold=None, bolditalic=None,
+                 font_name='Reporting'):
+        """
+        Register the font family font_name and its Italic, Bold and
+        BoldItalic variants.
+        """
+        paths = (regular, italic or regular, bold or regular,
+                 bolditalic or bold or regular)
+
+        with self._lock:
+            if self._registered.get((font_name, paths)):
+                return False
+
+            family = (font_name, tuple(self.digest(path) for path in paths))
+
+            if family not in self._families:
+                names = ('%s' % font_name, '%s-Italic' % font_name,
+                         '%s-Bold' % font_name, '%s-BoldItalic' % font_name)
+
+                for name, path in zip(names, paths):
+                    pdfmetrics.registerFont(self.ttfont(name, path))
+
+                addMapping('%s' % font_name, 0, 0, names[0])
+                addMapping('%s' % font_name, 0, 1, names[1])
+                addMapping('%s' % font_name, 1, 0, names[2])
+                addMapping('%s' % font_name, 1, 1, names[3])
+
+                self._families = set(
+                    f for f in self._families if f[0] != font_name)
+                self._families.add(family)
+
+            self._registered = dict(
+                (k, v) for k, v in self._registered.items()
+                if k[0] != font_name)
+            self._registered[(font_name, paths)] = True
+
+        return True
+
+
+font_registry = FontRegistry()
+
+
 def register_fonts_from_paths(regular, italic=None, bold=None, bolditalic=None,
                               font_name='Reporting'):
     """
     Pass paths to TTF files which should be used for the PDFDocument
     """
-
-    pdfmetrics.registerFont(TTFont('%s' % font_name, regular))
-    pdfmetrics.registerFont(TTFont('%s-Italic' % font_name, italic or regular))
-    pdfmetrics.registerFont(TTFont('%s-Bold' % font_name, bold or regular))
-    pdfmetrics.registerFont(
-        TTFont('%s-BoldItalic' % font_name, bolditalic or bold or regular))
-
-    addMapping('%s' % font_name, 0, 0, '%s' % font_name)
-    addMapping('%s' % font_name, 0, 1, '%s-Italic' % font_name)
-    addMapping('%s' % font_name, 1, 0, '%s-Bold' % font_name)
-    addMapping('%s' % font_name, 1, 1, '%s-BoldItalic' % font_name)
+    return font_registry.register(
+        regular, italic=italic, bold=bold, bolditalic=bolditalic,
+        font_name=font_name)
 
 
 class Empty(object):
     pass
 
 
-def sanitize(text):
-    REPLACE_MAP = [
-        (u'&', '&#38;'),
-        (u'<', '&#60;'),
-        (u'>', '&#62;'),
-        # (u'ç', '&#231;'),
-        # (u'Ç', '&#199;'),
-        (u'\n', '<br />'),
-        (u'\r', ''),
-    ]
+def document_styles(font_name, font_size):
+    """
+    Build the styles of PDFDocument for a font, see PDFDocument.generate_style.
+    """
+    style = Empty()
+    style.fontName = font_name
+    style.fontSize = font_size
+
+    _styles = getSampleStyleSheet()
+
+    style.normal = _styles['Normal']
+    style.normal.fontName = '%s' % style.fontName
+    style.normal.fontSize = style.fontSize
+    style.normal.firstLineIndent = 0
+    # normal.textColor = '#0e2b58'
+
+    style.heading1 = copy.deepcopy(style.normal)
+    style.heading1.fontName = '%s' % style.fontName
+    style.heading1.fontSize = 1.5 * style.fontSize
+    style.heading1.leading = 2 * style.fontSize
+    # heading1.leading = 10*mm
+
+    style.heading2 = copy.deepcopy(style.normal)
+    style.heading2.fontName = '%s-Bold' % style.fontName
+    style.heading2.fontSize = 1.25 * style.fontSize
+    style.heading2.leading = 1.75 * style.fontSize
+    # heading2.leading = 5*mm
+
+    style.heading3 = copy.deepcopy(style.normal)
+    style.heading3.fontName = '%s-Bold' % style.fontName
+    style.heading3.fontSize = 1.1 * style.fontSize
+    style.heading3.leading = 1.5 * style.fontSize
+    style.heading3.textColor = '#666666'
+    # heading3.leading = 5*mm
+
+    style.small = copy.deepcopy(style.normal)
+    style.small.fontSize = style.fontSize - 0.9
+
+    style.smaller = copy.deepcopy(style.normal)
+    style.smaller.fontSize = style.fontSize * 0.75
+
+    style.bold = copy.deepcopy(style.normal)
+    style.bold.fontName = '%s-Bold' % style.fontName
+
+    style.boldr = copy.deepcopy(style.bold)
+    style.boldr.alignment = TA_RIGHT
+
+    style.right = copy.deepcopy(style.normal)
+    style.right.alignment = TA_RIGHT
+
+    style.indented = copy.deepcopy(style.normal)
+    style.indented.leftIndent = 0.5*cm
+
+    style.tablenotes = copy.deepcopy(style.indented)
+    style.tablenotes.fontName = '%s-Italic' % style.fontName
+
+    style.paragraph = copy.deepcopy(style.normal)
+    style.paragraph.spaceBefore = 1
+    style.paragraph.spaceAfter = 1
+
+    style.bullet = copy.deepcopy(style.normal)
+    style.bullet.bulletFontName = 'Symbol'
+    style.bullet.bulletFontSize = 7
+    style.bullet.bulletIndent = 6
+    style.bullet.firstLineIndent = 0
+    style.bullet.leftIndent = 15
+
+    style.numberbullet = copy.deepcopy(style.normal)
+    style.numberbullet.bulletFontName = style.paragraph.fontName
+    style.numberbullet.bulletFontSize = style.paragraph.fontSize
+    style.numberbullet.bulletIndent = 0
+    style.numberbullet.firstLineIndent = 0
+    style.numberbullet.leftIndent = 15
+
+    # alignment = TA_RIGHT
+    # leftIndent = 0.4*cm
+    # spaceBefore = 0
+    # spaceAfter = 0
+
+    style.tableBase = (
+        (
+            'FONT', (0, 0), (-1, -1),
+            '%s' % style.fontName,  style.fontSize),
+        ('TOPPADDING', (0, 0), (-1, -1), 0),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+        ('LEFTPADDING', (0, 0), (-1, -1), 0),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+        ('FIRSTLINEINDENT', (0, 0), (-1, -1), 0),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    )
+
+    style.table = style.tableBase+(
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+    )
+
+    style.tableLLR = style.tableBase+(
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+        ('VALIGN', (0, 0), (-1, 0), 'BOTTOM'),
+    )
+
+    style.tableHead = style.tableBase+(
+        (
+            'FONT', (0, 0), (-1, 0),
+            '%s-Bold' % style.fontName,  style.fontSize),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('TOPPADDING', (0, 0), (-1, -1), 1),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+        ('LINEABOVE', (0, 0), (-1, 0), 0.2, colors.black),
+        ('LINEBELOW', (0, 0), (-1, 0), 0.2, colors.black),
+    )
+
+    style.tableOptional = style.tableBase+(
+        (
+            'FONT', (0, 0), (-1, 0),
+            '%s-Italic' % style.fontName, style.fontSize),
+        ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+        ('RIGHTPADDING', (1, 0), (-1, -1), 2*cm),
+    )
+
+    return StyleSet(dict(vars(style)))
+
+
+class StyleSet(object):
+    """
+    Shared styles for one font, by attribute (style.normal, style.table, style.fontName) or by name
+    (styles['Normal']).  The styles are plain ParagraphStyle, so they can be the parent of a new style, and are never
+    changed in place: override returns a new set holding the changed style and sharing all the others.
+    """
+    def __init__(self, styles):
+        self.__dict__['_styles'] = styles
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__['_styles'][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('The shared styles are not set in place, use override')
+
+    def __getitem__(self, name):
+        return self._styles[name]
+
+    def __contains__(self, name):
+        return name in self._styles
+
+    def override(self, name, **attributes):
+        """
+        Return a copy of the set where the paragraph style name is a clone with attributes changed.
+
+        :param name:
+        :param attributes: ParagraphStyle attributes.
+        :return:
+        """
+        styles = dict(self._styles)
+        styles[name] = styles[name].clone(styles[name].name, **attributes)
+
+        return StyleSet(styles)
+
+    def replace(self, **values):
+        """
+        Return a copy of the set with whole values replaced, e.g. replace(table=commands).
+        """
+        styles = dict(self._styles)
+        styles.update(values)
+
+        return StyleSet(styles)
+
+
+def sample_styles(font_name=None, font_size=None):
+    """
+    Build the reportlab sample style sheet, by name and alias, used by Writer.
+    """
+    sheet = getSampleStyleSheet()
+
+    styles = dict(sheet.byName)
+    styles.update(sheet.byAlias)
+
+    return StyleSet(styles)
+
+
+DOCUMENT_STYLES = 'document'
+SAMPLE_STYLES = 'sample'
+
+STYLE_REGISTRY_SIZE = 64
+
+
+class StyleRegistry(LRUCache):
+    """
+    Process wide registry of the style sets keyed on (font name, font size, variant).  Each set is built once and
+    shared between the documents and the threads, a document changing a style gets its own copy of that
+    style only (StyleSet.override).
+    """
+    def __init__(self, maxsize=STYLE_REGISTRY_SIZE):
+        LRUCache.__init__(self, maxsize=maxsize)
+
+        # Variant: callable (font name, font size) returning a StyleSet.
+        self.builders = {
+            DOCUMENT_STYLES: document_styles,
+            SAMPLE_STYLES: sample_styles,
+        }
+
+    def register(self, variant, builder):
+        """
+        Set the builder of a variant of style set, the sets already built are dropped.
+
+        :param variant:
+        :param builder: callable (font name, font size) returning a StyleSet.
+        """
+        self.builders[variant] = builder
+        self.clear()
+
+    def styles(self, font_name=None, font_size=None, variant=DOCUMENT_STYLES):
+        """
+        Return the shared StyleSet of the font.
 
+        :param font_name:
+        :param font_size:
+        :param variant: DOCUMENT_STYLES (PDFDocument) or SAMPLE_STYLES (the reportlab sample sheet of Writer).
+        :return:
+        """
+        return self.get_or_create((font_name, font_size, variant),
+                                  lambda: self.builders[variant](font_name, font_size))
+
+
+style_registry = StyleRegistry()
+
+
+TABLE_CHUNK_SIZE = 500
+
+
+def chunk_rows(data, header_rows=0, chunk_size=TABLE_CHUNK_SIZE):
+    """
+    Split table data into chunks of at most chunk_size body rows.  Each chunk starts with the header rows.
+
+    Works on any row iterable and only holds one chunk at a time.
+    """
+    rows = iter(data)
+    header = list(itertools.islice(rows, header_rows))
+
+    chunk = list(itertools.islice(rows, chunk_size))
+    if not chunk:
+        if header:
+            yield header
+        return
+
+    while chunk:
+        yield header + chunk
+        chunk = list(itertools.islice(rows, chunk_size))
+
+
+def table_chunks(data, header_rows=0, chunk_size=TABLE_CHUNK_SIZE):
+    """
+    Yield the chunks of chunk_rows with their text prepared for reportlab.
+    The text columns of a ColumnData are normalized once for the whole
+    table, a column at a time, the other data one chunk at a time.
+    """
+    if isinstance(data, ColumnData):
+        data = data.map(lambda values: sanitize_column(values, markup=False))
+
+        for rows in chunk_rows(data, header_rows, chunk_size):
+            yield rows
+        return
+
+    for rows in chunk_rows(data, header_rows, chunk_size):
+        yield sanitize_rows(rows)
+
+
+STREAM_LOOKAHEAD = 32
+
+
+class FlowableStream(object):
+    """
+    Story pulled lazily from an iterable of flowables, for a single pass build.
+
+    BaseDocTemplate.build only works at the front of the story (story[0], del story[0], story[0:0] = split parts),
+    so the stream reads ahead a few flowables (for keepWithNext) and a flowable is released as soon as it is laid
+    out.  An item that is itself an iterator (e.g. the chunks of a table) is expanded lazily in place.
+    """
+    def __init__(self, iterable, lookahead=STREAM_LOOKAHEAD):
+        self.lookahead = lookahead
+
+        self._buffer = []
+        self._iterators = [iter(iterable)]
+
+    def _fill(self, size):
+        buffer = self._buffer
+        iterators = self._iterators
+
+        while len(buffer) < size and iterators:
+            item = next(iterators[-1], StopIteration)
+
+            if item is StopIteration:
+                iterators.pop()
+            elif hasattr(item, '__next__'):
+                iterators.append(item)
+            else:
+                buffer.append(item)
+
+    def _stop(self, index):
+        if isinstance(index, slice):
+            return self.lookahead if index.stop is None else index.stop
+
+        return index + 1
+
+    def __len__(self):
+        # The number of flowables read ahead, zero once the story is exhausted.
+        self._fill(self.lookahead)
+        return len(self._buffer)
+
+    def __getitem__(self, index):
+        self._fill(self._stop(index))
+        return self._buffer[index]
+
+    def __setitem__(self, index, value):
+        self._fill(self._stop(index))
+        self._buffer[index] = value
+
+    def __delitem__(self, index):
+        self._fill(self._stop(index))
+        del self._buffer[index]
+
+    def insert(self, index, value):
+        self._buffer.insert(index, value)
+
+
+# Markup escapes done by sanitize.  A chain of str.replace is faster than
+# str.translate or a regex substitution with a callback for these few
+# characters, each replace is a single C level scan.
+REPLACE_MAP = [
+    (u'&', '&#38;'),
+    (u'<', '&#60;'),
+    (u'>', '&#62;'),
+    # (u'ç', '&#231;'),
+    # (u'Ç', '&#199;'),
+    (u'\n', '<br />'),
+    (u'\r', ''),
+]
+
+# Joins a column to process it with a single call, it cannot appear in text.
+COLUMN_SEPARATOR = u'\x00'
+
+
+def sanitize(text):
     for p, q in REPLACE_MAP:
         text = text.replace(p, q)
     return text
@@ -198,13 +809,62 @@ def normalize(text):
     """
     Some layers of reportlab, PDF or font handling or whatever cannot handle
     german umlauts in decomposed form correctly. Normalize everything to
-    NFKC.
+    NFKC.  Pure ASCII text is already normalized and returned as is.
     """
     if not isinstance(text, string_type):
         text = string_type(text)
+    if text.isascii():
+        return text
     return unicodedata.normalize('NFKC', text)
 
 
+def sanitize_column(values, markup=True):
+    """
+    Normalize (and sanitize for markup) a whole column of text at once: the
+    column is joined, normalized once and run through the str.replace chain
+    of REPLACE_MAP once, instead of once per cell.
+
+    :param values: list of text.
+    :param markup: escape the text for Paragraph markup, or only normalize it
+                   for plain table cells.
+    :return: list of text.
+    """
+    values = [v if isinstance(v, string_type) else string_type(v)
+              for v in values]
+    if not values:
+        return values
+
+    text = COLUMN_SEPARATOR.join(values)
+
+    if text.count(COLUMN_SEPARATOR) != len(values) - 1:
+        return [sanitize(normalize(v)) if markup else normalize(v)
+                for v in values]
+
+    text = normalize(text)
+    if markup:
+        text = sanitize(text)
+
+    return text.split(COLUMN_SEPARATOR)
+
+
+def sanitize_rows(rows, markup=False):
+    """
+    Return a copy of rows with the text cells prepared by sanitize_column,
+    the other cells (numbers, flowables) are left alone.  Plain text cells
+    are drawn as is by reportlab, so they are only normalized by default.
+    """
+    rows = [list(row) for row in rows]
+
+    positions = [(row, i) for row in rows for i, cell in enumerate(row)
+                 if isinstance(cell, string_type)]
+
+    values = sanitize_column([row[i] for row, i in positions], markup=markup)
+    for (row, i), value in zip(positions, values):
+        row[i] = value
+
+    return rows
+
+
 def MarkupParagraph(txt, *args, **kwargs):
     if not txt:
         return _Paragraph(u'', *args, **kwargs)
@@ -217,6 +877,146 @@ def Paragraph(txt, *args, **kwargs):
     return _Paragraph(sanitize(normalize(txt)), *args, **kwargs)
 
 
+SVG_CACHE_SIZE = 64
+
+svg_cache = LRUCache(maxsize=SVG_CACHE_SIZE)
+
+
+def load_svg(path):
+    """
+    Return the drawing parsed from an SVG file and a form name unique to the
+    file version.  Drawings are cached by path and modified time, they must
+    not be modified.
+    """
+    from svglib.svglib import svg2rlg
+
+    key = (os.path.abspath(path), os.path.getmtime(path))
+
+    def _load():
+        name = 'svg-%s' % hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return svg2rlg(path), name
+
+    return svg_cache.get_or_create(key, _load)
+
+
+def draw_svg_form(canvas, drawing, name, show_boundaries=False):
+    """
+    Render the drawing at scale 1 into the form XObject name.
+    """
+    from reportlab.graphics import renderPDF
+
+    xL, yL, xH, yH = drawing.getBounds()
+
+    # Room for the strokes outside of the bounds.
+    margin = 10
+    canvas.beginForm(
+        name,
+        lowerx=min(xL, 0) - margin,
+        lowery=min(yL, 0) - margin,
+        upperx=max(xH, drawing.width) + margin,
+        uppery=max(yH, drawing.height) + margin)
+    renderPDF.draw(drawing, canvas, 0, 0, showBoundary=show_boundaries)
+    canvas.endForm()
+
+
+HTML_CACHE_SIZE = 1024
+
+html_cache = LRUCache(maxsize=HTML_CACHE_SIZE)
+
+
+def parse_html(html):
+    """
+    Parse an HTML fragment with the lxml HTML parser, falling back to the
+    BeautifulSoup parser only when the fragment is malformed.  The top level
+    elements are the children of the returned element.
+    """
+    import lxml.etree
+    import lxml.html
+
+    try:
+        return lxml.html.fragment_fromstring(
+            html, create_parent='div',
+            parser=lxml.html.HTMLParser(recover=False))
+    except (lxml.etree.ParserError, lxml.etree.XMLSyntaxError):
+        import lxml.html.soupparser
+
+        return lxml.html.soupparser.fromstring(html)
+
+
+def html_fragments(html):
+    """
+    Convert a small subset of HTML into a tuple of (markup text, bullet text,
+    style name) for the paragraphs of PDFDocument.mini_html.
+    """
+    import lxml.html
+
+    TAG_MAP = {
+        'strong': 'b',
+        'em': 'i',
+        'br': 'br',  # Leave br tags alone
+    }
+
+    BULLETPOINT = u'•'
+
+    fragments = []
+
+    def _p(text, list_bullet_point, style=None):
+        fragments.append((text, list_bullet_point, style or 'paragraph'))
+
+    def _remove_attributes(element):
+        for key in element.attrib:
+            del element.attrib[key]
+
+    def _handle_element(element, list_bullet_point=False, style=None):
+        _remove_attributes(element)
+
+        if element.tag in TAG_MAP:
+            element.tag = TAG_MAP[element.tag]
+
+        if element.tag in ('ul',):
+            for item in element:
+                _handle_element(
+                    item,
+                    list_bullet_point=BULLETPOINT,
+                    style='bullet')
+            list_bullet_point = False
+        elif element.tag in ('ol',):
+            for counter, item in enumerate(element):
+                _handle_element(
+                    item,
+                    list_bullet_point=u'{}.'.format(counter + 1),
+                    style='numberbullet',
+                )
+            list_bullet_point = False
+        elif element.tag in ('p', 'li'):
+            for tag in reversed(list(element.iterdescendants())):
+                _remove_attributes(tag)
+                if tag.tag in TAG_MAP:
+                    tag.tag = TAG_MAP[tag.tag]
+                else:
+                    tag.drop_tag()
+
+            _p(
+                lxml.html.tostring(
+                    element, method='xml', encoding=string_type),
+                list_bullet_point,
+                style)
+        else:
+            if element.text:
+                _p(element.text, list_bullet_point, style)
+
+            for item in element:
+                _handle_element(item, list_bullet_point, style)
+
+        if element.tail:
+            _p(element.tail, list_bullet_point, style)
+
+    for element in parse_html(html):
+        _handle_element(element)
+
+    return tuple(fragments)
+
+
 class BottomTable(Table):
     """
     This table will automatically be moved to the bottom of the page using the
@@ -242,6 +1042,64 @@ class RestartPageBreak(PageBreak):
     pass
 
 
+class DeferredCanvas(canvas.Canvas):
+    """
+    Canvas drawing the page callbacks once the page count and the restart boundaries are known.  Each page is shown
+    as it is laid out (so bookmarks and links point at their page) and starts by drawing a form of its own, the
+    callback of the page is drawn in that form at save, underneath the page content as if it had run at the beginning
+    of the page.
+    """
+    def __init__(self, *args, **kwargs):
+        canvas.Canvas.__init__(self, *args, **kwargs)
+        self._deferred = None
+        # (form name, page number, page size, deferred callback) of each page.
+        self._page_forms = []
+
+    def showPage(self):
+        if self._deferred:
+            name = 'boadocPage%d' % len(self._page_forms)
+            self._page_forms.append((name, self._pageNumber, self._pagesize, self._deferred))
+
+            self._code.insert(0, '/%s Do' % self._doc.getXObjectName(name))
+            self._formsinuse.append(name)
+
+        canvas.Canvas.showPage(self)
+        self._deferred = None
+
+    def save(self):
+        if len(self._code):
+            self.showPage()
+
+        page_number = self._pageNumber
+
+        for name, self._pageNumber, (width, height), (on_page, doc, page_state) in self._page_forms:
+            self.beginForm(name, 0, 0, width, height)
+            doc.replay_page(on_page, self, page_state)
+            self.endForm()
+
+        self._pageNumber = page_number
+        self._page_forms = []
+        canvas.Canvas.save(self)
+
+
+class RecordingCanvas(canvas.Canvas):
+    """
+    Canvas of a chunk laid out in parallel.  The page callbacks are not drawn, the template and state of each page
+    are recorded on the document so they can be drawn once the page numbers of the whole document are known.
+    """
+    def __init__(self, *args, **kwargs):
+        canvas.Canvas.__init__(self, *args, **kwargs)
+        self._deferred = None
+
+    def showPage(self):
+        if self._deferred:
+            on_page, doc, page_state = self._deferred
+            doc.page_records.append((doc.pageTemplates.index(doc.pageTemplate), page_state))
+
+        canvas.Canvas.showPage(self)
+        self._deferred = None
+
+
 class ReportingDocTemplate(BaseDocTemplate):
     def __init__(self, *args, **kwargs):
         BaseDocTemplate.__init__(self, kwargs.get('file_path'), **kwargs)
@@ -251,11 +1109,110 @@ class ReportingDocTemplate(BaseDocTemplate):
         self._lastNumPages = 0
         self.setProgressCallBack(self._onProgress_cb)
 
+        # Lay out once and run the page callbacks at the end (see DeferredCanvas).
+        self.single_pass = kwargs.get('single_pass', False)
+
+        # instrument.Instrument receiving the progress events ('STARTED' for each pass, 'PAGE', ...).
+        self.instrument = kwargs.get('instrument', None)
+
         # For batch reports with several PDFs concatenated
         self.restartDoc = False
         self.restartDocIndex = 0
         self.restartDocPageNumbers = []
 
+    def handle_pageBegin(self):
+        if not self.single_pass:
+            return BaseDocTemplate.handle_pageBegin(self)
+
+        # Record the page callback with the state page_index needs instead of drawing it now.
+        template = self.pageTemplate
+        on_page = template.onPage
+
+        self.canv._deferred = (on_page, self, {
+            'page': self.page + 1,
+            'restartDocIndex': self.restartDocIndex,
+            'bottomTableIsLast': self.bottomTableIsLast,
+        })
+
+        template.onPage = dummy_stationery
+        try:
+            BaseDocTemplate.handle_pageBegin(self)
+        finally:
+            template.onPage = on_page
+
+    def replay_page(self, on_page, canv, page_state):
+        """
+        Run a deferred page callback with the state of its page and the final page count.
+        """
+        self.__dict__.update(page_state)
+        on_page(canv, self)
+
+    def build_chunk(self, story):
+        """
+        Lay out a part of the story on its own, in single pass, without drawing the page callbacks.
+
+        :param story: flowables starting on a new page, e.g. after a RestartPageBreak.
+        :return: ChunkResult with the template and page state of each page.
+        """
+        self.numPages = 0
+        self._lastNumPages = 0
+        self.bottomTableHeight = 0
+        self.bottomTableIsLast = False
+        self.restartDoc = False
+        self.restartDocIndex = 0
+        self.restartDocPageNumbers = []
+
+        self.single_pass = True
+        self.page_records = []
+        self.filename = io.BytesIO()
+
+        self.build(story, canvasmaker=RecordingCanvas)
+
+        return ChunkResult(self.filename.getvalue(), self.page_records, {
+            'restartDocPageNumbers': self.restartDocPageNumbers,
+            'bottomTableHeight': self.bottomTableHeight,
+        })
+
+    def merge_chunks(self, results, output):
+        """
+        Merge the chunks into output and draw their page callbacks, with the page numbers, page count and restart
+        boundaries of the whole document.
+
+        :param results: list of ChunkResult in story order.
+        :param output: file path or writable binary stream.
+        """
+        records = []
+        page_numbers = []
+        bottom_table_height = 0
+
+        for result in results:
+            offset = len(records)
+            restarts = len(page_numbers)
+
+            for template_index, page_state in result.pages:
+                page_state = dict(page_state)
+                page_state['page'] += offset
+                page_state['restartDocIndex'] += restarts
+
+                records.append((template_index, page_state))
+
+            page_numbers.extend(page + offset for page in result.info['restartDocPageNumbers'])
+            bottom_table_height = result.info['bottomTableHeight'] or bottom_table_height
+
+        self.numPages = len(records)
+        self.restartDoc = bool(page_numbers)
+        self.restartDocPageNumbers = page_numbers
+        self.bottomTableHeight = bottom_table_height
+
+        def draw_page(canv, index):
+            template_index, page_state = records[index]
+            template = self.pageTemplates[template_index]
+
+            canv.setPageSize(template.pagesize or self.pagesize)
+            self.replay_page(template.onPage, canv, page_state)
+
+        merge(results, draw_page, self.pagesize, output)
+
     def afterFlowable(self, flowable):
         self.numPages = max(self.canv.getPageNumber(), self.numPages)
         self.bottomTableIsLast = False
@@ -286,6 +1243,9 @@ class ReportingDocTemplate(BaseDocTemplate):
             self.restartDocIndex = 0
             # self.restartDocPageNumbers = []
 
+        if self.instrument is not None:
+            self.instrument.event(what, arg)
+
     def page_index(self):
         """
         Return the current page index as a tuple (current_page, total_pages)
@@ -337,12 +1297,55 @@ def dummy_stationery(c, doc):
     pass
 
 
+def stamp_form(canvas, name, draw):
+    """
+    Record draw(canvas) once per document as the page sized form XObject
+    name, then reference the form on the current page.
+    """
+    if not canvas.hasForm(name):
+        width, height = canvas._pagesize
+        canvas.beginForm(name, 0, 0, width, height)
+        draw(canvas)
+        canvas.endForm()
+
+    canvas.doForm(name)
+
+
+LETTERHEAD_CACHE_SIZE = 16
+
+letterhead_cache = LRUCache(maxsize=LETTERHEAD_CACHE_SIZE)
+
+
+def draw_letterhead(canvas, path, page=0):
+    """
+    Draw a page of a PDF file as background.  The page is read once per
+    process and embedded once per document as a form XObject.
+    Requires pdfrw.
+    """
+    try:
+        from pdfrw import PdfReader
+        from pdfrw.buildxobj import pagexobj
+        from pdfrw.toreportlab import makerl
+    except ImportError:
+        raise ImportError('The letterhead is read with pdfrw, install boadoc[letterhead] (pip install pdfrw)')
+
+    key = (os.path.abspath(path), os.path.getmtime(path), page)
+    xobj = letterhead_cache.get_or_create(
+        key, lambda: pagexobj(PdfReader(path).pages[page]))
+
+    # makerl converts the page once per document and returns the form name.
+    canvas.saveState()
+    canvas.doForm(makerl(canvas, xobj))
+    canvas.restoreState()
+
+
 class PDFDocument(object):
     """
 
     """
     show_boundaries = False
     _watermark = None
+    _letterhead = None
 
     def __init__(self, *args, **kwargs):
         self.doc = ReportingDocTemplate(*args, **kwargs)
@@ -359,132 +1362,31 @@ class PDFDocument(object):
         }
 
     def generate_style(self, font_name=None, font_size=None):
-        self.style = Empty()
-        self.style.fontName = font_name or self.font_name
-        self.style.fontSize = font_size or self.font_size
-
-        _styles = getSampleStyleSheet()
-
-        self.style.normal = _styles['Normal']
-        self.style.normal.fontName = '%s' % self.style.fontName
-        self.style.normal.fontSize = self.style.fontSize
-        self.style.normal.firstLineIndent = 0
-        # normal.textColor = '#0e2b58'
-
-        self.style.heading1 = copy.deepcopy(self.style.normal)
-        self.style.heading1.fontName = '%s' % self.style.fontName
-        self.style.heading1.fontSize = 1.5 * self.style.fontSize
-        self.style.heading1.leading = 2 * self.style.fontSize
-        # heading1.leading = 10*mm
-
-        self.style.heading2 = copy.deepcopy(self.style.normal)
-        self.style.heading2.fontName = '%s-Bold' % self.style.fontName
-        self.style.heading2.fontSize = 1.25 * self.style.fontSize
-        self.style.heading2.leading = 1.75 * self.style.fontSize
-        # heading2.leading = 5*mm
-
-        self.style.heading3 = copy.deepcopy(self.style.normal)
-        self.style.heading3.fontName = '%s-Bold' % self.style.fontName
-        self.style.heading3.fontSize = 1.1 * self.style.fontSize
-        self.style.heading3.leading = 1.5 * self.style.fontSize
-        self.style.heading3.textColor = '#666666'
-        # heading3.leading = 5*mm
-
-        self.style.small = copy.deepcopy(self.style.normal)
-        self.style.small.fontSize = self.style.fontSize - 0.9
-
-        self.style.smaller = copy.deepcopy(self.style.normal)
-        self.style.smaller.fontSize = self.style.fontSize * 0.75
-
-        self.style.bold = copy.deepcopy(self.style.normal)
-        self.style.bold.fontName = '%s-Bold' % self.style.fontName
-
-        self.style.boldr = copy.deepcopy(self.style.bold)
-        self.style.boldr.alignment = TA_RIGHT
-
-        self.style.right = copy.deepcopy(self.style.normal)
-        self.style.right.alignment = TA_RIGHT
-
-        self.style.indented = copy.deepcopy(self.style.normal)
-        self.style.indented.leftIndent = 0.5*cm
-
-        self.style.tablenotes = copy.deepcopy(self.style.indented)
-        self.style.tablenotes.fontName = '%s-Italic' % self.style.fontName
-
-        self.style.paragraph = copy.deepcopy(self.style.normal)
-        self.style.paragraph.spaceBefore = 1
-        self.style.paragraph.spaceAfter = 1
-
-        self.style.bullet = copy.deepcopy(self.style.normal)
-        self.style.bullet.bulletFontName = 'Symbol'
-        self.style.bullet.bulletFontSize = 7
-        self.style.bullet.bulletIndent = 6
-        self.style.bullet.firstLineIndent = 0
-        self.style.bullet.leftIndent = 15
-
-        self.style.numberbullet = copy.deepcopy(self.style.normal)
-        self.style.numberbullet.bulletFontName = self.style.paragraph.fontName
-        self.style.numberbullet.bulletFontSize = self.style.paragraph.fontSize
-        self.style.numberbullet.bulletIndent = 0
-        self.style.numberbullet.firstLineIndent = 0
-        self.style.numberbullet.leftIndent = 15
-
-        # alignment = TA_RIGHT
-        # leftIndent = 0.4*cm
-        # spaceBefore = 0
-        # spaceAfter = 0
-
-        self.style.tableBase = (
-            (
-                'FONT', (0, 0), (-1, -1),
-                '%s' % self.style.fontName,  self.style.fontSize),
-            ('TOPPADDING', (0, 0), (-1, -1), 0),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
-            ('LEFTPADDING', (0, 0), (-1, -1), 0),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 0),
-            ('FIRSTLINEINDENT', (0, 0), (-1, -1), 0),
-            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        )
-
-        self.style.table = self.style.tableBase+(
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-        )
-
-        self.style.tableLLR = self.style.tableBase+(
-            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, 0), 'BOTTOM'),
-        )
+        """
+        Use the shared styles of the font, see StyleRegistry.  Change a style with override_style.
+        """
+        self.style = style_registry.styles(font_name or self.font_name, font_size or self.font_size)
 
-        self.style.tableHead = self.style.tableBase+(
-            (
-                'FONT', (0, 0), (-1, 0),
-                '%s-Bold' % self.style.fontName,  self.style.fontSize),
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-            ('TOPPADDING', (0, 0), (-1, -1), 1),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
-            ('LINEABOVE', (0, 0), (-1, 0), 0.2, colors.black),
-            ('LINEBELOW', (0, 0), (-1, 0), 0.2, colors.black),
-        )
+    def override_style(self, name, **attributes):
+        """
+        Change the attributes of a paragraph style of this document only, e.g. override_style('normal', fontSize=10).
+        The other documents keep sharing the registry styles.
 
-        self.style.tableOptional = self.style.tableBase+(
-            (
-                'FONT', (0, 0), (-1, 0),
-                '%s-Italic' % self.style.fontName, self.style.fontSize),
-            ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-            ('RIGHTPADDING', (1, 0), (-1, -1), 2*cm),
-        )
+        :param name: attribute of the style set, e.g. 'heading1'.
+        :param attributes: ParagraphStyle attributes.
+        """
+        self.style = self.style.override(name, **attributes)
 
     def init_templates(self, page_fn, page_fn_later=None):
         self.doc.addPageTemplates([
             PageTemplate(
                 id='First',
                 frames=[self.frame],
-                onPage=page_fn),
+                onPage=self.stationery(page_fn)),
             PageTemplate(
                 id='Later',
                 frames=[self.frame],
-                onPage=page_fn_later or page_fn),
+                onPage=self.stationery(page_fn_later or page_fn)),
         ])
         self.story.append(NextPageTemplate('Later'))
 
@@ -503,11 +1405,11 @@ class PDFDocument(object):
             PageTemplate(
                 id='First',
                 frames=[full_frame],
-                onPage=page_fn),
+                onPage=self.stationery(page_fn)),
             PageTemplate(
                 id='Later',
                 frames=[full_frame],
-                onPage=page_fn_later or page_fn),
+                onPage=self.stationery(page_fn_later or page_fn)),
         ])
         self.story.append(NextPageTemplate('Later'))
 
@@ -549,11 +1451,11 @@ class PDFDocument(object):
             PageTemplate(
                 id='First',
                 frames=[address_frame, rest_frame],
-                onPage=page_fn),
+                onPage=self.stationery(page_fn)),
             PageTemplate(
                 id='Later',
                 frames=[full_frame],
-                onPage=page_fn_later or page_fn),
+                onPage=self.stationery(page_fn_later or page_fn)),
         ])
         self.story.append(NextPageTemplate('Later'))
 
@@ -595,9 +1497,26 @@ class PDFDocument(object):
     def spacer(self, height=0.6*cm):
         self.story.append(Spacer(1, height))
 
-    def table(self, data, columns, style=None):
-        self.story.append(
-            Table(data, columns, style=style or self.style.table))
+    def table(self, data, columns, style=None, header_rows=0,
+              chunk_size=TABLE_CHUNK_SIZE, streaming=False):
+        """
+        Add a table split into LongTable chunks of chunk_size rows, each
+        repeating the header rows.
+
+        The chunks are built here and kept in the story until it is built,
+        so the memory still grows with the table.  With streaming the chunks
+        are built as the story is laid out and only the current one is held,
+        data can then be a row iterator; the story is then built in a single
+        pass (see generate).
+        """
+        tables = (LongTable(rows, columns, style=style or self.style.table,
+                            repeatRows=header_rows)
+                  for rows in table_chunks(data, header_rows, chunk_size))
+
+        if streaming:
+            self.story.append(tables)
+        else:
+            self.story.extend(tables)
 
     def hr(self):
         self.story.append(
@@ -609,85 +1528,32 @@ class PDFDocument(object):
 
     def mini_html(self, html):
         """Convert a small subset of HTML into ReportLab paragraphs
-        Requires lxml and BeautifulSoup."""
-        import lxml.html
-        import lxml.html.soupparser
+        Requires lxml, and BeautifulSoup for malformed HTML.
 
-        TAG_MAP = {
-            'strong': 'b',
-            'em': 'i',
-            'br': 'br',  # Leave br tags alone
-        }
+        The converted fragments are cached by HTML string and style, so
+        repeated boilerplate is not parsed again."""
+        key = (html, self.style.fontName, self.style.fontSize)
 
-        BULLETPOINT = u'•'
+        fragments = html_cache.get(key)
+        if fragments is None:
+            fragments = html_fragments(html)
+            html_cache.set(key, fragments)
 
-        def _p(text, list_bullet_point, style=None):
+        for text, list_bullet_point, style in fragments:
             if list_bullet_point:
                 self.story.append(
                     MarkupParagraph(
                         text,
-                        style or self.style.paragraph,
+                        getattr(self.style, style),
                         bulletText=list_bullet_point)
                 )
             else:
                 self.story.append(
                     MarkupParagraph(
                         text,
-                        style or self.style.paragraph)
+                        getattr(self.style, style))
                 )
 
-        def _remove_attributes(element):
-            for key in element.attrib:
-                del element.attrib[key]
-
-        def _handle_element(element, list_bullet_point=False, style=None):
-            _remove_attributes(element)
-
-            if element.tag in TAG_MAP:
-                element.tag = TAG_MAP[element.tag]
-
-            if element.tag in ('ul',):
-                for item in element:
-                    _handle_element(
-                        item,
-                        list_bullet_point=BULLETPOINT,
-                        style=self.style.bullet)
-                list_bullet_point = False
-            elif element.tag in ('ol',):
-                for counter, item in enumerate(element):
-                    _handle_element(
-                        item,
-                        list_bullet_point=u'{}.'.format(counter + 1),
-                        style=self.style.numberbullet,
-                    )
-                list_bullet_point = False
-            elif element.tag in ('p', 'li'):
-                for tag in reversed(list(element.iterdescendants())):
-                    _remove_attributes(tag)
-                    if tag.tag in TAG_MAP:
-                        tag.tag = TAG_MAP[tag.tag]
-                    else:
-                        tag.drop_tag()
-
-                _p(
-                    lxml.html.tostring(
-                        element, method='xml', encoding=string_type),
-                    list_bullet_point,
-                    style)
-            else:
-                if element.text:
-                    _p(element.text, list_bullet_point, style)
-
-                for item in element:
-                    _handle_element(item, list_bullet_point, style)
-
-            if element.tail:
-                _p(element.tail, list_bullet_point, style)
-
-        soup = lxml.html.soupparser.fromstring(html)
-        for element in soup:
-            _handle_element(element)
-
     def pagebreak(self):
         self.story.append(PageBreak())
 
@@ -702,10 +1568,75 @@ class PDFDocument(object):
     def append(self, data):
         self.story.append(data)
 
-    def generate(self):
-        self.doc.multiBuild(self.story)
+    def generate(self, single_pass=False, parallel=None):
+        """
+        Build the document.  multiBuild lays the story out until the page count is stable, in single pass mode the
+        story is laid out once and the page callbacks ("Page X of Y") are drawn afterwards.  Table of contents and
+        other index flowables need multiBuild.
+
+        In parallel mode the story is split after the restart page breaks, the parts are laid out in single pass by
+        worker processes (forked, so the story is not pickled) and merged with pypdf.
+
+        The story can also be an iterator of flowables (e.g. a generator), or hold iterators (e.g. a streaming table),
+        laid out in single pass as it is read so only the flowables of the current page are held in memory.
+
+        :param single_pass:
+        :param parallel: number of worker processes, True for the number of cores.
+        """
+        if not isinstance(self.story, list) or any(hasattr(item, '__next__') for item in self.story):
+            # A story generator is laid out as it is read, in a single pass.
+            self.doc.single_pass = True
+
+            with phase(self.doc.instrument, 'build'):
+                return self.doc.build(FlowableStream(self.story), canvasmaker=DeferredCanvas)
+
+        workers = worker_count(parallel)
+
+        if workers > 1 and can_fork():
+            groups = self.split_story(workers * CHUNKS_PER_WORKER)
+
+            if len(groups) > 1:
+                return self.generate_parallel(groups, workers)
+
+        if single_pass or self.doc.single_pass:
+            self.doc.single_pass = True
+
+            with phase(self.doc.instrument, 'build'):
+                self.doc.build(self.story, canvasmaker=DeferredCanvas)
+        else:
+            with phase(self.doc.instrument, 'build'):
+                self.doc.multiBuild(self.story)
+
+    def split_story(self, count):
+        """
+        Return at most count (start, stop) ranges of the story, split after restart page breaks.
+        """
+        bounds = [0]
+        bounds.extend(i + 1 for i, flowable in enumerate(self.story) if isinstance(flowable, RestartPageBreak))
+
+        if bounds[-1] < len(self.story):
+            bounds.append(len(self.story))
+
+        sizes = [stop - start for start, stop in zip(bounds, bounds[1:])]
+
+        return [(bounds[start], bounds[stop]) for start, stop in group_chunks(sizes, count)]
+
+    def generate_parallel(self, groups, workers):
+        output = self.doc.filename
+        story = self.story
+
+        def build_chunk(index):
+            start, stop = groups[index]
+            return self.doc.build_chunk(story[start:stop])
+
+        results = map_chunks(build_chunk, len(groups), workers)
+
+        self.doc.merge_chunks(results, output)
 
     def confidential(self, canvas):
+        stamp_form(canvas, 'stationery-confidential', self.draw_confidential)
+
+    def draw_confidential(self, canvas):
         canvas.saveState()
 
         canvas.translate(18.5*cm, 27.4*cm)
@@ -734,27 +1665,67 @@ class PDFDocument(object):
 
     def draw_watermark(self, canvas):
         if self._watermark:
-            canvas.saveState()
-            canvas.rotate(60)
-            canvas.setFillColorRGB(0.9, 0.9, 0.9)
-            canvas.setFont('%s' % self.style.fontName, 120)
-            canvas.drawCentredString(195*mm, -30*mm, self._watermark)
-            canvas.restoreState()
+            name = 'stationery-watermark-%s' % hashlib.sha1(
+                repr((self._watermark, self.style.fontName)).encode('utf-8')
+            ).hexdigest()
 
-    def draw_svg(self, canvas, path, xpos=0, ypos=0, xsize=None, ysize=None):
-        from reportlab.graphics import renderPDF
-        from svglib.svglib import svg2rlg
+            stamp_form(canvas, name, self._draw_watermark)
+
+    def _draw_watermark(self, canvas):
+        canvas.saveState()
+        canvas.rotate(60)
+        canvas.setFillColorRGB(0.9, 0.9, 0.9)
+        canvas.setFont('%s' % self.style.fontName, 120)
+        canvas.drawCentredString(195*mm, -30*mm, self._watermark)
+        canvas.restoreState()
+
+    def letterhead(self, path, page=0):
+        """
+        Use a page of a letterhead PDF as background of every page.
+        Requires pdfrw.
+        """
+        self._letterhead = (path, page)
+
+    def draw_letterhead(self, canvas):
+        if self._letterhead:
+            draw_letterhead(canvas, *self._letterhead)
+
+    def stationery(self, page_fn):
+        """
+        Return page_fn drawing the letterhead first.
+        """
+        def _page_fn(canvas, doc):
+            self.draw_letterhead(canvas)
+            page_fn(canvas, doc)
 
-        drawing = svg2rlg(path)
+        return _page_fn
+
+    def draw_svg(self, canvas, path, xpos=0, ypos=0, xsize=None, ysize=None):
+        """
+        Draw an SVG file.  The parsed drawing is cached by path and modified
+        time and rendered once per document as a form XObject, later calls
+        (e.g. on every page from a page callback) only reference the form.
+        """
+        drawing, name = load_svg(path)
         xL, yL, xH, yH = drawing.getBounds()
 
+        scale = 1
         if xsize:
-            drawing.renderScale = xsize / (xH - xL)
+            scale = xsize / (xH - xL)
         if ysize:
-            drawing.renderScale = ysize / (yH - yL)
+            scale = ysize / (yH - yL)
+
+        if self.show_boundaries:
+            name += '-boundary'
+
+        if not canvas.hasForm(name):
+            draw_svg_form(canvas, drawing, name, self.show_boundaries)
 
-        renderPDF.draw(
-            drawing, canvas, xpos, ypos, showBoundary=self.show_boundaries)
+        canvas.saveState()
+        canvas.translate(xpos, ypos)
+        canvas.scale(scale, scale)
+        canvas.doForm(name)
+        canvas.restoreState()
 
     def next_frame(self):
         self.story.append(CondPageBreak(20*cm))
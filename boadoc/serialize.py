@@ -0,0 +1,541 @@
+import base64
+import io
+import json
+import mmap
+import os
+import struct
+
+from .glyph import Header, Paragraph, Section, Picture, Table, PageBreak
+from .output import is_stream
+from .page import Page, CoverPage, TableOfContent
+
+__author__ = 'jbui'
+
+
+FORMAT_VERSION = 1
+
+JSON = 'json'
+BINARY = 'binary'
+
+JSON_EXTENSION = '.json'
+
+# Binary form: MAGIC, header length (uint32 little endian), JSON header, then the page records and the buffers.
+MAGIC = b'BOADOC\x00\x01'
+HEADER_LENGTH = struct.Struct('<I')
+
+# Options of DocFile saved with the document, the runtime ones (render cache, instrument) are not.
+DOCUMENT_FIELDS = ('logo', 'header', 'footer', 'template_path', 'context', 'letterhead', 'image_dpi')
+
+# Fields of the base Glyph saved in front of the fields of each type.
+GLYPH_FIELDS = ('level', 'id', 'class_id')
+
+# Fields with their own encoding, stored in a buffer in the binary form.
+OUT_OF_BAND = {('picture', 'file_path'), ('table', 'data')}
+
+
+class Schema(object):
+    """
+    Glyph and page types of the serialized document, with the fields saved for each.  A glyph is saved as a list:
+    [type index, level, id, class_id, fields..., sub glyphs].  The schema is saved in the header, so a file is read
+    with the field names it was written with.
+
+    Picture images and table data are fields with their own encoding, stored out of band (in a buffer) in the binary
+    form.
+
+    """
+    def __init__(self):
+        # Name: (class, fields)
+        self.glyphs = {}
+        self.pages = {}
+
+        self._names = {}
+
+    def register(self, glyph_class, name, fields):
+        """
+        Add a glyph type.  A subclass of a registered type must be registered too, it would lose its own fields.
+
+        :param glyph_class: Glyph subclass, created without calling __init__.
+        :param name: name in the file.
+        :param fields: attributes saved, they must be plain JSON values.
+        """
+        self.glyphs[name] = (glyph_class, tuple(fields))
+        self._names[glyph_class] = name
+
+    def register_page(self, page_class, name):
+        self.pages[name] = (page_class, ('title', 'use_header', 'use_footer'))
+        self._names[page_class] = name
+
+    def name(self, obj):
+        name = self._names.get(type(obj))
+
+        if name is None:
+            raise TypeError('%s cannot be serialized, register it on serialize.schema' % type(obj).__name__)
+
+        return name
+
+    def header(self):
+        """
+        Return the glyph types and fields in the order of the type indexes.
+        """
+        return {
+            'glyphs': [[name, list(fields)] for name, (_, fields) in self.glyphs.items()],
+            'pages': [[name, list(fields)] for name, (_, fields) in self.pages.items()],
+        }
+
+
+schema = Schema()
+schema.register(Header, 'header', ('text',))
+schema.register(Paragraph, 'paragraph', ('text', 'style'))
+schema.register(Section, 'section', ('title',))
+schema.register(Picture, 'picture', ('file_path', 'width', 'height'))
+schema.register(Table, 'table', ('data', 'header_rows', 'chunk_size'))
+schema.register(PageBreak, 'page_break', ())
+schema.register_page(Page, 'page')
+schema.register_page(CoverPage, 'cover_page')
+schema.register_page(TableOfContent, 'table_of_content')
+
+
+class Encoder(object):
+    """
+    Encode the pages of a document as lists of plain values.  With buffers, the images and the table data are
+    appended to it and replaced by their index.
+
+    """
+    def __init__(self, schema=schema, buffers=None):
+        self.schema = schema
+        self.buffers = buffers
+
+        self._indexes = dict((name, i) for i, name in enumerate(schema.glyphs))
+        self._images = {}
+
+    def encode_page(self, page):
+        _, fields = self.schema.pages[self.schema.name(page)]
+
+        return [self.schema.name(page)] + [getattr(page, name) for name in fields] + [self.encode_glyphs(page.glyphs)]
+
+    def encode_glyphs(self, glyphs):
+        """
+        Return the records of the glyphs and their sub glyphs, walked with a stack.
+        """
+        records = []
+        stack = [(iter(glyphs), records)]
+
+        while stack:
+            for glyph in stack[-1][0]:
+                name = self.schema.name(glyph)
+                _, fields = self.schema.glyphs[name]
+
+                record = [self._indexes[name]] + [getattr(glyph, field) for field in GLYPH_FIELDS]
+                record.extend(self.encode_field(glyph, name, field) for field in fields)
+                stack[-1][1].append(record)
+
+                children = glyph.child
+                if children:
+                    record.append([])
+                    stack.append((iter(children), record[-1]))
+                    break
+            else:
+                stack.pop()
+
+        return records
+
+    def encode_field(self, glyph, name, field):
+        value = getattr(glyph, field)
+
+        if (name, field) not in OUT_OF_BAND:
+            return value
+
+        if name == 'picture':
+            return self.encode_image(value)
+
+        if getattr(glyph, 'is_streaming', False):
+            # A row iterator is read once, the table keeps the rows read so it can still be written.
+            value = glyph.data = [list(row) for row in value]
+
+        return self.encode_table(value)
+
+    def encode_image(self, image):
+        """
+        A path is kept in the JSON form, a stream is embedded.  The binary form embeds every image once per content.
+        """
+        if isinstance(image, str) and self.buffers is None:
+            return image
+
+        from .image import image_cache
+
+        position = None if isinstance(image, str) else image.tell()
+        digest, data = image_cache.read(image)
+
+        if position is not None:
+            image.seek(position)
+
+        if self.buffers is None:
+            return {'base64': base64.b64encode(data).decode('ascii')}
+
+        if digest not in self._images:
+            if data is None:
+                with open(image, 'rb') as f:
+                    data = f.read()
+
+            self.buffers.append(data)
+            self._images[digest] = len(self.buffers) - 1
+
+        return {'buffer': self._images[digest]}
+
+    def encode_table(self, data):
+        """
+        The cells that are not JSON values are saved as str, the way the writers print them.
+        """
+        if data is None:
+            return None
+
+        rows = [list(row) for row in data]
+
+        if self.buffers is None:
+            return json.loads(json.dumps(rows, default=str))
+
+        self.buffers.append(json.dumps(rows, separators=(',', ':'), default=str).encode('utf-8'))
+
+        return {'buffer': len(self.buffers) - 1}
+
+
+class Decoder(object):
+    """
+    Create the pages and glyphs of the records, with the schema of the file header.
+
+    """
+    def __init__(self, header, buffer=None, schema=schema):
+        """
+
+        :param header: schema saved in the file.
+        :param buffer: callable returning the bytes of a buffer index, for the binary form.
+        :param schema: glyph classes of the current code.
+        """
+        self.buffer = buffer
+
+        self.glyphs = []
+
+        for name, fields in header['glyphs']:
+            if name not in schema.glyphs:
+                raise ValueError('Unknown glyph type %r in the document' % name)
+
+            self.glyphs.append((schema.glyphs[name][0], name, tuple(GLYPH_FIELDS) + tuple(fields)))
+
+        self.pages = dict((name, (schema.pages[name][0], tuple(fields))) for name, fields in header['pages'])
+
+    def decode_page(self, record):
+        page_class, fields = self.pages[record[0]]
+
+        page = page_class()
+        for name, value in zip(fields, record[1:]):
+            setattr(page, name, value)
+
+        page.glyphs = self.decode_glyphs(record[-1])
+
+        return page
+
+    def decode_glyphs(self, records):
+        """
+        Return the glyphs of the records.  The glyphs are created without __init__, only their fields are set.
+        """
+        glyphs = []
+        stack = [(iter(records), glyphs, None)]
+
+        while stack:
+            for record in stack[-1][0]:
+                glyph_class, name, fields = self.glyphs[record[0]]
+
+                glyph = glyph_class.__new__(glyph_class)
+                glyph.meta_data = None
+                glyph._parent = None
+                glyph.child = ()
+
+                for field, value in zip(fields, record[1:]):
+                    if isinstance(value, dict) and (name, field) in OUT_OF_BAND:
+                        value = self.decode_field(name, field, value)
+                    setattr(glyph, field, value)
+
+                parent = stack[-1][2]
+                if parent is not None:
+                    glyph.parent = parent
+                    parent.child.append(glyph)
+                else:
+                    stack[-1][1].append(glyph)
+
+                if len(record) > len(fields) + 1:
+                    glyph.child = []
+                    stack.append((iter(record[-1]), None, glyph))
+                    break
+            else:
+                stack.pop()
+
+        return glyphs
+
+    def decode_field(self, name, field, value):
+        if 'base64' in value:
+            return io.BytesIO(base64.b64decode(value['base64']))
+
+        data = self.buffer(value['buffer'])
+
+        if name == 'table' and field == 'data':
+            return json.loads(data)
+
+        return io.BytesIO(data)
+
+
+class LazyPages(object):
+    """
+    Pages of a saved document, each one is decoded when it is first accessed and then kept, so the edits of a page
+    (and set_level) last until the document is written.  The pages never accessed are never decoded.
+
+    """
+    def __init__(self, count, decode, source=None):
+        """
+
+        :param count: number of saved pages.
+        :param decode: callable returning the page of an index.
+        :param source: memory map the pages are decoded from, closed once they are all decoded.
+        """
+        self._decode = decode
+        self._source = source
+        # Page, or None while not decoded.  The added pages are appended.
+        self._pages = [None] * count
+        self._decoded = [False] * count
+        self._remaining = count
+
+        if not count:
+            self.close()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError('page index out of range')
+
+        if index < len(self._decoded) and not self._decoded[index]:
+            self._pages[index] = self._decode(index)
+            self._decoded[index] = True
+            self._remaining -= 1
+
+            if not self._remaining:
+                self.close()
+
+        return self._pages[index]
+
+    def __iter__(self):
+        for index in range(0, len(self)):
+            yield self[index]
+
+    def __reduce__(self):
+        # Pickled (e.g. to a batch worker) as the list of pages.
+        return list, (list(self),)
+
+    def append(self, page):
+        self._pages.append(page)
+
+    def close(self):
+        """
+        Release the memory map of the saved document, the pages not decoded yet can no longer be read.
+        """
+        release(self._source)
+        self._source = None
+
+
+def document_header(doc):
+    return dict((name, getattr(doc, name)) for name in DOCUMENT_FIELDS)
+
+
+def dump_json(doc, output):
+    """
+    Write the document as JSON.  The picture paths are kept, the picture streams are embedded in base64.
+
+    :param doc: DocFile
+    :param output: text stream.
+    """
+    encoder = Encoder()
+
+    json.dump({
+        'format': 'boadoc',
+        'version': FORMAT_VERSION,
+        'schema': schema.header(),
+        'document': document_header(doc),
+        'pages': [encoder.encode_page(page) for page in doc.pages],
+    }, output, separators=(',', ':'))
+
+
+def dump_binary(doc, output):
+    """
+    Write the document in the binary form: a JSON header indexing the pages and the buffers, then the page records
+    (compact JSON) and the buffers (images, table data) as raw bytes.  The images are embedded.
+
+    :param doc: DocFile
+    :param output: binary stream.
+    """
+    buffers = []
+    encoder = Encoder(buffers=buffers)
+
+    records = [json.dumps(encoder.encode_page(page), separators=(',', ':')).encode('utf-8') for page in doc.pages]
+
+    offset = 0
+    pages = []
+    for record in records:
+        pages.append([offset, len(record)])
+        offset += len(record)
+
+    buffer_index = []
+    for data in buffers:
+        buffer_index.append([offset, len(data)])
+        offset += len(data)
+
+    header = json.dumps({
+        'version': FORMAT_VERSION,
+        'schema': schema.header(),
+        'document': document_header(doc),
+        'pages': pages,
+        'buffers': buffer_index,
+    }, separators=(',', ':')).encode('utf-8')
+
+    output.write(MAGIC)
+    output.write(HEADER_LENGTH.pack(len(header)))
+    output.write(header)
+
+    for data in records:
+        output.write(data)
+
+    for data in buffers:
+        output.write(data)
+
+
+def save(doc, file_path, file_format=None):
+    """
+    Save the document tree.  The rows of a table fed by a row iterator are read and kept in the table, so it is then
+    held in memory.
+
+    :param doc: DocFile
+    :param file_path: file path or writable binary stream.
+    :param file_format: JSON or BINARY, guessed from the extension of a path (.json for JSON), BINARY for a stream.
+    """
+    if file_format is None:
+        is_json = not is_stream(file_path) and os.path.splitext(file_path)[1].lower() == JSON_EXTENSION
+        file_format = JSON if is_json else BINARY
+
+    if is_stream(file_path):
+        if file_format == JSON:
+            text = io.TextIOWrapper(file_path, encoding='utf-8')
+            dump_json(doc, text)
+            text.flush()
+            text.detach()
+        else:
+            dump_binary(doc, file_path)
+
+    else:
+        # Written aside and moved over the file, the pages of a document opened from it are still read from its map.
+        temp_path = '%s.%d.tmp' % (file_path, os.getpid())
+
+        try:
+            if file_format == JSON:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    dump_json(doc, f)
+            else:
+                with open(temp_path, 'wb') as f:
+                    dump_binary(doc, f)
+
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def read_data(file_path):
+    """
+    Return the content of a saved document, memory mapped for a file so only the pages read are paged in.
+    """
+    if hasattr(file_path, 'read'):
+        return file_path.read()
+
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+
+        # The map stays valid once the file is closed.
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def release(data):
+    """
+    Close the memory map returned by read_data, nothing for bytes.
+    """
+    if isinstance(data, mmap.mmap):
+        data.close()
+
+
+def load(doc, file_path, lazy=True):
+    """
+    Load a saved document into doc, in either form.
+
+    :param doc: DocFile whose options and pages are replaced.
+    :param file_path: file path or readable binary stream.
+    :param lazy: decode the pages when they are accessed, instead of all of them now.
+    :return: doc
+    """
+    data = read_data(file_path)
+
+    if data[:len(MAGIC)] == MAGIC:
+        pages = load_binary(doc, data)
+    else:
+        pages = load_json(doc, data)
+
+    doc.pages = pages if lazy else list(pages)
+
+    return doc
+
+
+def load_document(doc, header):
+    if header.get('version', FORMAT_VERSION) > FORMAT_VERSION:
+        raise ValueError('The document was saved with a newer format version %s' % header['version'])
+
+    for name, value in header['document'].items():
+        if name in DOCUMENT_FIELDS:
+            setattr(doc, name, value)
+
+
+def load_json(doc, data):
+    content = json.loads(bytes(data))
+    # The whole document is parsed, the map is not needed anymore.
+    release(data)
+
+    if content.get('format') != 'boadoc':
+        raise ValueError('Not a saved boadoc document')
+
+    load_document(doc, content)
+    decoder = Decoder(content['schema'])
+    records = content['pages']
+
+    return LazyPages(len(records), lambda index: decoder.decode_page(records[index]))
+
+
+def load_binary(doc, data):
+    start = len(MAGIC) + HEADER_LENGTH.size
+    size, = HEADER_LENGTH.unpack_from(data, len(MAGIC))
+
+    header = json.loads(bytes(data[start:start + size]))
+    load_document(doc, header)
+
+    start += size
+    pages = header['pages']
+    buffers = header['buffers']
+
+    def read(index, entries):
+        offset, length = entries[index]
+        return data[start + offset:start + offset + length]
+
+    decoder = Decoder(header['schema'], buffer=lambda index: read(index, buffers))
+
+    return LazyPages(len(pages), lambda index: decoder.decode_page(json.loads(read(index, pages))), source=data)
@@ -0,0 +1,259 @@
+from .glyph import Glyph, Header, Paragraph, Section, Picture, Table, PageBreak
+
+__author__ = 'jbui'
+
+
+def write_header(driver, glyph):
+    driver.write_heading(glyph.text)
+
+
+def write_paragraph(driver, glyph):
+    driver.write_paragraph(glyph.text, style=glyph.style)
+
+
+def write_section(driver, glyph):
+    if glyph.title:
+        driver.write_heading(glyph.title, level=glyph.level)
+
+
+def write_picture(driver, glyph):
+    driver.write_picture(glyph.file_path, width=glyph.width, height=glyph.height)
+
+
+def write_table(driver, glyph):
+    driver.write_table(glyph.data, header_rows=glyph.header_rows, chunk_size=glyph.chunk_size)
+
+
+def write_page_break(driver, glyph):
+    driver.write_page_break()
+
+
+def write_glyph(driver, glyph):
+    """
+    Fallback for the glyph types that are not in the dispatch table, the glyph writes itself.
+    """
+    glyph.write(driver)
+
+
+DISPATCH = {
+    Header: write_header,
+    Paragraph: write_paragraph,
+    Section: write_section,
+    Picture: write_picture,
+    Table: write_table,
+    PageBreak: write_page_break,
+}
+
+
+def walk(glyphs):
+    """
+    Yield the glyphs and their sub glyphs (Section.glyphs) in document order, without recursion.
+
+    :param glyphs: list of glyphs, e.g. Page.glyphs.
+    """
+    stack = [iter(glyphs)]
+
+    while stack:
+        for glyph in stack[-1]:
+            yield glyph
+
+            children = getattr(glyph, 'glyphs', None)
+            if children:
+                stack.append(iter(children))
+                break
+        else:
+            stack.pop()
+
+
+class Traversal(object):
+    """
+    Iterative walk of the glyph tree calling the driver through a dispatch table from glyph type to handler.  The same
+    walk serves every driver (word, pdf, ...), a driver can use its own table by setting a traversal attribute.
+
+    A glyph type without handler, or a subclass overriding write, is written by its own write method and is not
+    walked into.
+
+    """
+    def __init__(self, dispatch=None):
+        self.dispatch = dict(DISPATCH)
+
+        if dispatch:
+            self.dispatch.update(dispatch)
+
+        self._resolved = {}
+
+    def register(self, glyph_class, handler):
+        """
+        Set the handler(driver, glyph) of a glyph type.
+
+        :param glyph_class:
+        :param handler:
+        """
+        self.dispatch[glyph_class] = handler
+        self._resolved.clear()
+
+    def resolve(self, glyph_class):
+        """
+        Return (handler, walk into the sub glyphs) for the glyph type.
+
+        :param glyph_class:
+        :return:
+        """
+        resolved = self._resolved.get(glyph_class)
+
+        if resolved is None:
+            resolved = (write_glyph, False)
+
+            for klass in glyph_class.__mro__:
+                if klass in self.dispatch:
+                    resolved = (self.dispatch[klass], True)
+                    break
+
+                if 'write' in klass.__dict__ and klass is not Glyph:
+                    break
+
+            self._resolved[glyph_class] = resolved
+
+        return resolved
+
+    def write(self, driver, glyphs):
+        """
+        Write the glyphs and their sub glyphs with the driver.
+
+        :param driver:
+        :param glyphs:
+        """
+        cache = getattr(driver, 'render_cache', None)
+        if cache is not None:
+            return self.write_cached(driver, glyphs, cache)
+
+        instrument = getattr(driver, 'instrument', None)
+
+        stack = [iter(glyphs)]
+
+        while stack:
+            for glyph in stack[-1]:
+                handler, walk_into = self.resolve(type(glyph))
+
+                if instrument is None:
+                    handler(driver, glyph)
+                else:
+                    instrument.write_glyph(handler, driver, glyph)
+
+                children = getattr(glyph, 'glyphs', None) if walk_into else None
+                if children:
+                    stack.append(iter(children))
+                    break
+            else:
+                stack.pop()
+
+    def write_cached(self, driver, glyphs, cache):
+        """
+        Write the glyphs, reusing the fragments the driver rendered before for the subtrees with the same content.
+
+        The driver provides render_key() (what else changes its output, e.g. the template), mark() (position in its
+        output), capture(mark) (the fragment written since mark) and replay(fragment).  uncached_types lists the glyph
+        types it cannot reuse.
+
+        :param driver:
+        :param glyphs:
+        :param cache: RenderCache
+        """
+        from .digest import Digests
+
+        digests = Digests(exclude=getattr(driver, 'uncached_types', ()))
+        render_key = driver.render_key()
+        instrument = getattr(driver, 'instrument', None)
+
+        # Iterator of the sub glyphs, with the key and output mark of their parent to capture it once written.
+        stack = [(iter(glyphs), None, None)]
+
+        while stack:
+            for glyph in stack[-1][0]:
+                handler, walk_into = self.resolve(type(glyph))
+
+                digest = digests(glyph) if walk_into else None
+                key = (render_key, digest) if digest is not None else None
+
+                if key is not None:
+                    fragment = cache.get(key)
+
+                    if fragment is not None:
+                        driver.replay(fragment)
+
+                        if instrument is not None:
+                            instrument.event('replay')
+                        continue
+
+                mark = driver.mark()
+
+                if instrument is None:
+                    handler(driver, glyph)
+                else:
+                    instrument.write_glyph(handler, driver, glyph)
+
+                children = getattr(glyph, 'glyphs', None) if walk_into else None
+                if children:
+                    stack.append((iter(children), key, mark))
+                    break
+
+                if key is not None:
+                    cache.set(key, driver.capture(mark))
+            else:
+                _, key, mark = stack.pop()
+
+                if key is not None:
+                    cache.set(key, driver.capture(mark))
+
+    def iter_write(self, driver, glyphs):
+        """
+        Write the glyphs one at a time, yielding each glyph once written, so the driver output can be consumed as it
+        is produced.
+
+        :param driver:
+        :param glyphs:
+        """
+        instrument = getattr(driver, 'instrument', None)
+
+        stack = [iter(glyphs)]
+
+        while stack:
+            for glyph in stack[-1]:
+                handler, walk_into = self.resolve(type(glyph))
+
+                if instrument is None:
+                    handler(driver, glyph)
+                else:
+                    instrument.write_glyph(handler, driver, glyph)
+
+                yield glyph
+
+                children = getattr(glyph, 'glyphs', None) if walk_into else None
+                if children:
+                    stack.append(iter(children))
+                    break
+            else:
+                stack.pop()
+
+
+traversal = Traversal()
+
+
+def write_glyphs(driver, glyphs):
+    """
+    Write the glyphs with the traversal of the driver, or the default one.
+
+    :param driver:
+    :param glyphs:
+    """
+    (getattr(driver, 'traversal', None) or traversal).write(driver, glyphs)
+
+
+def iter_write_glyphs(driver, glyphs):
+    """
+    Write the glyphs one at a time with the traversal of the driver, or the default one.
+
+    :param driver:
+    :param glyphs:
+    """
+    return (getattr(driver, 'traversal', None) or traversal).iter_write(driver, glyphs)
@@ -1,6 +1,7 @@
 import re
 
-from pdf import PDFDocument
+from .output import spooled_output, iter_stream
+from .pdf import PDFDocument
 
 __author__ = 'jbui'
 
@@ -18,4 +19,31 @@ def pdf_response(filename, as_attachment=True, pdfdocument=PDFDocument, **kwargs
         FILENAME_RE.sub('-', filename),
     )
 
-    return pdfdocument(response, **kwargs), response
\ No newline at end of file
+    return pdfdocument(response, **kwargs), response
+
+
+def document_response(doc, filename, as_attachment=True, file_format='pdf'):
+    """
+    Return a streaming response serving doc.  The document is written in a spooled output, kept in memory for small
+    documents and spilled to disk for large one, then sent in chunks.
+    """
+    from django.http import StreamingHttpResponse
+
+    output = spooled_output()
+
+    if file_format == 'pdf':
+        doc.write_pdf(output)
+        content_type = 'application/pdf'
+    else:
+        doc.write_docx(output)
+        content_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+    response = StreamingHttpResponse(iter_stream(output), content_type=content_type)
+
+    response['Content-Disposition'] = '%s; filename="%s.%s"' % (
+        'attachment' if as_attachment else 'inline',
+        FILENAME_RE.sub('-', filename),
+        file_format,
+    )
+
+    return response
@@ -1,12 +1,27 @@
-import jinja2
+import copy
+import io
+import itertools
+import os
+import posixpath
+import re
+import zipfile
+
+from xml.sax.saxutils import escape, quoteattr
 
 import docx
-from docx.shared import Inches
+from docx.shared import Inches, Emu, Twips
 from docx.enum.table import WD_TABLE_ALIGNMENT
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+from docx.table import Table
 
-from docxtpl import DocxTemplate
-
+from .cache import LRUCache
+from .columns import ColumnData
+from .digest import get_render_cache
 from .document import DocFile
+from .glyph import Picture
+from .image import image_cache
+from .instrument import phase
 from .page import Page, CoverPage, TableOfContent
 
 from .style import PARAGRAPH_KEY
@@ -14,6 +29,261 @@ from .style import PARAGRAPH_KEY
 __author__ = 'jbui'
 
 
+RUN_SPECIAL_RE = re.compile(r'([\t\r\n])')
+
+
+def _run_xml(text):
+    """
+    Return the xml of a run holding text, the same way python-docx sets cell.text.  Tab become <w:tab/> and carriage
+    return/newline become <w:br/>.
+
+    :param text:
+    :return:
+    """
+    xml = []
+
+    for chunk in RUN_SPECIAL_RE.split(text):
+        if not chunk:
+            continue
+        elif chunk == '\t':
+            xml.append('<w:tab/>')
+        elif chunk in '\r\n':
+            xml.append('<w:br/>')
+        elif len(chunk.strip()) < len(chunk):
+            xml.append('<w:t xml:space="preserve">%s</w:t>' % escape(chunk))
+        else:
+            xml.append('<w:t>%s</w:t>' % escape(chunk))
+
+    return '<w:r>%s</w:r>' % ''.join(xml)
+
+
+# Separator of the cells of a column joined to be escaped at once, it cannot appear in xml text.
+CELL_SEPARATOR = '\x00'
+
+# Cells the joined column cannot be used for: tab or line break, empty cell, leading or trailing space.
+SPECIAL_CELL_RE = re.compile(r'[\t\r\n]|(?:^|\x00)(?:\s|\x00|$)|\s(?:\x00|$)')
+
+
+def has_special_cells(text):
+    """
+    Return true if a joined column has a cell matching SPECIAL_CELL_RE.  The plain ascii columns are checked with a
+    few substring searches, much faster than the regex.
+    """
+    if not text.isascii():
+        return SPECIAL_CELL_RE.search(text) is not None
+
+    return (not text or text[0] in ' \x00' or text[-1] in ' \x00' or
+            any(pattern in text for pattern in ('\t', '\r', '\n', '\x0b', '\x0c', '\x1c', '\x1d', '\x1e', '\x1f',
+                                                ' \x00', '\x00 ', '\x00\x00')))
+
+
+TR_HEADER = '<w:tr><w:trPr><w:tblHeader/></w:trPr>'
+
+# w:jc value of the table alignments of DocFile.
+TABLE_JC = {
+    DocFile.TABLE_ALIGNMENT_LEFT: 'left',
+    DocFile.TABLE_ALIGNMENT_CENTER: 'center',
+    DocFile.TABLE_ALIGNMENT_RIGHT: 'right',
+}
+
+
+def column_cells_xml(values, tc_open, tc_close):
+    """
+    Return the xml of the cells of a text column, the same as _run_xml cell by cell.  The column is joined, escaped
+    and split back at once, each cell is not processed on its own.
+
+    :param values: list of text.
+    :param tc_open:
+    :param tc_close:
+    :return:
+    """
+    text = CELL_SEPARATOR.join(values)
+
+    if text.count(CELL_SEPARATOR) != len(values) - 1 or has_special_cells(text):
+        return [tc_open + _run_xml(value) + tc_close for value in values]
+
+    cell_open = tc_open + '<w:r><w:t>'
+    cell_close = '</w:t></w:r>' + tc_close
+    text = escape(text).replace(CELL_SEPARATOR, cell_close + CELL_SEPARATOR + cell_open)
+
+    return (cell_open + text + cell_close).split(CELL_SEPARATOR)
+
+
+def iter_table_xml(data, block_width, header_rows=0, style_id=None, alignment=None, autofit=False):
+    """
+    Yield the xml of a w:tbl element in pieces, a row at a time, from a 2D sequence or a row iterator.  The text
+    columns of a ColumnData are turned into cells a column at a time.
+
+    :param data: 2D sequence, row iterator or ColumnData of cell values.
+    :param block_width: width of the table distributed evenly between the columns.
+    :param header_rows: number of rows at the top to repeat on each page.
+    :param style_id: id of the table style, None for the default style.
+    :param alignment: DocFile.TABLE_ALIGNMENT_LEFT, TABLE_ALIGNMENT_CENTER or TABLE_ALIGNMENT_RIGHT.
+    :param autofit: set the autofit table layout, as table.allow_autofit = True.
+    :return:
+    """
+    rows = iter(data)
+    first_row = next(rows, None)
+
+    cols = len(first_row) if first_row is not None else 0
+    col_width = Emu(block_width // cols) if cols > 0 else Emu(0)
+
+    tc_open = '<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="%d"/></w:tcPr><w:p>' % col_width.twips
+    tc_close = '</w:p></w:tc>'
+
+    # The w:tblPr children in schema order.
+    tbl_pr = ['<w:tblPr>']
+
+    if style_id:
+        tbl_pr.append('<w:tblStyle w:val=%s/>' % quoteattr(style_id))
+
+    tbl_pr.append('<w:tblW w:type="auto" w:w="0"/>')
+
+    if alignment in TABLE_JC:
+        tbl_pr.append('<w:jc w:val="%s"/>' % TABLE_JC[alignment])
+
+    if autofit:
+        tbl_pr.append('<w:tblLayout w:type="autofit"/>')
+
+    tbl_pr.append('<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" w:noHBand="0" '
+                  'w:noVBand="1" w:val="04A0"/>'
+                  '</w:tblPr>')
+
+    yield '<w:tbl %s>%s<w:tblGrid>%s</w:tblGrid>' % (nsdecls('w'), ''.join(tbl_pr),
+                                                      '<w:gridCol w:w="%d"/>' % col_width.twips * cols)
+
+    if isinstance(data, ColumnData):
+        cells = zip(*[column_cells_xml(column, tc_open, tc_close) for column in data.columns])
+
+        if data.header is not None:
+            cells = itertools.chain([column_cells_xml(data.header, tc_open, tc_close)], cells)
+
+        for i_row, row in enumerate(cells):
+            yield (TR_HEADER if i_row < header_rows else '<w:tr>') + ''.join(row) + '</w:tr>'
+
+        yield '</w:tbl>'
+        return
+
+    if first_row is not None:
+        rows = itertools.chain([first_row], rows)
+
+    for i_row, row in enumerate(rows):
+        xml = [TR_HEADER if i_row < header_rows else '<w:tr>']
+
+        for i_cell in range(0, cols):
+            xml.append(tc_open)
+            xml.append(_run_xml(str(row[i_cell])))
+            xml.append(tc_close)
+
+        xml.append('</w:tr>')
+
+        yield ''.join(xml)
+
+    yield '</w:tbl>'
+
+
+def table_xml(data, block_width, header_rows=0):
+    """
+    Build the whole w:tbl element in one pass from a 2D sequence.  The result is the same xml python-docx creates with
+    add_table(rows, cols) and setting each cell.text, but the cost is linear with the number of cells.
+
+    :param data: 2D sequence or row iterator of cell values.
+    :param block_width: width of the table distributed evenly between the columns.
+    :param header_rows: number of rows at the top to repeat on each page.
+    :return:
+    """
+    return parse_xml(''.join(iter_table_xml(data, block_width, header_rows=header_rows)))
+
+
+# Parts a render changes in place, besides the document part.
+CLONED_CONTENT_TYPES = (
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml',
+    'application/vnd.openxmlformats-package.core-properties+xml',
+)
+
+
+def _clone_package(document):
+    """
+    Return a new document sharing the parts of document that a render does not change.
+
+    docxtpl (tested with 0.20.2) rewrites the document part element, sets the core properties, replaces the _blob of
+    the footnotes part and points the header/footer relationships at new parts.  Those parts are cloned, the styles,
+    numbering, theme, header/footer and media parts are shared with document.  Relies on the python-docx 1.2 package
+    and part constructors.
+
+    :param document: docx.Document parsed from the template.
+    :return:
+    """
+    from docx.opc.part import XmlPart
+    from docx.package import Package
+
+    package = Package()
+    source = document.part.package
+    clones = {}
+
+    def clone(part):
+        if isinstance(part, XmlPart):
+            clones[part] = type(part)(part.partname, part.content_type, copy.deepcopy(part.element), package)
+        else:
+            clones[part] = type(part)(part.partname, part.content_type, part.blob, package)
+        return clones[part]
+
+    clone(document.part)
+    for part in source.iter_parts():
+        if part.content_type in CLONED_CONTENT_TYPES:
+            clone(part)
+
+    def load_rels(rels, target):
+        for rel in rels.values():
+            if rel.is_external:
+                target.load_rel(rel.reltype, rel.target_ref, rel.rId, True)
+            else:
+                target.load_rel(rel.reltype, clones.get(rel.target_part, rel.target_part), rel.rId)
+
+    load_rels(source.rels, package)
+    for part, cloned in clones.items():
+        load_rels(part.rels, cloned)
+
+    package.after_unmarshal()
+
+    return clones[document.part].document
+
+
+class TemplateCache(LRUCache):
+    """
+    Cache of parsed docx templates keyed on path and modified time.  The template is unzipped and parsed once, each
+    render gets its own copy of the parts it changes and shares the others.
+
+    """
+    def load(self, template_path):
+        """
+        Return a new DocxTemplate for template_path, ready to render.
+
+        :param template_path: path of the template, a stream is not cached.
+        :return:
+        """
+        from docxtpl import DocxTemplate
+
+        if not isinstance(template_path, str):
+            return DocxTemplate(template_path)
+
+        template_path = os.path.abspath(template_path)
+        key = (template_path, os.path.getmtime(template_path))
+
+        document = self.get_or_create(key, lambda: docx.Document(template_path))
+
+        # DocxTemplate only opens the template in init_docx when docx is still unset (docxtpl >= 0.12).
+        template = DocxTemplate(template_path)
+        template.docx = _clone_package(document)
+
+        return template
+
+
+TEMPLATE_CACHE_SIZE = 16
+
+template_cache = TemplateCache(maxsize=TEMPLATE_CACHE_SIZE)
+
+
 class Writer(DocFile):
     """
     Word document view
@@ -36,18 +306,70 @@ class Writer(DocFile):
 
         self.file_path = file_path
 
-        self.jinja_env = jinja2.Environment(
-            autoescape=['html', 'xml']
-        )
+        self.jinja_env = None
 
         # Initialize a document to write.
         if doc.template_path:
-            # Use a template module.
-            self.myDocument = DocxTemplate(doc.template_path)
+            from .environment import get_jinja_env
+
+            # Shared between writers so the template fragments are compiled once.
+            self.jinja_env = get_jinja_env()
+
+            # Use a template module, parsed once per process.
+            self.myDocument = template_cache.load(doc.template_path)
 
         else:
             self.myDocument = docx.Document()
 
+        # The styles of a template stream cannot be told apart between writes.
+        if isinstance(self.template_path, str) or not self.template_path:
+            self.render_cache = get_render_cache(self.render_cache)
+        else:
+            self.render_cache = None
+
+    # Pictures are bound to an image part of the package, their xml cannot move to another document.
+    uncached_types = (Picture,)
+
+    def render_key(self):
+        """
+        Return what the rendered fragments depend on besides the glyphs, the template styles and page size.
+        """
+        if not self.template_path:
+            return ('docx', None)
+
+        return ('docx', os.path.abspath(self.template_path), os.path.getmtime(self.template_path))
+
+    def _body(self):
+        return self.myDocument.element.body
+
+    def mark(self):
+        """
+        Return the number of body elements written, the section properties excluded.
+        """
+        body = self._body()
+        return len(body) - (body.sectPr is not None)
+
+    def capture(self, mark):
+        """
+        Return a copy of the body elements written since mark.
+        """
+        return [copy.deepcopy(element) for element in self._body()[mark:self.mark()]]
+
+    def replay(self, fragment):
+        """
+        Append a copy of the captured body elements.
+        """
+        body = self._body()
+        sect_pr = body.sectPr
+
+        for element in fragment:
+            element = copy.deepcopy(element)
+
+            if sect_pr is not None:
+                sect_pr.addprevious(element)
+            else:
+                body.append(element)
+
     def write(self):
         """
         Write the driver.
@@ -56,10 +378,12 @@ class Writer(DocFile):
         """
         try:
             if self.context:
-                self.myDocument.render(self.context, self.jinja_env)
+                with phase(self.instrument, 'render'):
+                    self.myDocument.render(self.context, self.jinja_env)
 
-            for page in self.pages:
-                page.write(self)
+            with phase(self.instrument, 'glyphs'):
+                for page in self.pages:
+                    page.write(self)
         except Exception as e:
             import wx
 
@@ -68,7 +392,8 @@ class Writer(DocFile):
             dlg = wx.MessageBox(message=text, caption="Error")
 
         finally:
-            self.close()
+            with phase(self.instrument, 'save'):
+                self.close()
 
     def close(self):
         """
@@ -113,17 +438,13 @@ class Writer(DocFile):
 
         :param data:
         :param kwargs
+            header_rows: Number of header rows repeated on each page.
+            style: Table style.
+            alignment: Table alignment between the page margins.
+            allow_autofit: Word has two algorithms for laying out a table, fixed-width or autofit.
         :return:
         """
-        rows = len(data)
-        cols = len(data[0])
-
-        table = self.myDocument.add_table(rows=rows, cols=cols)
-
-        for i_row in range(0, rows):
-            cells = table.rows[i_row].cells
-            for i_cell in range(0, cols):
-                cells[i_cell].text = str(data[i_row][i_cell])
+        return self.add_bulk_table(data, **kwargs)
 
     def write_section(self, start_type=2):
         """
@@ -162,6 +483,10 @@ class Writer(DocFile):
         width = kwargs.get('width')
         height = kwargs.get('height')
 
+        if self.image_dpi:
+            image_path_or_stream = image_cache.prepare(image_path_or_stream, width=width, height=height,
+                                                       dpi=self.image_dpi)
+
         image = None
         if width and height:
             image = self.myDocument.add_picture(image_path_or_stream, width=Inches(width), height=Inches(height))
@@ -197,19 +522,57 @@ class Writer(DocFile):
 
         # If there is a table.
         if table:
-            if kwargs.get('style'):
-                table.style = kwargs.get('style')
+            self.format_table(table, **kwargs)
+
+        return table
 
-            if kwargs.get('alignment'):
-                if kwargs.get('alignment') == self.TABLE_ALIGNMENT_LEFT:
-                    table.alignment = WD_TABLE_ALIGNMENT.LEFT
-                elif kwargs.get('alignment') == self.TABLE_ALIGNMENT_CENTER:
-                    table.alignment = WD_TABLE_ALIGNMENT.CENTER
-                elif kwargs.get('alignment') == self.TABLE_ALIGNMENT_RIGHT:
-                    table.alignment = WD_TABLE_ALIGNMENT.RIGHT
+    def add_bulk_table(self, data, **kwargs):
+        """
+        Add a table filled with data.  The whole table element is built in one pass instead of going through the
+        python-docx cell grid, which is rebuilt on every access of row.cells.
 
-            if kwargs.get('allow_autofit'):
-                table.allow_autofit = kwargs.get('allow_autofit')
+        :param data: 2D sequence or row iterator of cell values.
+        :param **kwargs:
+            header_rows: Number of header rows repeated on each page.
+            style: Table style.
+            alignment: Word allows a table to be aligned between the page margins either left, right, or center.
+            allow_autofit: Word has two algorithms for laying out a table, fixed-width or autofit.
+        :return:
+        """
+        body = self.myDocument._body
+
+        tbl = table_xml(data, self.myDocument._block_width, header_rows=kwargs.get('header_rows', 0))
+        body._element._insert_tbl(tbl)
+
+        table = Table(tbl, body)
+        self.format_table(table, **kwargs)
+
+        return table
+
+    def format_table(self, table, **kwargs):
+        """
+        Apply the style and alignment options to a table.
+
+        :param table:
+        :param **kwargs:
+            style: Table style.
+            alignment: Word allows a table to be aligned between the page margins either left, right, or center.
+            allow_autofit: Word has two algorithms for laying out a table, fixed-width or autofit.
+        :return:
+        """
+        if kwargs.get('style'):
+            table.style = kwargs.get('style')
+
+        if kwargs.get('alignment'):
+            if kwargs.get('alignment') == self.TABLE_ALIGNMENT_LEFT:
+                table.alignment = WD_TABLE_ALIGNMENT.LEFT
+            elif kwargs.get('alignment') == self.TABLE_ALIGNMENT_CENTER:
+                table.alignment = WD_TABLE_ALIGNMENT.CENTER
+            elif kwargs.get('alignment') == self.TABLE_ALIGNMENT_RIGHT:
+                table.alignment = WD_TABLE_ALIGNMENT.RIGHT
+
+        if kwargs.get('allow_autofit'):
+            table.autofit = kwargs.get('allow_autofit')
 
         return table
 
@@ -264,3 +627,458 @@ class Writer(DocFile):
         :param file_name:
         """
         self.myDocument.save(file_name)
+
+
+# Namespaces of the package parts read by the streaming writer.
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+RELS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+TYPES_NS = 'http://schemas.openxmlformats.org/package/2006/content-types'
+
+RT_OFFICE_DOCUMENT = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument'
+RT_STYLES = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles'
+RT_IMAGE = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+
+# Placeholder of the body content when the document part of the template is split around it.
+BODY_MARKER = 'BOADOC-BODY'
+
+MEDIA_PART_RE = re.compile(r'media/image(\d+)\.\w+$')
+
+
+def _w(name):
+    return '{%s}%s' % (W_NS, name)
+
+
+def rels_name(part_name):
+    """
+    Return the name of the relationships part of a package part, e.g. word/_rels/document.xml.rels.
+    """
+    folder, name = posixpath.split(part_name)
+    return posixpath.join(folder, '_rels', name + '.rels')
+
+
+class PackageTemplate(object):
+    """
+    Parts of a docx package reused by the streaming writer: everything but the document part is copied as it is, the
+    document part is split around its body so the body can be written between the two halves.
+
+    """
+    def __init__(self, template_path=None):
+        """
+
+        :param template_path: path or stream of the base docx, the python-docx default template if None.
+        """
+        from lxml import etree
+
+        with zipfile.ZipFile(template_path or docx.api._default_docx_path()) as archive:
+            self.parts = dict((name, archive.read(name)) for name in archive.namelist())
+
+        root_rels = etree.fromstring(self.parts['_rels/.rels'])
+        self.document_name = next(
+            rel.get('Target') for rel in root_rels if rel.get('Type') == RT_OFFICE_DOCUMENT).lstrip('/')
+
+        self.rels = etree.fromstring(self.parts.pop(rels_name(self.document_name)))
+        self.content_types = etree.fromstring(self.parts.pop('[Content_Types].xml'))
+
+        document = etree.fromstring(self.parts.pop(self.document_name))
+        body = document.find(_w('body'))
+
+        # The last section properties go after the written body.
+        sect_pr = body[-1] if len(body) and body[-1].tag == _w('sectPr') else None
+        self.sect_pr = sect_pr
+
+        # The body content of the template is kept in front of the written body, as docx.Document(template) does.
+        self.body = [etree.tostring(element, encoding='unicode') for element in body if element is not sect_pr]
+
+        for element in list(body):
+            body.remove(element)
+
+        body.text = BODY_MARKER
+        xml = etree.tostring(document, encoding='unicode')
+        head, tail = xml.split(BODY_MARKER)
+        self.head = "<?xml version='1.0' encoding='UTF-8' standalone='yes'?>\n" + head
+        self.tail = tail
+
+        # Largest numeric id of the document part, the picture shape ids follow it.
+        ids = [int(value) for value in document.xpath('//@id') if value.isdigit()]
+        self.max_id = max(ids) if ids else 0
+
+        self.block_width = self.get_block_width()
+        self.styles = self.get_styles()
+
+    def get_block_width(self):
+        """
+        Return the width between the margins of the last section in EMU, as docx.Document()._block_width.
+        """
+        if self.sect_pr is None:
+            return 0
+
+        page_size = self.sect_pr.find(_w('pgSz'))
+        margins = self.sect_pr.find(_w('pgMar'))
+
+        width = int(page_size.get(_w('w'), 0)) if page_size is not None else 0
+
+        if margins is not None:
+            width -= int(margins.get(_w('left'), 0)) + int(margins.get(_w('right'), 0))
+
+        return Twips(width)
+
+    def get_styles(self):
+        """
+        Return the style ids of the styles part: {(type, name): id}, the set of (type, id) and {type: default id}.
+        """
+        from lxml import etree
+
+        names = {}
+        ids = set()
+        defaults = {}
+
+        target = next((rel.get('Target') for rel in self.rels if rel.get('Type') == RT_STYLES), None)
+        styles_name = posixpath.normpath(posixpath.join(posixpath.dirname(self.document_name), target or ''))
+
+        if target and styles_name in self.parts:
+            for style in etree.fromstring(self.parts[styles_name]).iterfind(_w('style')):
+                style_type = style.get(_w('type'))
+                style_id = style.get(_w('styleId'))
+                name = style.find(_w('name'))
+
+                ids.add((style_type, style_id))
+
+                if name is not None:
+                    names[(style_type, name.get(_w('val')))] = style_id
+
+                if style.get(_w('default')) in ('1', 'true', 'on'):
+                    defaults[style_type] = style_id
+
+        return names, ids, defaults
+
+    def style_id(self, style, style_type='paragraph'):
+        """
+        Return the id of a style given by its name (or id), None for the default style, the same way python-docx sets
+        paragraph.style.
+
+        :param style: style name, e.g. 'Heading 1', or style id.
+        :param style_type:
+        :return:
+        """
+        from docx.styles import BabelFish
+
+        if style is None:
+            return None
+
+        names, ids, defaults = self.styles
+
+        style_id = names.get((style_type, BabelFish.ui2internal(style)))
+
+        if style_id is None:
+            if (style_type, style) not in ids:
+                raise KeyError("no style with name '%s'" % style)
+
+            style_id = style
+
+        if style_id == defaults.get(style_type):
+            return None
+
+        return style_id
+
+
+class PackageCache(LRUCache):
+    """
+    Cache of the package templates keyed on path and modified time, the template is unzipped and split once.
+
+    """
+    def load(self, template_path=None):
+        """
+        Return the PackageTemplate of template_path, a stream is not cached.
+
+        :param template_path: path or stream of the base docx, None for the python-docx default template.
+        :return:
+        """
+        if template_path is not None and not isinstance(template_path, str):
+            return PackageTemplate(template_path)
+
+        if template_path is None:
+            key = None
+        else:
+            template_path = os.path.abspath(template_path)
+            key = (template_path, os.path.getmtime(template_path))
+
+        return self.get_or_create(key, lambda: PackageTemplate(template_path))
+
+
+package_cache = PackageCache(maxsize=TEMPLATE_CACHE_SIZE)
+
+
+class StreamWriter(DocFile):
+    """
+    Word document written straight into the zip package while the glyphs are traversed, without building the
+    python-docx tree.  The body of word/document.xml is streamed into its zip entry, so the memory stays flat however
+    long the document is.  The other parts (styles, numbering, media, ...) are copied from the base template, the
+    python-docx default template without template path.
+
+    A template context cannot be rendered, the document is written without the template body being parsed.  The
+    pictures are spooled (to a temporary file past a few MB) and added to the package after the document part.
+
+    """
+    def __init__(self, doc=None, file_path=''):
+        """
+
+        :param doc:
+        :param file_path: file path or writable binary stream.
+        :return:
+        """
+        DocFile.__init__(self)
+
+        if doc:
+            self.__dict__.update(doc.__dict__)
+
+        if self.context:
+            raise ValueError('A template context cannot be rendered by the streaming docx writer.')
+
+        self.file_path = file_path
+
+        self.package = package_cache.load(self.template_path)
+
+        # The xml leaves the writer as it is written, there is nothing to capture.
+        self.render_cache = None
+
+        # Last section properties, with the header and footer references removed after the first section break.
+        self.sect_pr = copy.deepcopy(self.package.sect_pr)
+
+        self.next_id = self.package.max_id + 1
+
+        # Media added to the package: sha1 of the image: relationship id, and (part name, offset, size) in the spool.
+        self.images = {}
+        self.media = []
+        self.relationships = []
+        self.content_types = {}
+
+        used = [MEDIA_PART_RE.search(name) for name in self.package.parts]
+        self._media_number = max([int(match.group(1)) for match in used if match] or [0])
+        self._rel_ids = set(rel.get('Id') for rel in self.package.rels)
+        self._rel_number = 0
+
+        self._stream = None
+        self._spool = None
+
+    def write(self):
+        """
+        Write the document part while the glyphs are traversed, then the rest of the package.
+
+        :return:
+        """
+        from .output import spooled_output
+
+        package = self.package
+
+        with zipfile.ZipFile(self.file_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            self._spool = spooled_output()
+
+            try:
+                with phase(self.instrument, 'glyphs'):
+                    with archive.open(package.document_name, 'w', force_zip64=True) as entry:
+                        # Buffers the xml and passes it on to the zip entry in chunks.
+                        self._stream = io.TextIOWrapper(entry, encoding='utf-8')
+
+                        self._stream.write(package.head)
+                        self._stream.writelines(package.body)
+
+                        for page in self.pages:
+                            page.write(self)
+
+                        if self.sect_pr is not None:
+                            self._stream.write(self._tostring(self.sect_pr))
+
+                        self._stream.write(package.tail)
+                        self._stream.flush()
+                        self._stream.detach()
+                        self._stream = None
+
+                with phase(self.instrument, 'save'):
+                    self.close(archive)
+            finally:
+                self._spool.close()
+                self._spool = None
+
+    def close(self, archive):
+        """
+        Add the template parts, the media, the relationships and the content types to the package.
+
+        :param archive: zipfile.ZipFile
+        :return:
+        """
+        from lxml import etree
+
+        package = self.package
+
+        for name, data in package.parts.items():
+            archive.writestr(name, data)
+
+        for name, offset, size in self.media:
+            self._spool.seek(offset)
+            archive.writestr(name, self._spool.read(size))
+
+        rels = copy.deepcopy(package.rels)
+        for rel_id, rel_type, target in self.relationships:
+            etree.SubElement(rels, '{%s}Relationship' % RELS_NS, Id=rel_id, Type=rel_type, Target=target)
+
+        content_types = copy.deepcopy(package.content_types)
+        defaults = set(element.get('Extension', '').lower() for element in content_types)
+        for ext, content_type in self.content_types.items():
+            if ext not in defaults:
+                content_types.insert(0, etree.Element('{%s}Default' % TYPES_NS, Extension=ext,
+                                                      ContentType=content_type))
+
+        archive.writestr(rels_name(package.document_name), self._tostring(rels, declaration=True))
+        archive.writestr('[Content_Types].xml', self._tostring(content_types, declaration=True))
+
+    @staticmethod
+    def _tostring(element, declaration=False):
+        from lxml import etree
+
+        if declaration:
+            return etree.tostring(element, encoding='UTF-8', xml_declaration=True, standalone=True)
+
+        return etree.tostring(element, encoding='unicode')
+
+    def _paragraph(self, text, style_id=None):
+        p_pr = '<w:pPr><w:pStyle w:val="%s"/></w:pPr>' % escape(style_id, {'"': '&quot;'}) if style_id else ''
+        run = _run_xml(text) if text else ''
+
+        self._stream.write('<w:p>%s%s</w:p>' % (p_pr, run) if p_pr or run else '<w:p/>')
+
+    def write_paragraph(self, texts, **kwargs):
+        """
+        Write a paragraph, with the same xml as Writer.write_paragraph.
+
+        :param texts:
+        :param kwargs:
+        :return:
+        """
+        style = kwargs.get('style')
+
+        if PARAGRAPH_KEY.get(style):
+            self._paragraph(texts, self.package.style_id(PARAGRAPH_KEY[style][0]))
+        else:
+            self._paragraph(texts)
+
+    def write_heading(self, text, level=1):
+        """
+        Write a heading paragraph, 'Title' style for level 0 and 'Heading {level}' otherwise.
+
+        :param text:
+        :param level: level of the heading inside the document.
+        """
+        if not 0 <= level <= 9:
+            raise ValueError('level must be in range 0-9, got %d' % level)
+
+        style = 'Title' if level == 0 else 'Heading %d' % level
+        self._paragraph(text, self.package.style_id(style))
+
+    def write_table(self, data, **kwargs):
+        """
+        Write a table a row at a time, a row iterator is never held in memory.
+
+        :param data: 2D sequence or row iterator of cell values.
+        :param kwargs:
+            header_rows: Number of header rows repeated on each page.
+            style: Table style name (or id).
+            alignment: Table alignment between the page margins.
+            allow_autofit: Word has two algorithms for laying out a table, fixed-width or autofit.
+        :return:
+        """
+        style = kwargs.get('style')
+
+        self._stream.writelines(iter_table_xml(data, self.package.block_width,
+                                               header_rows=kwargs.get('header_rows') or 0,
+                                               style_id=self.package.style_id(style, 'table') if style else None,
+                                               alignment=kwargs.get('alignment'),
+                                               autofit=kwargs.get('allow_autofit')))
+
+    def write_section(self, start_type=2):
+        """
+        Write a section break starting a new page.  The section before the break keeps the properties of the last
+        section, its header and footer references are removed from the last section.
+
+        :param start_type:
+        :return:
+        """
+        if self.sect_pr is None:
+            return
+
+        self._stream.write('<w:p><w:pPr>%s</w:pPr></w:p>' % self._tostring(self.sect_pr))
+
+        for element in self.sect_pr.xpath('w:headerReference|w:footerReference|w:type', namespaces={'w': W_NS}):
+            self.sect_pr.remove(element)
+
+    def write_page(self, page):
+        pass
+
+    def write_page_break(self):
+        self._stream.write('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+
+    def add_image(self, image_path_or_stream):
+        """
+        Return the relationship id and the docx.image.image.Image of a picture, adding its part once per content.
+
+        :param image_path_or_stream:
+        :return:
+        """
+        from docx.image.image import Image as DocxImage
+
+        image = DocxImage.from_file(image_path_or_stream)
+        blob = image.blob
+
+        if image.sha1 in self.images:
+            return self.images[image.sha1], image
+
+        self._media_number += 1
+        name = posixpath.join(posixpath.dirname(self.package.document_name), 'media',
+                              'image%d.%s' % (self._media_number, image.ext))
+
+        self._spool.seek(0, os.SEEK_END)
+        self.media.append((name, self._spool.tell(), len(blob)))
+        self._spool.write(blob)
+
+        rel_id = self.next_rel_id()
+        self.relationships.append((rel_id, RT_IMAGE, posixpath.relpath(
+            name, posixpath.dirname(self.package.document_name))))
+        self.content_types[image.ext.lower()] = image.content_type
+        self.images[image.sha1] = rel_id
+
+        return rel_id, image
+
+    def next_rel_id(self):
+        while True:
+            self._rel_number += 1
+            rel_id = 'rId%d' % self._rel_number
+
+            if rel_id not in self._rel_ids:
+                self._rel_ids.add(rel_id)
+                return rel_id
+
+    def write_picture(self, image_path_or_stream='', **kwargs):
+        """
+        Write a picture in its own paragraph, scaled to width and/or height in inches like Writer.write_picture.
+
+        :param image_path_or_stream:
+        :param **kwargs:
+            width = float value in inches
+            height = float value in inches
+        :return:
+        """
+        from docx.oxml.shape import CT_Inline
+
+        width = kwargs.get('width')
+        height = kwargs.get('height')
+
+        if self.image_dpi:
+            image_path_or_stream = image_cache.prepare(image_path_or_stream, width=width, height=height,
+                                                       dpi=self.image_dpi)
+
+        rel_id, image = self.add_image(image_path_or_stream)
+        cx, cy = image.scaled_dimensions(Inches(width) if width else None, Inches(height) if height else None)
+
+        inline = CT_Inline.new_pic_inline(self.next_id, rel_id, image.filename, cx, cy)
+        self.next_id += 1
+
+        self._stream.write('<w:p><w:r><w:drawing>%s</w:drawing></w:r></w:p>' % self._tostring(inline))
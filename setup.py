@@ -7,6 +7,14 @@ distribution = setup(
     author="Joeny Bui",
     author_email="joeny.bui@gmail.com",
     platforms=["any"],
-    packages=find_packages()
+    packages=find_packages(),
+    # tracemalloc.reset_peak (instrument.Profiler).
+    python_requires='>=3.9',
+    extras_require={
+        # Merge of the pdf parts laid out by the worker processes (write_pdf parallel).
+        'parallel': ['pypdf>=3.0'],
+        # Letterhead pdf drawn as background (PDFDocument.letterhead).
+        'letterhead': ['pdfrw>=0.4'],
+    }
 )
 
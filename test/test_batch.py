@@ -0,0 +1,64 @@
+import os
+
+from unittest import TestCase
+
+from boadoc.document import DocFile
+from boadoc.glyph import Header, Paragraph
+from boadoc.page import Page
+
+__author__ = 'jbui'
+
+
+def build_report(title):
+    doc = DocFile()
+    page = Page()
+    page.add_header(Header(text=title))
+    page.add_paragraph(Paragraph(text='Batch paragraph for %s.' % title))
+    doc.add_page(page)
+
+    return doc
+
+
+class TestBatch(TestCase):
+
+    def setUp(self):
+        self.folder_path = os.path.abspath(os.path.dirname(__file__))
+
+    def test_write_batch(self):
+        specs = [
+            (build_report('Report 1'), os.path.join(self.folder_path, 'docx', 'test_batch_1.docx')),
+            (build_report('Report 2'), os.path.join(self.folder_path, 'pdf', 'test_batch_2.pdf')),
+            (None, os.path.join(self.folder_path, 'pdf', 'test_batch_3.pdf')),
+        ]
+
+        results = DocFile.write_batch(specs, max_workers=2)
+
+        self.assertEqual([result.index for result in results], [0, 1, 2])
+        self.assertTrue(results[0].ok)
+        self.assertTrue(results[1].ok)
+        self.assertFalse(results[2].ok)
+        self.assertIn('AttributeError', results[2].error)
+
+        self.assertTrue(os.path.isfile(specs[0][1]))
+        self.assertTrue(os.path.isfile(specs[1][1]))
+
+    def test_write_batch_unpicklable(self):
+        from boadoc.glyph import Table
+
+        doc = build_report('Report 5')
+        doc.pages[0].add_table(Table((row for row in [['a', 'b']])))
+
+        specs = [
+            (build_report('Report 4'), os.path.join(self.folder_path, 'docx', 'test_batch_4.docx')),
+            (doc, os.path.join(self.folder_path, 'docx', 'test_batch_5.docx')),
+            (build_report('Report 6'), os.path.join(self.folder_path, 'pdf', 'test_batch_6.pdf')),
+        ]
+
+        # The spec that cannot be sent to a worker fails alone.
+        results = DocFile.write_batch(specs, max_workers=2)
+
+        self.assertEqual([result.index for result in results], [0, 1, 2])
+        self.assertEqual([result.ok for result in results], [True, False, True])
+        self.assertIn('pickle', results[1].error)
+        self.assertEqual(results[1].file_path, specs[1][1])
+        self.assertTrue(os.path.isfile(specs[2][1]))
@@ -0,0 +1,22 @@
+from unittest import TestCase
+
+from benchmark.bench_writers import BACKENDS, CASES, compare, run_case
+
+__author__ = 'jbui'
+
+
+class TestBenchmark(TestCase):
+
+    def test_run_case(self):
+        results = [run_case(case, 'small', backend) for case in CASES for backend in BACKENDS]
+
+        for result in results:
+            self.assertGreater(result['seconds'], 0)
+            self.assertGreater(result['peak_rss_kb'], 0)
+            self.assertGreater(result['output_bytes'], 0)
+
+        baseline = dict(((result['case'], result['scale'], result['backend']), result) for result in results)
+        self.assertEqual(compare(results, baseline, 0.2), [])
+
+        slower = dict(results[0], seconds=results[0]['seconds'] * 2)
+        self.assertEqual(len(compare([slower], baseline, 0.2)), 1)
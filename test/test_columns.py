@@ -0,0 +1,110 @@
+import io
+import unittest
+
+from unittest import TestCase
+
+from boadoc.columns import ColumnData, ColumnFormat
+from boadoc.document import DocFile
+from boadoc.glyph import Table
+from boadoc.page import Page
+
+try:
+    import numpy
+    import pandas
+except ImportError:
+    numpy = pandas = None
+
+__author__ = 'jbui'
+
+
+class TestColumns(TestCase):
+
+    def test_column_format(self):
+        fmt = ColumnFormat(precision=2, thousands=True, unit='kN', na='-')
+
+        self.assertEqual(fmt.spec, '{:,.2f} kN')
+        self.assertEqual(fmt.format([1234.5, None, float('nan'), 3, 'text']),
+                         ['1,234.50 kN', '-', '-', '3.00 kN', 'text'])
+
+    def test_column_dict(self):
+        table = Table({'Id': [1, 2], 'Load': [1500.0, None]}, formats={'Load': {'precision': 1, 'thousands': True}})
+
+        self.assertIsInstance(table.data, ColumnData)
+        self.assertEqual(table.header_rows, 1)
+        self.assertEqual(list(table.data), [('Id', 'Load'), ('1', '1,500.0'), ('2', '')])
+        self.assertEqual(table.data[-1], ('2', ''))
+        self.assertEqual(len(table.data), 3)
+
+        with self.assertRaises(ValueError):
+            Table({'a': [1], 'b': [1, 2]})
+
+    @unittest.skipUnless(pandas, 'requires numpy and pandas')
+    def test_frame(self):
+        frame = pandas.DataFrame({'Load': [1234.567, numpy.nan, -2.0], 'Count': numpy.arange(3),
+                                  'Name': ['a', None, 'c <&>']})
+        table = Table(frame, formats={0: ColumnFormat(precision=1, thousands=True, unit='kN')})
+
+        self.assertEqual(table.data.columns, [['1,234.6 kN', '', '-2.0 kN'], ['0', '1', '2'], ['a', '', 'c <&>']])
+        self.assertEqual(table.data.header, ['Load', 'Count', 'Name'])
+
+        array = Table(numpy.array([[1.5, 2.0], [3.25, 4.0]]), formats={1: {'precision': 0}})
+        self.assertEqual(array.header_rows, 0)
+        self.assertEqual(list(array.data), [('1.5', '2'), ('3.25', '4')])
+
+    @unittest.skipUnless(pandas, 'requires numpy and pandas')
+    def test_nullable(self):
+        fmt = ColumnFormat(na='-')
+
+        self.assertEqual(fmt.format(pandas.Series([1, None, 3], dtype='Int64')), ['1', '-', '3'])
+        self.assertEqual(fmt.format(pandas.Series(['a', None], dtype='string')), ['a', '-'])
+        self.assertEqual(fmt.format(pandas.Series([True, None], dtype='boolean')), ['True', '-'])
+        self.assertEqual(fmt.format(pandas.Series(['a', pandas.NA], dtype=object)), ['a', '-'])
+        self.assertEqual(fmt.format(['a', pandas.NA, None]), ['a', '-', '-'])
+
+        frame = pandas.DataFrame({'Id': pandas.array([1, None], dtype='Int64'),
+                                  'Name': pandas.array(['a', None], dtype='string')})
+        self.assertEqual(Table(frame).data.columns, [['1', ''], ['a', '']])
+
+    @unittest.skipUnless(pandas, 'requires numpy and pandas')
+    def test_float32_datetime(self):
+        fmt = ColumnFormat(na='-')
+
+        self.assertEqual(fmt.format(numpy.array([0.1, numpy.nan, 1234.5], dtype='float32')), ['0.1', '-', '1234.5'])
+        self.assertEqual(ColumnFormat(precision=2).format(numpy.array([0.1], dtype='float32')), ['0.10'])
+
+        dates = pandas.Series(pandas.to_datetime(['2024-01-02', None]))
+        self.assertEqual(fmt.format(dates), ['2024-01-02', '-'])
+
+        times = numpy.array(['2024-01-02T00:00', '2024-01-03T10:30', 'NaT'], dtype='datetime64[ns]')
+        self.assertEqual(fmt.format(times), ['2024-01-02 00:00', '2024-01-03 10:30', '-'])
+
+    def test_write(self):
+        import boadoc.word as wd
+
+        data = ColumnData([['1.50', ' padded', '<&>'], ['a\tb', 'c', '']], header=['X', 'Y'])
+        rows = [list(row) for row in data]
+
+        # The cells built a column at a time are the same as cell by cell.
+        self.assertEqual(''.join(wd.iter_table_xml(data, 5486400, header_rows=1)),
+                         ''.join(wd.iter_table_xml(rows, 5486400, header_rows=1)))
+
+        doc = DocFile()
+        page = Page()
+        page.add_table(Table({'Id': list(range(0, 200)), 'Value': [i / 3 for i in range(0, 200)]},
+                             formats={'Value': {'precision': 3}}, chunk_size=50))
+        doc.add_page(page)
+
+        for write in (doc.write_docx, doc.write_pdf):
+            output = io.BytesIO()
+            write(output)
+            self.assertGreater(len(output.getvalue()), 0)
+
+        from pypdf import PdfReader
+
+        output = io.BytesIO()
+        doc.write_pdf(output)
+        text = ''.join(page.extract_text() for page in PdfReader(output).pages)
+
+        self.assertIn('66.333', text)
+        # The header row is repeated on each chunk.
+        self.assertGreaterEqual(text.count('Value'), 4)
@@ -0,0 +1,139 @@
+import io
+import os
+import zipfile
+
+from unittest import TestCase
+
+from boadoc.digest import Digests, RenderCache
+from boadoc.document import DocFile
+from boadoc.glyph import Header, Paragraph, Section, Picture, Table
+from boadoc.page import Page
+
+__author__ = 'jbui'
+
+
+class TestDigest(TestCase):
+
+    def setUp(self):
+        self.folder_path = os.path.abspath(os.path.dirname(__file__))
+
+    def build(self, text='Paragraph 1.A.1'):
+        page = Page()
+        page.add_header(Header(text='Report'))
+
+        for i in range(0, 3):
+            section = Section(title='Section %d' % i)
+            page.add_section(section)
+            section.add_glyph(Paragraph(text='Paragraph %d' % i))
+
+            subsection = Section(title='Section %d.A' % i)
+            section.add_glyph(subsection)
+            subsection.add_glyph(Paragraph(text=text if i == 1 else 'Paragraph %d.A.1' % i))
+            subsection.add_glyph(Table([['a', 'b'], [i, i + 1]], header_rows=1))
+
+        section.add_glyph(Picture(os.path.join(self.folder_path, 'images', 'example2.png'), width=1))
+
+        return page
+
+    def test_digest(self):
+        first = self.build()
+        second = self.build()
+        changed = self.build(text='Changed')
+
+        digests = Digests()
+
+        for a, b in zip(first.glyphs, second.glyphs):
+            self.assertIsNotNone(digests(a))
+            self.assertEqual(digests(a), digests(b))
+
+        # Only the changed paragraph and its parents get a new digest.
+        self.assertEqual(digests(first.glyphs[1]), digests(changed.glyphs[1]))
+        self.assertNotEqual(digests(first.glyphs[2]), digests(changed.glyphs[2]))
+        self.assertEqual(digests(first.glyphs[2].glyphs[0]), digests(changed.glyphs[2].glyphs[0]))
+        self.assertEqual(digests(first.glyphs[3]), digests(changed.glyphs[3]))
+
+        # The picture cannot be reused by a driver excluding it, neither its section.
+        digests = Digests(exclude=(Picture,))
+        self.assertIsNotNone(digests(first.glyphs[2]))
+        self.assertIsNone(digests(first.glyphs[3]))
+
+        # A row iterator is not hashed.
+        self.assertIsNone(Digests()(Table(iter([[1, 2]]))))
+
+    def test_table_digest(self):
+        # The digests are memoized on the glyph ids, the tables must stay alive.
+        def digests(*tables):
+            digest = Digests()
+            return [digest(table) for table in tables]
+
+        # Every cell is hashed, the repr of long rows would elide the middle.
+        row = [str(i) for i in range(0, 2000)]
+        changed = list(row)
+        changed[1000] = 'x'
+
+        first, second = digests(Table([row]), Table([changed]))
+        self.assertNotEqual(first, second)
+        first, second = digests(Table([row, [1, None]]), Table([list(row), [1, None]]))
+        self.assertEqual(first, second)
+        first, second = digests(Table([[1]]), Table([['1']]))
+        self.assertNotEqual(first, second)
+        first, second = digests(Table([['a b', 'c']]), Table([['a', 'b c']]))
+        self.assertNotEqual(first, second)
+
+        # A cell without text (e.g. a flowable) is not hashed.
+        self.assertEqual(digests(Table([['a', object()]])), [None])
+
+    def write(self, page, file_format, render_cache):
+        doc = DocFile(render_cache=render_cache)
+        doc.add_page(page)
+
+        output = io.BytesIO()
+
+        if file_format == 'pdf':
+            doc.write_pdf(output)
+        else:
+            doc.write_docx(output)
+
+        return output.getvalue()
+
+    def test_render_cache_docx(self):
+        cache = RenderCache()
+
+        expected = self.write(self.build(), 'docx', None)
+        self.write(self.build(), 'docx', cache)
+        self.assertEqual(cache.hits, 0)
+
+        cache.hits = cache.misses = 0
+        result = self.write(self.build(), 'docx', cache)
+
+        # The header, two sections and the page break are replayed.  The last section holds a picture, it is walked
+        # and its paragraph and sub section are replayed.
+        self.assertEqual(cache.hits, 6)
+        self.assertEqual(cache.misses, 0)
+
+        with zipfile.ZipFile(io.BytesIO(expected)) as a, zipfile.ZipFile(io.BytesIO(result)) as b:
+            self.assertEqual(a.read('word/document.xml'), b.read('word/document.xml'))
+
+        cache.hits = cache.misses = 0
+        self.write(self.build(text='Changed'), 'docx', cache)
+
+        # The changed section is walked: its title and first paragraph are reused, the changed sub section is not.
+        self.assertEqual(cache.hits, 7)
+        self.assertEqual(cache.misses, 3)
+
+    def test_render_cache_pdf(self):
+        cache = RenderCache()
+
+        expected = self.write(self.build(), 'pdf', None)
+        self.write(self.build(), 'pdf', cache)
+        cache.hits = cache.misses = 0
+
+        result = self.write(self.build(), 'pdf', cache)
+        self.assertEqual(cache.misses, 0)
+        self.assertEqual(cache.hits, 5)
+        self.assertEqual(result.count(b'/Subtype /Image'), expected.count(b'/Subtype /Image'))
+        self.assertEqual(result.count(b'/Type /Page\n'), expected.count(b'/Type /Page\n'))
+
+        cache.hits = cache.misses = 0
+        self.write(self.build(text='Changed'), 'pdf', cache)
+        self.assertEqual(cache.misses, 3)
@@ -0,0 +1,168 @@
+import sys
+
+from unittest import TestCase
+
+from boadoc.glyph import Header, Paragraph, Section, Table, PageBreak
+from boadoc.page import Page
+from boadoc.traversal import Traversal, walk
+
+__author__ = 'jbui'
+
+
+class RecordDriver(object):
+    """
+    Driver recording the calls of the traversal.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def write_heading(self, text, level=1):
+        self.calls.append(('heading', text, level))
+
+    def write_paragraph(self, texts, **kwargs):
+        self.calls.append(('paragraph', texts))
+
+    def write_table(self, data, **kwargs):
+        self.calls.append(('table', len(data)))
+
+    def write_page_break(self):
+        self.calls.append(('page_break',))
+
+
+class TestGlyph(TestCase):
+
+    def test_write_order(self):
+        page = Page()
+        s1 = Section(title="Section 1")
+        page.add_section(s1)
+        s1.add_glyph(Paragraph(text='Paragraph 1'))
+        s1a = Section(title="Section 1.A")
+        s1.add_glyph(s1a)
+        s1a.add_glyph(Table([[1, 2], [3, 4]]))
+        page.add_header(Header(text='Header'))
+
+        driver = RecordDriver()
+        page.write(driver)
+
+        self.assertEqual(driver.calls, [
+            ('heading', 'Section 1', 1),
+            ('paragraph', 'Paragraph 1'),
+            ('heading', 'Section 1.A', 2),
+            ('table', 2),
+            ('heading', 'Header', 1),
+            ('page_break',),
+        ])
+
+    def test_deep_tree(self):
+        depth = sys.getrecursionlimit() * 2
+
+        root = Section(title="Section 0")
+        section = root
+        for i in range(1, depth):
+            sub_section = Section(title="Section %d" % i)
+            section.add_glyph(sub_section)
+            section = sub_section
+
+        root.set_level(1)
+        self.assertEqual(section.level, depth)
+        self.assertEqual(len(list(walk([root]))), depth)
+
+        driver = RecordDriver()
+        root.write(driver)
+        self.assertEqual(len(driver.calls), depth)
+
+    def test_dispatch(self):
+        class Note(Paragraph):
+            def write(self, driver):
+                driver.write_paragraph('Note: ' + self.text)
+
+        traversal = Traversal({PageBreak: lambda driver, glyph: None})
+
+        driver = RecordDriver()
+        traversal.write(driver, [Note(text='custom write'), Paragraph(text='plain'), PageBreak()])
+
+        self.assertEqual(driver.calls, [('paragraph', 'Note: custom write'), ('paragraph', 'plain')])
+
+    def test_memory_per_glyph(self):
+        import gc
+        import pickle
+        import tracemalloc
+
+        count = 10000
+        text = 'Shared paragraph text.'
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+
+        section = Section(title="Section 1")
+        for i in range(0, count):
+            section.add_glyph(Paragraph(text=text))
+
+        per_glyph = (tracemalloc.get_traced_memory()[0] - before) / float(count)
+        tracemalloc.stop()
+
+        # About 112 bytes per Paragraph on CPython 3.11 (224 with a __dict__ and the two child lists).
+        self.assertLess(per_glyph, 160)
+
+        self.assertFalse(hasattr(section.glyphs[0], '__dict__'))
+        self.assertIs(section.glyphs, section.child)
+        self.assertIs(section.glyphs[0].parent, section)
+
+        copy = pickle.loads(pickle.dumps(section))
+        self.assertIs(copy.glyphs[-1].parent, copy)
+
+    def test_section_glyphs(self):
+        section = Section(title="Section 1")
+        section.glyphs.append(Paragraph(text='Paragraph 1'))
+        section.add_glyph(Paragraph(text='Paragraph 2'))
+
+        self.assertEqual([glyph.text for glyph in section.glyphs], ['Paragraph 1', 'Paragraph 2'])
+
+        section.glyphs = [Header(text='Heading 1')]
+        self.assertIs(section.glyphs, section.child)
+
+        driver = RecordDriver()
+        Traversal().write(driver, [section])
+        self.assertEqual(driver.calls, [('heading', 'Section 1', 1), ('heading', 'Heading 1', 1)])
+
+    def test_instrument(self):
+        from boadoc.instrument import Profiler
+
+        page = Page()
+        s1 = Section(title="Section 1")
+        page.add_section(s1)
+        s1.add_glyph(Paragraph(text='Paragraph 1'))
+        s1.add_glyph(Paragraph(text='Paragraph 2'))
+        s1.add_glyph(Table([[1, 2], [3, 4]]))
+
+        driver = RecordDriver()
+        driver.instrument = Profiler(slowest=2)
+
+        with driver.instrument.phase('glyphs'):
+            page.write(driver)
+
+        report = driver.instrument.report()
+
+        self.assertEqual(report['phases']['glyphs']['count'], 1)
+        self.assertEqual(report['glyphs']['Paragraph']['count'], 2)
+        self.assertEqual(report['glyphs']['Section']['count'], 1)
+        self.assertEqual(report['glyphs']['PageBreak']['count'], 1)
+        self.assertEqual(len(report['slowest']), 2)
+        self.assertEqual(len(driver.calls), 5)
+
+    def test_instrument_nested_peak(self):
+        from boadoc.instrument import Profiler
+
+        profiler = Profiler(memory=True)
+
+        with profiler.phase('outer'):
+            block = bytearray(4 * 1024 * 1024)
+            del block
+
+            with profiler.phase('inner'):
+                pass
+
+        # The inner phase resets the tracemalloc peak, the outer phase still sees the block allocated before it.
+        self.assertGreater(profiler.phases['outer']['peak'], 4 * 1024 * 1024)
+        self.assertLess(profiler.phases['inner']['peak'], 1024 * 1024)
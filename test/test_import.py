@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+from unittest import TestCase
+
+__author__ = 'jbui'
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cumulative import time of boadoc.document in microseconds, about 5ms without the backends.
+IMPORT_TIME_LIMIT = 50000
+
+BACKENDS = ('docx', 'docxtpl', 'jinja2', 'lxml', 'reportlab', 'PIL')
+
+
+def import_times(statement):
+    """
+    Return {module: cumulative microseconds} parsed from python -X importtime.
+    """
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+
+    times = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+
+        _, cumulative, module = line.split('|')
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative)
+
+    return times
+
+
+class TestImport(TestCase):
+
+    def test_import_document(self):
+        times = import_times('import boadoc.document, boadoc.glyph, boadoc.page')
+
+        loaded = [module for module in times if module.split('.')[0] in BACKENDS]
+        self.assertEqual(loaded, [])
+        self.assertLess(times['boadoc.document'], IMPORT_TIME_LIMIT)
+
+    def test_import_package(self):
+        # The sub modules are loaded through importlib on attribute access, which -X importtime does not report.
+        statement = 'import sys, boadoc; boadoc.glyph; print(" ".join(sorted(sys.modules)))'
+        modules = subprocess.run(
+            [sys.executable, '-c', statement], cwd=ROOT, stdout=subprocess.PIPE, universal_newlines=True,
+            check=True).stdout.split()
+
+        self.assertIn('boadoc.glyph', modules)
+        self.assertNotIn('boadoc.pdf', modules)
+        self.assertNotIn('boadoc.word', modules)
@@ -1,6 +1,7 @@
 
 from unittest import TestCase
 
+import copy
 import os
 
 from boadoc.document import DocFile
@@ -82,6 +83,134 @@ class TestPdf(TestCase):
 
         self.assertTrue(os.path.isfile(file_path))
 
+    def test_add_streaming_table(self):
+        import boadoc.pdf as pf
+
+        def rows():
+            yield ['Index', 'Square']
+            for i in range(0, 1200):
+                yield [i, i * i]
+
+        chunks = list(pf.chunk_rows(rows(), header_rows=1, chunk_size=500))
+        self.assertEqual([len(chunk) for chunk in chunks], [501, 501, 201])
+        self.assertEqual(chunks[2][0], ['Index', 'Square'])
+
+        self.page.add_table(Table(rows(), header_rows=1, chunk_size=500))
+        self.word.add_page(self.page)
+
+        file_path = os.path.join(self.folder_path, 'pdf', 'test_add_streaming_table.pdf')
+        self.word.write_pdf(file_path)
+
+        self.assertTrue(os.path.isfile(file_path))
+
+    def test_write_stream(self):
+        import io
+
+        class Socket(object):
+            """Write only stream without seek."""
+            def __init__(self):
+                self.chunks = []
+
+            def write(self, data):
+                self.chunks.append(bytes(data))
+
+        self.page.add_header(Header(text='Heading 1'))
+        self.word.add_page(self.page)
+
+        output = io.BytesIO()
+        self.word.write_pdf(output)
+        self.assertTrue(output.getvalue().startswith(b'%PDF'))
+
+        socket = Socket()
+        self.word.write_pdf(socket)
+        self.assertTrue(socket.chunks[0].startswith(b'%PDF'))
+
+    def test_font_registry(self):
+        import reportlab
+        import boadoc.pdf as pf
+
+        font_folder = os.path.join(os.path.dirname(reportlab.__file__), 'fonts')
+        regular = os.path.join(font_folder, 'Vera.ttf')
+        bold = os.path.join(font_folder, 'VeraBd.ttf')
+
+        registry = pf.FontRegistry()
+
+        self.assertTrue(registry.register(regular, bold=bold, font_name='TestVera'))
+        self.assertFalse(registry.register(regular, bold=bold, font_name='TestVera'))
+
+        # Two files parsed once each, the italic variants share the faces.
+        self.assertEqual(len(registry._faces), 2)
+        self.assertIs(pf.pdfmetrics.getFont('TestVera-Italic').face, pf.pdfmetrics.getFont('TestVera').face)
+
+        file_path = os.path.join(self.folder_path, 'pdf', 'test_font_registry.pdf')
+        pdf = pf.PDFDocument(file_path=file_path, font_name='TestVera')
+        pdf.init_report()
+        pdf.h2('Bold heading')
+        pdf.p('Creating PDFs made easy.')
+        pdf.generate()
+
+        self.assertTrue(os.path.isfile(file_path))
+
+    def test_sanitize_column(self):
+        import boadoc.pdf as pf
+
+        values = ['a & b < c > d\r\ne', u'Gru\u0308\u00dfe', 'plain', '', 12.5, u'\ufb01le']
+
+        self.assertEqual(
+            pf.sanitize_column(values),
+            [pf.sanitize(pf.normalize(value)) for value in values])
+        self.assertEqual(pf.sanitize_column(values)[1], u'Gr\u00fc\u00dfe')
+
+        # The separator inside the text falls back to one value at a time.
+        self.assertEqual(pf.sanitize_column(['a\x00b', '<']), ['a\x00b', '&#60;'])
+
+        rows = pf.sanitize_rows([['a & b', 1], [u'\ufb01', None]])
+        self.assertEqual(rows, [['a & b', 1], [u'fi', None]])
+
+    def test_mini_html(self):
+        import boadoc.pdf as pf
+
+        html = '<p>Hello <strong>World</strong></p><ul><li>One</li><li>Two</li></ul><p>Broken <em>tags</p>'
+
+        self.assertEqual(pf.html_fragments('<p>Broken <em>tags</p>'), (('<p>Broken <i>tags</i></p>', False, 'paragraph'),))
+
+        file_path = os.path.join(self.folder_path, 'pdf', 'test_mini_html.pdf')
+        pdf = pf.PDFDocument(file_path=file_path)
+        pdf.init_report()
+
+        pf.html_cache.clear()
+        pdf.mini_html(html)
+        pdf.mini_html(html)
+
+        self.assertEqual(pf.html_cache.hits, 1)
+        self.assertEqual(len(pdf.story), 1 + 2 * 4)
+
+        pdf.generate()
+        self.assertTrue(os.path.isfile(file_path))
+
+    def test_draw_svg(self):
+        import boadoc.pdf as pf
+
+        svg_path = os.path.join(self.folder_path, 'images', 'logo.svg')
+
+        def page_fn(canvas, doc):
+            doc.PDFDocument.draw_svg(canvas, svg_path, xpos=20, ypos=780, xsize=60)
+
+        file_path = os.path.join(self.folder_path, 'pdf', 'test_draw_svg.pdf')
+        pdf = pf.PDFDocument(file_path=file_path)
+        pdf.init_report(page_fn=page_fn)
+        for i in range(0, 4):
+            pdf.h1('Page %d' % i)
+            pdf.pagebreak()
+
+        pf.svg_cache.clear()
+        pdf.generate()
+
+        self.assertEqual(pf.svg_cache.misses, 1)
+
+        with open(file_path, 'rb') as f:
+            self.assertEqual(f.read().count(b'/Subtype /Form'), 1)
+
     def test_hello(self):
         import boadoc.pdf as pf
 
@@ -91,3 +220,292 @@ class TestPdf(TestCase):
         pdf.h1('Hello World')
         pdf.p('Creating PDFs made easy.')
         pdf.generate()
+
+    def test_table_streaming(self):
+        import io
+        from pypdf import PdfReader
+        import boadoc.pdf as pf
+
+        read = []
+
+        def rows():
+            yield ['Index', 'Square']
+            for i in range(0, 300):
+                read.append(i)
+                yield [i, i * i]
+
+        output = io.BytesIO()
+        pdf = pf.PDFDocument(file_path=output)
+        pdf.init_report()
+        pdf.h1('Squares')
+        pdf.table(rows(), (100, 100), header_rows=1, chunk_size=50, streaming=True)
+
+        # The rows are read while the story is laid out.
+        self.assertEqual(read, [])
+        pdf.generate()
+        self.assertEqual(len(read), 300)
+
+        text = ''.join(page.extract_text() for page in PdfReader(output).pages)
+        self.assertIn('299', text)
+        self.assertGreaterEqual(text.count('Index'), 6)
+
+    def test_single_pass(self):
+        import boadoc.pdf as pf
+
+        def build(single_pass):
+            footers = []
+
+            def page_fn(canvas, doc):
+                footers.append(doc.page_index_string())
+                canvas.drawString(20, 20, footers[-1])
+
+            file_path = os.path.join(self.folder_path, 'pdf', 'test_single_pass_%s.pdf' % single_pass)
+            pdf = pf.PDFDocument(file_path=file_path)
+            pdf.init_report(page_fn=page_fn)
+            for i in range(0, 3):
+                pdf.h1('Report %d' % i)
+                for j in range(0, 80 * (i + 1)):
+                    pdf.p('Line %d of report %d.' % (j, i))
+                pdf.restart()
+            pdf.generate(single_pass=single_pass)
+
+            return footers
+
+        multi_pass_footers = build(False)
+        single_pass_footers = build(True)
+
+        self.assertEqual(single_pass_footers, multi_pass_footers[-len(single_pass_footers):])
+
+    def test_single_pass_outline(self):
+        import io
+        from pypdf import PdfReader
+        from reportlab.platypus import Flowable
+        import boadoc.pdf as pf
+
+        class Bookmark(Flowable):
+            def __init__(self, key):
+                Flowable.__init__(self)
+                self.key = key
+
+            def wrap(self, available_width, available_height):
+                return 0, 0
+
+            def draw(self):
+                self.canv.bookmarkPage(self.key)
+                self.canv.addOutlineEntry(self.key, self.key, 0)
+
+        def build(single_pass):
+            def page_fn(canvas, doc):
+                canvas.drawString(20, 20, doc.page_index_string())
+
+            output = io.BytesIO()
+            pdf = pf.PDFDocument(file_path=output)
+            pdf.init_report(page_fn=page_fn)
+            for i in range(0, 3):
+                if i:
+                    pdf.pagebreak()
+                pdf.story.append(Bookmark('Part %d' % i))
+                pdf.h1('Part %d' % i)
+            pdf.generate(single_pass=single_pass)
+
+            reader = PdfReader(output)
+            outline = [reader.get_destination_page_number(entry) for entry in reader.outline]
+
+            return outline, [page.extract_text() for page in reader.pages]
+
+        multi_pass = build(False)
+        single_pass = build(True)
+
+        self.assertEqual(multi_pass[0], [0, 1, 2])
+        self.assertEqual(single_pass, multi_pass)
+        self.assertIn('Page 2 of 3', single_pass[1][1])
+
+    def test_stationery(self):
+        import boadoc.pdf as pf
+        from reportlab.pdfgen import canvas
+
+        letterhead_path = os.path.join(self.folder_path, 'pdf', 'test_letterhead.pdf')
+        c = canvas.Canvas(letterhead_path)
+        c.drawString(72, 800, 'Letterhead')
+        c.save()
+
+        file_path = os.path.join(self.folder_path, 'pdf', 'test_stationery.pdf')
+        pdf = pf.PDFDocument(file_path=file_path)
+        pdf.letterhead(letterhead_path)
+        pdf.watermark('DRAFT')
+
+        def page_fn(canvas, doc):
+            pdf.confidential(canvas)
+            pdf.draw_watermark(canvas)
+
+        pdf.init_report(page_fn=page_fn)
+        for i in range(0, 200):
+            pdf.p('Line %d of the report.' % i)
+        pdf.generate()
+
+        with open(file_path, 'rb') as f:
+            data = f.read()
+
+        # letterhead, watermark and confidential marker are each stored once across the pages.
+        self.assertGreater(data.count(b'/Type /Page\n'), 1)
+        self.assertEqual(data.count(b'/Subtype /Form'), 3)
+
+    def test_parallel(self):
+        import io
+        import boadoc.pdf as pf
+        from pypdf import PdfReader
+
+        def build(parallel):
+            def page_fn(canvas, doc):
+                canvas.drawString(20, 20, doc.page_index_string())
+
+            output = io.BytesIO()
+            pdf = pf.PDFDocument(file_path=output)
+            pdf.init_report(page_fn=page_fn)
+            for i in range(0, 5):
+                pdf.h1('Report %d' % i)
+                for j in range(0, 60 * (i % 3 + 1)):
+                    pdf.p('Line %d of report %d.' % (j, i))
+                pdf.restart()
+            pdf.generate(single_pass=True, parallel=parallel)
+
+            return [page.extract_text() for page in PdfReader(output).pages]
+
+        expected = build(None)
+        result = build(2)
+
+        self.assertGreater(len(expected), 5)
+        self.assertEqual(result, expected)
+
+    def test_write_parallel(self):
+        import io
+        from pypdf import PdfReader
+
+        for i in range(0, 6):
+            page = Page()
+            page.add_header(Header(text='Header %d' % i))
+            page.add_paragraph(Paragraph(text='Paragraph %d' % i))
+            self.word.add_page(page)
+
+        pages = []
+        for parallel in (None, 2):
+            output = io.BytesIO()
+            self.word.write_pdf(output, parallel=parallel)
+            pages.append([page.extract_text() for page in PdfReader(output).pages])
+
+        self.assertEqual(len(pages[0]), 6)
+        self.assertEqual(pages[1], pages[0])
+
+    def test_instrument(self):
+        from boadoc.instrument import Profiler
+
+        profiler = Profiler()
+        pdf = DocFile(instrument=profiler)
+
+        self.page.add_header(Header(text='Heading 1'))
+        for i in range(0, 10):
+            self.page.add_paragraph(Paragraph(text='Paragraph %d' % i))
+        pdf.add_page(self.page)
+
+        file_path = os.path.join(self.folder_path, 'pdf', 'test_instrument.pdf')
+        pdf.write_pdf(file_path)
+
+        report = profiler.report()
+
+        self.assertEqual(sorted(report['phases']), ['build', 'glyphs', 'save'])
+        self.assertEqual(report['glyphs']['Paragraph']['count'], 10)
+        self.assertGreater(report['events']['PAGE'], 1)
+
+        with open(file_path, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'%PDF'))
+
+    def test_write_streaming(self):
+        import io
+        from pypdf import PdfReader
+        import boadoc.pdf as pf
+
+        self.page.add_header(Header(text='Heading 1'))
+        for i in range(0, 100):
+            self.page.add_paragraph(Paragraph(text='Paragraph %d' % i))
+        self.page.add_table(Table([['%d.%d' % (i, j) for j in range(0, 4)] for i in range(0, 500)], header_rows=1,
+                                  chunk_size=50))
+        self.word.add_page(self.page)
+
+        pages = []
+        for streaming in (False, True):
+            output = io.BytesIO()
+            self.word.write_pdf(output, streaming=streaming)
+            pages.append([page.extract_text() for page in PdfReader(output).pages])
+
+        self.assertGreater(len(pages[0]), 5)
+        self.assertEqual(pages[1], pages[0])
+
+        # The flowables are read ahead a few at a time, the table chunks as they are reached.
+        chunks = iter([pf.Spacer(1, i) for i in range(0, 3)])
+        stream = pf.FlowableStream([pf.Spacer(1, 1), chunks], lookahead=2)
+        self.assertEqual(len(stream), 2)
+        self.assertEqual(len(list(chunks)), 2)
+
+    def test_style_registry(self):
+        import boadoc.pdf as pf
+        from reportlab.lib.styles import ParagraphStyle
+
+        first = pf.PDFDocument(file_path=os.path.join(self.folder_path, 'pdf', 'style-1.pdf'))
+        second = pf.PDFDocument(file_path=os.path.join(self.folder_path, 'pdf', 'style-2.pdf'))
+        first.generate_style(font_size=8)
+        second.generate_style(font_size=8)
+
+        # The documents of a font share one style set.
+        self.assertIs(first.style, second.style)
+        self.assertEqual(first.style.normal.fontSize, 8)
+        self.assertEqual(first.style.heading2.fontName, 'Helvetica-Bold')
+        self.assertIs(type(first.style.normal), ParagraphStyle)
+        self.assertRaises(AttributeError, setattr, first.style, 'normal', None)
+
+        # An override is copied into the document only.
+        first.override_style('normal', fontSize=12)
+        self.assertEqual(first.style.normal.fontSize, 12)
+        self.assertEqual(second.style.normal.fontSize, 8)
+        self.assertIs(first.style.heading1, second.style.heading1)
+
+        self.assertIs(pf.Writer.styles, pf.style_registry.styles(variant=pf.SAMPLE_STYLES))
+
+        # The shared styles can be the parents of new styles, and their copies are editable.
+        derived = ParagraphStyle('Derived', parent=second.style.normal, leading=20)
+        derived.fontSize = 11
+        self.assertEqual((derived.fontName, derived.leading), ('Helvetica', 20))
+        ParagraphStyle('Centered', parent=pf.Writer.styles['Normal']).alignment = 1
+
+        for copied in (copy.copy(second.style.normal), copy.deepcopy(second.style.normal)):
+            copied.fontSize = 14
+            self.assertIs(type(copied), ParagraphStyle)
+        self.assertEqual(second.style.normal.fontSize, 8)
+
+        writer = pf.Writer(DocFile(), os.path.join(self.folder_path, 'pdf', 'style-3.pdf'))
+        key = writer.render_key()
+        writer.override_style('Normal', fontSize=14)
+        self.assertEqual(writer.styles['Normal'].fontSize, 14)
+        self.assertEqual(pf.Writer.styles['Normal'].fontSize, 10)
+        self.assertNotEqual(writer.render_key(), key)
+
+    def test_picture_size(self):
+        import boadoc.pdf as pf
+        from reportlab.lib.units import inch
+
+        image_path = os.path.join(self.folder_path, 'images', 'example2.png')
+
+        writer = pf.Writer(DocFile(image_dpi=72), os.path.join(self.folder_path, 'pdf', 'test_picture_size.pdf'))
+
+        # The sizes are in points, a missing one is the image size in pixels.
+        writer.write_picture(image_path, width=2 * inch)
+        writer.write_picture(image_path, width=2 * inch, height=inch)
+        writer.write_picture(image_path)
+
+        single, both, natural = writer.Story[-3:]
+
+        self.assertEqual((single.drawWidth, single.drawHeight), (2 * inch, 600))
+        self.assertEqual((single.imageWidth, single.imageHeight), (144, 600))
+        self.assertEqual((both.drawWidth, both.drawHeight), (2 * inch, inch))
+        self.assertEqual((both.imageWidth, both.imageHeight), (144, 72))
+        self.assertEqual((natural.drawWidth, natural.drawHeight), (800, 600))
+        self.assertEqual((natural.imageWidth, natural.imageHeight), (800, 600))
@@ -0,0 +1,184 @@
+import gc
+import io
+import os
+import pickle
+import tempfile
+import zipfile
+
+from unittest import TestCase
+
+from boadoc.digest import Digests
+from boadoc.document import DocFile
+from boadoc.glyph import Header, Paragraph, Section, Picture, Table, PageBreak
+from boadoc.page import Page, CoverPage
+from boadoc.serialize import JSON, LazyPages
+
+__author__ = 'jbui'
+
+
+class TestSerialize(TestCase):
+
+    def setUp(self):
+        self.folder_path = os.path.abspath(os.path.dirname(__file__))
+
+    def build(self):
+        doc = DocFile(image_dpi=100)
+
+        cover = CoverPage()
+        cover.title = 'Cover'
+        cover.add_header(Header(text='Report'))
+        doc.add_page(cover)
+
+        for i in range(0, 3):
+            page = Page(title='Page %d' % i)
+            section = Section(title='Section %d' % i)
+            page.add_section(section)
+            section.add_glyph(Paragraph(text='Paragraph %d' % i, style='list_bullet'))
+
+            subsection = Section(title='Section %d.A' % i)
+            section.add_glyph(subsection)
+            subsection.add_glyph(Table([['a', 'b'], [i, 1.5], [None, True]], header_rows=1))
+            subsection.add_glyph(PageBreak())
+
+            with open(os.path.join(self.folder_path, 'images', 'example2.png'), 'rb') as f:
+                page.add_picture(Picture(io.BytesIO(f.read()), width=1))
+            page.add_picture(Picture(os.path.join(self.folder_path, 'images', 'example1.jpg'), height=2))
+
+            doc.add_page(page)
+
+        return doc
+
+    def digests(self, doc):
+        digests = Digests()
+
+        return [(type(page), page.title, [digests(glyph) for glyph in page.glyphs]) for page in doc.pages]
+
+    def test_round_trip(self):
+        expected = self.build()
+
+        for file_format in (JSON, None):
+            output = io.BytesIO()
+            expected.save(output, file_format=file_format)
+
+            output.seek(0)
+            doc = DocFile()
+            doc.open_document(output)
+
+            self.assertIsInstance(doc.pages, LazyPages)
+            self.assertEqual(len(doc.pages), 4)
+            self.assertEqual(doc.image_dpi, 100)
+            self.assertEqual(self.digests(doc), self.digests(expected))
+
+            section = doc.pages[1].glyphs[0]
+            self.assertIs(section.glyphs[1].parent, section)
+            self.assertEqual(section.glyphs[1].level, 2)
+
+            # A page is decoded once.
+            self.assertIs(doc.pages[1], doc.pages[1])
+
+            doc.add_page(Page())
+            self.assertEqual(len(doc.pages), 5)
+            self.assertEqual(len(pickle.loads(pickle.dumps(doc.pages))), 5)
+
+    def test_write(self):
+        folder = tempfile.mkdtemp()
+        file_path = os.path.join(folder, 'document.boadoc')
+        self.build().save(file_path)
+
+        doc = DocFile()
+        doc.open_document(file_path)
+
+        result = io.BytesIO()
+        doc.write_docx(result, streaming=True)
+        expected = io.BytesIO()
+        self.build().write_docx(expected, streaming=True)
+
+        with zipfile.ZipFile(expected) as a, zipfile.ZipFile(result) as b:
+            self.assertEqual(a.read('word/document.xml'), b.read('word/document.xml'))
+
+        # The JSON form keeps the picture paths.
+        file_path = os.path.join(folder, 'document.json')
+        self.build().save(file_path)
+
+        doc = DocFile()
+        doc.open_document(file_path, lazy=False)
+
+        self.assertIsInstance(doc.pages, list)
+        self.assertEqual(doc.pages[1].glyphs[2].file_path, os.path.join(self.folder_path, 'images', 'example1.jpg'))
+
+        # A glyph type without schema cannot be saved.
+        page = Page()
+        page.add_glyphs(type('Custom', (Paragraph,), {})())
+        doc = DocFile()
+        doc.add_page(page)
+
+        with self.assertRaises(TypeError):
+            doc.save(io.BytesIO())
+
+    def test_edit_lazy(self):
+        saved = DocFile()
+        page = Page(title='Page')
+        page.add_paragraph(Paragraph(text='a'))
+        saved.add_page(page)
+
+        output = io.BytesIO()
+        saved.save(output)
+        output.seek(0)
+
+        doc = DocFile()
+        doc.open_document(output)
+
+        # The edits of the decoded pages are kept until the document is written.
+        doc.pages[0].add_paragraph(Paragraph(text='x'))
+        doc.pages[0].title = 'Edited'
+        gc.collect()
+
+        self.assertEqual(doc.pages[0].title, 'Edited')
+
+        result = io.BytesIO()
+        doc.write_docx(result, streaming=True)
+
+        with zipfile.ZipFile(result) as archive:
+            xml = archive.read('word/document.xml').decode('utf-8')
+
+        self.assertIn('>x<', xml)
+        self.assertLess(xml.index('>a<'), xml.index('>x<'))
+
+    def test_save_over(self):
+        folder = tempfile.mkdtemp()
+        file_path = os.path.join(folder, 'document.boadoc')
+        self.build().save(file_path)
+
+        # The pages not decoded yet are read from the map of the file replaced by the save.
+        doc = DocFile()
+        doc.open_document(file_path)
+        doc.pages[0].title = 'Saved again'
+        doc.save(file_path)
+
+        self.assertEqual(self.digests(doc)[1:], self.digests(self.build())[1:])
+        self.assertEqual(os.listdir(folder), ['document.boadoc'])
+
+        saved = DocFile()
+        saved.open_document(file_path)
+        self.assertEqual(saved.pages[0].title, 'Saved again')
+        self.assertEqual(self.digests(saved)[1:], self.digests(self.build())[1:])
+
+        # The map is closed once all the pages are decoded.
+        self.assertIsNone(saved.pages._source)
+
+    def test_save_streaming_table(self):
+        doc = DocFile()
+        page = Page()
+        page.add_table(Table(iter([['a', 'b'], [1, 2]]), header_rows=1))
+        doc.add_page(page)
+
+        doc.save(io.BytesIO())
+
+        # The rows read by the save are written.
+        self.assertEqual(page.glyphs[0].data, [['a', 'b'], [1, 2]])
+
+        output = io.BytesIO()
+        doc.write_docx(output, streaming=True)
+
+        with zipfile.ZipFile(output) as archive:
+            self.assertIn('>2<', archive.read('word/document.xml').decode('utf-8'))
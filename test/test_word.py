@@ -63,6 +63,45 @@ class TestWord(TestCase):
         self.word.write_docx(file_path)
         self.assertTrue(os.path.isfile(file_path))
 
+    def test_add_picture_downsampled(self):
+        from boadoc.image import ImageCache
+
+        image_path = os.path.join(self.folder_path, "images", "example2.png")
+        cache = ImageCache()
+
+        first = cache.prepare(image_path, width=1, dpi=72).getvalue()
+        second = cache.prepare(image_path, width=1, dpi=72).getvalue()
+
+        self.assertEqual(first, second)
+        self.assertEqual(cache.hits, 1)
+        self.assertLess(len(first), os.path.getsize(image_path))
+
+        self.page.add_picture(Picture(image_path, width=1))
+        self.page.add_picture(Picture(image_path, width=1))
+        self.word.add_page(self.page)
+
+        file_path = os.path.join(self.folder_path, 'docx', 'test_add_picture_downsampled.docx')
+        self.word.write_docx(file_path)
+        self.assertTrue(os.path.isfile(file_path))
+
+    def test_downsample_format(self):
+        import io
+        from PIL import Image, ImageDraw
+        from boadoc.image import downsample
+
+        # Opaque line art stays a lossless PNG.
+        line_art = Image.new('RGB', (800, 600), 'white')
+        ImageDraw.Draw(line_art).line((0, 0, 800, 600), fill='black', width=3)
+        output = io.BytesIO()
+        line_art.save(output, format='PNG')
+
+        result = Image.open(io.BytesIO(downsample(output.getvalue(), width=1, dpi=72)))
+        self.assertEqual((result.format, result.size), ('PNG', (72, 54)))
+
+        with open(os.path.join(self.folder_path, 'images', 'example1.jpg'), 'rb') as f:
+            result = Image.open(io.BytesIO(downsample(f.read(), width=1, dpi=72)))
+        self.assertEqual(result.format, 'JPEG')
+
     def test_add_section(self):
         s1 = Section(title="Section 1")
         s2 = Section(title="Section 2")
@@ -100,6 +139,81 @@ class TestWord(TestCase):
 
         self.assertTrue(os.path.isfile(file_path))
 
+    def test_add_bulk_table(self):
+        import docx
+        import boadoc.word as wd
+
+        data = [['row 1', 1, 2, 'tab\tbreak\n'],
+                ['row 2', ' 3 ', '<&>', '']]
+
+        expected = docx.Document()
+        table = expected.add_table(rows=2, cols=4)
+        for i_row in range(0, 2):
+            for i_cell in range(0, 4):
+                table.rows[i_row].cells[i_cell].text = str(data[i_row][i_cell])
+
+        writer = wd.Writer(self.word, '')
+        writer.write_table(data)
+
+        self.assertEqual(expected.tables[0]._tbl.xml, writer.myDocument.tables[0]._tbl.xml)
+
+        header = writer.write_table(data, header_rows=1, alignment=DocFile.TABLE_ALIGNMENT_CENTER)
+        self.assertEqual(len(header._tbl.xpath('.//w:tblHeader')), 1)
+
+    def test_write_stream(self):
+        import zipfile
+        from boadoc.output import spooled_output
+
+        self.page.add_header(Header(text='Heading 1'))
+        self.word.add_page(self.page)
+
+        output = spooled_output()
+        self.word.write_docx(output)
+
+        output.seek(0)
+        self.assertIn('word/document.xml', zipfile.ZipFile(output).namelist())
+
+    def test_template_cache(self):
+        import io
+        import boadoc.word as wd
+
+        template_path = os.path.join(self.folder_path, '..', 'example', 'demo.docx')
+        cache = wd.TemplateCache(maxsize=1)
+
+        first = cache.load(template_path)
+        second = cache.load(template_path)
+
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNot(first.docx, second.docx)
+
+        first.docx.add_paragraph('Only in the first document.')
+        self.assertNotEqual(len(first.docx.paragraphs), len(second.docx.paragraphs))
+
+        # The styles part is shared, the rendered parts are not.
+        self.assertIs(first.docx.part._styles_part, second.docx.part._styles_part)
+        self.assertIsNot(first.docx.part.package._core_properties_part,
+                         second.docx.part.package._core_properties_part)
+
+        first.render({})
+        first.save(io.BytesIO())
+        self.assertEqual(second.docx.core_properties.title, cache.load(template_path).docx.core_properties.title)
+
+    def test_jinja_env_cache(self):
+        import tempfile
+        import boadoc.environment as en
+
+        env = en.CachedEnvironment(bytecode_cache=en.FileSystemBytecodeCache(tempfile.mkdtemp()))
+
+        self.assertEqual(env.from_string('{{ name }}').render(name='First'), 'First')
+        self.assertEqual(env.from_string('{{ name }}').render(name='Second'), 'Second')
+        self.assertEqual(env.code_cache.hits, 1)
+
+        # A new process starts with an empty memory cache but reads the compiled code back from disk.
+        other = en.CachedEnvironment(bytecode_cache=env.bytecode_cache)
+        self.assertEqual(other.from_string('{{ name }}').render(name='Third'), 'Third')
+        self.assertEqual(len(os.listdir(env.bytecode_cache.directory)), 1)
+
     def test_demo(self):
         page1 = Page(title="Document Title")
 
@@ -127,3 +241,109 @@ class TestWord(TestCase):
         self.word.write_docx(file_path)
 
         self.assertTrue(os.path.isfile(file_path))
+
+    def test_instrument(self):
+        import json
+        from boadoc.instrument import Profiler
+
+        profiler = Profiler(memory=True)
+        word = DocFile(instrument=profiler)
+
+        self.page.add_header(Header(text='Heading 1'))
+        self.page.add_paragraph(Paragraph(text='Paragraph 1'))
+        self.page.add_table(Table([['a', 'b'], ['c', 'd']]))
+        word.add_page(self.page)
+
+        file_path = os.path.join(self.folder_path, 'docx', 'test_instrument.docx')
+        word.write_docx(file_path)
+
+        report = json.loads(profiler.to_json())
+
+        self.assertEqual(sorted(report['phases']), ['glyphs', 'save'])
+        self.assertGreater(report['phases']['glyphs']['peak'], 0)
+        self.assertEqual(report['glyphs']['Table']['count'], 1)
+
+        with self.assertLogs('boadoc.instrument') as logs:
+            profiler.log()
+        self.assertTrue(any('phase glyphs' in line for line in logs.output))
+
+    def test_stream_writer(self):
+        import io
+        import zipfile
+        import docx
+
+        def build(**kwargs):
+            word = DocFile(**kwargs)
+            page = Page()
+
+            page.add_header(Header(text='Report'))
+            page.add_paragraph(Paragraph(text=' Tab\tand break\n<&> '))
+            page.add_paragraph(Paragraph(text='Bullet', style='list_bullet'))
+
+            section = Section(title='Section')
+            page.add_section(section)
+            section.add_glyph(Paragraph(text='Quote', style='intense'))
+            section.add_glyph(Picture(os.path.join(self.folder_path, 'images', 'example1.jpg'), width=2))
+            section.add_glyph(Picture(os.path.join(self.folder_path, 'images', 'example1.jpg'), width=2))
+
+            page.add_table(Table(iter([['a', 'b'], [1, 2], [3, 4]]), header_rows=1))
+            word.add_page(page)
+
+            return word
+
+        def read(word, streaming):
+            output = io.BytesIO()
+            word.write_docx(output, streaming=streaming)
+            document = docx.Document(output)
+
+            return {
+                'paragraphs': [(p.style.name, p.text) for p in document.paragraphs],
+                'tables': [[cell.text for cell in table._cells] for table in document.tables],
+                'pictures': [(shape.width, shape.height) for shape in document.inline_shapes],
+                'parts': sorted(zipfile.ZipFile(output).namelist()),
+            }
+
+        expected = read(build(), False)
+        result = read(build(), True)
+
+        self.assertEqual(result, expected)
+        self.assertEqual(len(result['pictures']), 2)
+
+        # The template parts and body are kept, the glyphs are written after the body.
+        template_path = os.path.join(self.folder_path, '..', 'example', 'demo.docx')
+        template = docx.Document(template_path)
+        result = read(build(template=template_path), True)
+
+        self.assertEqual(result['paragraphs'][:len(template.paragraphs)],
+                         [(p.style.name, p.text) for p in template.paragraphs])
+        self.assertEqual(result['paragraphs'][len(template.paragraphs)], ('Heading 1', 'Report'))
+        self.assertEqual(len(result['pictures']), len(template.inline_shapes) + 2)
+
+        with self.assertRaises(ValueError):
+            DocFile(context={'name': 'Report'}).write_docx(io.BytesIO(), streaming=True)
+
+    def test_stream_writer_table_style(self):
+        import io
+        import docx
+        from docx.enum.table import WD_TABLE_ALIGNMENT
+
+        class StyledTable(Table):
+            def write(self, driver):
+                driver.write_table(self.data, header_rows=self.header_rows, style='Light Grid Accent 1',
+                                   alignment=DocFile.TABLE_ALIGNMENT_CENTER, allow_autofit=True)
+
+        tables = []
+
+        for streaming in (False, True):
+            word = DocFile()
+            page = Page()
+            page.add_table(StyledTable([['a', 'b'], [1, 2]], header_rows=1))
+            word.add_page(page)
+
+            output = io.BytesIO()
+            word.write_docx(output, streaming=streaming)
+            table = docx.Document(output).tables[0]
+            tables.append((table.style.name, table.alignment, table.autofit, table._tbl.tblPr.xml))
+
+        self.assertEqual(tables[1], tables[0])
+        self.assertEqual(tables[1][:3], ('Light Grid Accent 1', WD_TABLE_ALIGNMENT.CENTER, True))